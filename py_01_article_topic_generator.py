@@ -3,317 +3,418 @@
 Make an article topic generator, based on a 'theme' provided by the user
 """
 
-import importlib.util
-
+import os
+import re
 import sys
-
-# Check Python version compatibility
-if not (sys.version_info >= (3, 10) and sys.version_info < (3, 14)):
-  print("Error: CrewAI requires Python >=3.10 and <3.14")
-  print(f"Your Python version: {sys.version}")
-  sys.exit(1)
-
+import time
+import asyncio
+import argparse
+import datetime
+import warnings
 import subprocess
-
-# Install CrewAI if missing
-try:
-  import crewai
-except ImportError:
-  print("CrewAI not found. Installing...")
-  try:
-    # Use pip to install CrewAI
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "crewai"])
-    import crewai
-    print("CrewAI installed successfully")
-  except subprocess.CalledProcessError as e:
-    print(f"Installation failed: {e}")
-    sys.exit(1)
+from types import SimpleNamespace
 
 # this tells the code to ignore/disregard any warnings that appear
-import warnings
 warnings.filterwarnings('ignore')
 
-import os
-from crewai import Agent, Task, Crew, LLM
-
-GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
-  raise ValueError("GOOGLE_API_KEY environment variable not set. Please set it as a secret in your GitHub repository. If in command line/terminal, run the command: export GOOGLE_API_KEY='YOUR_API_KEY' ")
+# the response cache, token streaming helpers and LLM backends are shared with the Streamlit version
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_version"))
 
-llm = LLM(
-  model="gemini/gemini-2.0-flash",
-  temperature=0.8,                 # or your preferred value
-  api_key=GOOGLE_API_KEY
-)
+"""
+Start-up: nothing heavy happens at import time. CrewAI (and LiteLLM, which it pulls in) is only imported by
+load_crewai() once a run starts, and the LLM, agents, tasks and crew are built inside main(). Run with
+--profile-startup to see where the start-up time goes.
+"""
 
-from random import randint
+# LLM_BACKEND=gemini (default) calls the Gemini API; LLM_BACKEND=fake answers with canned, correctly formatted
+# responses and LLM_BACKEND=replay with recorded ones - both locally, with simulated latency (FAKE_LLM_LATENCY)
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini").lower()
 
-# To get the theme of the topics to be decided
-# theam = input("Enter the theme: ")
+# LLM_CACHE=on answers prompts that were already sent from a local SQLite cache (see streamlit_version/llm_cache.py),
+# LLM_CACHE=replay does the same but never calls Gemini (a prompt that was never recorded is an error)
+LLM_CACHE = os.environ.get("LLM_CACHE", "off").lower()
 
-theam = os.environ.get("THEME")
-if not theam:
-  theam = input("Enter the theme: ")
+# With STREAM=1 the writer gets a streaming client of its own, and its answer is printed while it is being written
+STREAM = os.environ.get("STREAM", "").lower() in ("1", "true", "yes")
 
-numberOfTopics = randint(5, 9)
+# MODEL_ROUTING=tiered (or the path of a JSON config like streamlit_version/model_routing.example.json) routes each agent
+# to its own model and temperature; the default, "single", runs them all on the same one
+MODEL_ROUTING = os.environ.get("MODEL_ROUTING", "single")
 
-print()
-print("The theme chosen is: {}".format(theam))
-print("The number of topics that will be generated is: {}".format(numberOfTopics))
+# RESEARCH_CORPUS=notes (or any folder of Markdown / text documents) gives the researcher a search tool over it, so the
+# research is drawn from, and cites, those documents instead of sources the model comes up with
+RESEARCH_CORPUS = os.environ.get("RESEARCH_CORPUS", "")
 
-"""
-Now, we create the agents.
+# Set DAG=1 to run the two tasks that only need the research output (condensing and link collecting) at the same time
+# (scheduled by streamlit_version/dag.py, so a failure in either one ends the run instead of leaving it waiting)
+DAG = os.environ.get("DAG", "").lower() in ("1", "true", "yes")
 
-What all agents are we looking for? We need one agent each for:
-- planning, and making a list of theme-related topics
-- researching each topic
-- condensing each topic into bullet points
-- collecting the sources used for researching
-- one for writing a small info para about each
+# Bump whenever a prompt in build_crew() changes: runs checkpointed under another version are not resumed
+PROMPT_VERSION = 1
 
-## Total: **5** agents
-"""
-
-planner = Agent(
-  role = "Topic Planner",
-  goal = f"To collect {numberOfTopics} engaging topics related to the theme: {theam}, addressed to an academic audience",
-  backstory = f"You have been given a theme - {theam} - and you must collect {numberOfTopics} topics related to the theme, for people to write articles about. It can be in-depth core topics related to the theme, or informatory topics as well. Your work is the basis for the user to write an article (college graduate level) on these topics.",
-  llm = llm,
-  max_iter = 100,
-  verbose = False,
-  allow_delegation = False
-)
-
-condenser = Agent(
-  role = "Summary Generator",
-  goal = f"To condense paragraphs of information into a title-one liner duo and show it to the user",
-  backstory = "You will take the information the Topic Researcher, and split it into small chunks. Then you will condense it into a bullet point-worth of information and title each of these bullets. The user will elaborate on each point, by themselves, as they see fit. This should be shown to the user under the title 'Condensed Information Points:'",
-  llm = llm,
-  max_iter = 100,
-  verbose = False,
-  allow_delegation = False
-)
-
-collector = Agent(
-  role = "Link Collector",
-  goal = "To collect all the links of the material that were used as sources by the Topic Researcher",
-  backstory = "You will take all the links from the researcher, and show them to the user at the end of the response under the title: 'Resources Used:'",
-  llm = llm,
-  max_iter = 100,
-  verbose = False,
-  allow_delegation = False
-)
-
-researcher = Agent(
-  role = "Topic Researcher",
-  goal = f"To collect in-depth information (and their sources) on the {numberOfTopics} {theam}-related topics provided by the Topic Planner",
-  backstory = f"For each topic given by the Topic Planner, you will do in-depth research into each, collect information and their source links, and send the links to the Link Collector. Also, you send the relevant informaton you have collected to the Summary Generator.",
-  llm = llm,
-  max_iter = 100,
-  verbose = False,
-  allow_delegation = True
-)
-
-"""```
-role: The role of the agent.
-goal: The objective of the agent.
-backstory: The backstory of the agent.
-```
-knowledge: The knowledge base of the agent.
-config: Dict representation of agent configuration.
-```
-llm: The language model that will run the agent.
-```
-function_calling_llm: The language model that will handle the tool calling for this agent, it overrides the crew function_calling_llm.
-```
-max_iter: Maximum number of iterations for an agent to execute a task.
-```
-max_rpm: Maximum number of requests per minute for the agent execution to be respected.
-```
-verbose: Whether the agent execution should be in verbose mode.
-allow_delegation: Whether the agent is allowed to delegate tasks to other agents.
-```
-tools: Tools at agents disposal
-step_callback: Callback to be executed after each step of the agent execution.
-knowledge_sources: Knowledge sources for the agent.
-embedder: Embedder configuration for the agent.
-"""
-
-writer = Agent(
-  role = "Article Prompt Writer",
-  goal = f"To take each topic from the {numberOfTopics} topics the Topic Planner has generated, give the condensed article prompt the Summary Generator has generated for the same, and then the links the Link Collector has collected for the same topic, and repeat the steps for the rest of the topics",
-  backstory = f"The Topic Planner has sent {numberOfTopics} topics to the Topic Researcher, who sent the information to the Summary Generator and the research links to the Link Collector, who have all sent their information chunks to you, who orders it and shows it to the user.",
-  llm = llm,
-  max_iter = 100,
-  verbose = False,
-  allow_delegation = False
-)
+def check_python_version():
+  # Check Python version compatibility
+  if not (sys.version_info >= (3, 10) and sys.version_info < (3, 14)):
+    print("Error: CrewAI requires Python >=3.10 and <3.14")
+    print(f"Your Python version: {sys.version}")
+    sys.exit(1)
 
-"""
-Because there are 5 agents, there must be 5 tasks, namely:
-- planner : plan
-- condenser : textCondense
-- collector : linkCollection
-- researcher : research
-- writer : chunkJoin
-
-## Total: **5** tasks
-"""
+REQUIREMENTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_version", "requirements.txt")
 
-plan = Task(
-  name='Planning',
-  agent = planner,
-  description = f'''
-  1. Identify the latest trends related to {theam}, along with key players and noteworthy news \n
-  2. Identify the target audience based on {theam} and collect relevant headlines/topics \n
-  3. Develop a {theam}-related title list of {numberOfTopics} items \n
-  4. Format the output as a numbered list with no additional commentary \n
-  5. Example: \n
-    1. Topic One \n
-    2. Topic Two \n
-    3. Topic Three \n
-  6. Send the list to the Topic Researcher''',
-  expected_output=f"A {numberOfTopics}-item numbered list of {theam}-related topics with no extra text"
-)
+def crewai_requirement():
+  # the CrewAI range the code is run against, as pinned in streamlit_version/requirements.txt
+  with open(REQUIREMENTS) as f:
+    for line in f:
+      if re.match(r"crewai\b", line.strip()):
+        return line.strip()
+  raise RuntimeError(f"No crewai requirement in {REQUIREMENTS}")
 
-"""
-agent: Agent responsible for task execution. Represents entity performing task.
-<br>async_execution: Boolean flag indicating asynchronous task execution.
-<br>callback: Function/object executed post task completion for additional actions.
-<br>config: Dictionary containing task-specific configuration parameters.
-<br>context: List of Task instances providing task context or input data.
-<br>description: Descriptive text detailing task's purpose and execution.
-<br>expected_output: Clear definition of expected task outcome.
-<br>output_file: File path for storing task output.
-<br>output_json: Pydantic model for structuring JSON output.
-<br>output_pydantic: Pydantic model for task output.
-<br>security_config: Security configuration including fingerprinting.
-<br>tools: List of tools/resources limited for task execution.
-"""
-
-research = Task(
-  name='Researching',
-  agent=researcher,
-  description=f'''
-  For each topic received from the Topic Planner:
-  1. Conduct in-depth research on the topic
-  2. Use at least 5-6 sources
-  3. Collect information and source links
-  4. Format research content as:
-    - Heading: "### Research Findings"
-    - Bullet points with bolded subheadings
-  5. Format source links as:
-    - Heading: "### Source Links"
-    - Numbered list of exact URLs
-  6. Example:
-    ### Research Findings
-    - **Key Discovery:** Explanation of discovery
-    - **Important Fact:** Detailed fact
-
-    ### Source Links
-    1. <exact link here>
-    2. <exact link here>
-  7. Send the research findings to the Summary Generator''',
-  expected_output="Structured research findings with exact source links for all topics"
-)
-
-textCondense = Task(
-  name='Condensing',
-  agent=condenser,
-  description=f'''
-  1. Receive research content from Topic Researcher
-  2. For each logical chunk:
-    a. Create a bolded heading (1-3 words)
-    b. Add colon followed by 1-sentence summary
-  3. Output as:
-    - Heading: "### Condensed Information Points"
-    - Bullet points with headings
-  4. Do not add commentary
-  5. Example:
-  ### Condensed Information Points
-  - **Brain-Computer Interface:** Direct pathway between brain and external devices
-  - **Neural Signals:** BCIs interpret signals to control computers''',
-  expected_output = "Markdown section with bolded headings and colon-separated summaries"
-)
-
-linkCollection = Task(
-  name='Link Collecting',
-  agent=collector,
-  description=f'''
-  1. Collect all source links from Topic Researcher
-  2. Format as:
-    - Heading: "### Resources Used"
-    - Numbered list of exact URLs
-  3. Preserve original link formatting
-  4. Do not modify or shorten URLs
-  5. Example:
-  ### Resources Used
-    1. https://www.nature.com/articles/bci-technology
-    2. https://ieeexplore.ieee.org/document/123456''',
-  expected_output="Numbered list of exact source URLs under heading"
-)
-
-chunkJoin = Task(
-  name='Joining, Formatting, and Writing',
-  agent=writer,
-  description=f'''
-  For each of the {numberOfTopics} topics:
-  1. Start with H2 heading: "## [Topic Name]"
-  2. Include condensed points from Summary Generator
-  3. Include resource links from Link Collector
-  4. Maintain exact formatting:
-    ## Topic <Number>: <Topic Title>
+def load_crewai():
+  # Install CrewAI if missing - only when a run needs it, never at import time
+  try:
+    import crewai
+  except ImportError:
+    requirement = crewai_requirement()
+    print(f"CrewAI not found. Installing {requirement}...")
+    try:
+      # Use pip to install the pinned CrewAI range, not whatever release is newest
+      subprocess.check_call([sys.executable, "-m", "pip", "install", requirement])
+      import crewai
+      print("CrewAI installed successfully")
+    except subprocess.CalledProcessError as e:
+      print(f"Installation failed: {e}")
+      print(f"Install it yourself with: pip install -r {REQUIREMENTS}")
+      sys.exit(1)
+
+  return crewai.Agent, crewai.Task, crewai.Crew
+
+def create_llms():
+  load_crewai()
+  from backends import create_llm, BACKENDS
+  from routing import load_routing
+
+  if LLM_BACKEND not in BACKENDS:
+    raise ValueError(f"Unknown LLM_BACKEND '{LLM_BACKEND}'. Choose one of: {', '.join(BACKENDS)}")
+
+  GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
+  if LLM_BACKEND == "gemini" and not GOOGLE_API_KEY and LLM_CACHE != "replay":
+    raise ValueError("GOOGLE_API_KEY environment variable not set. Please set it as a secret in your GitHub repository. If in command line/terminal, run the command: export GOOGLE_API_KEY='YOUR_API_KEY' ")
+
+  # one client per (model, temperature) the routing uses, shared by the agents routed to it
+  routes = load_routing(MODEL_ROUTING)
+  clients = {}
+  for model, temperature in dict.fromkeys(routes.values()):
+    clients[model, temperature] = create_llm(LLM_BACKEND, model=model, temperature=temperature)
+
+  if LLM_CACHE != "off":
+    from llm_cache import CachedLLM, get_response_cache
+    clients = {route: CachedLLM(client, get_response_cache(), mode=LLM_CACHE) for route, client in clients.items()}
+
+  llms = {agent: clients[route] for agent, route in routes.items()}
+  if STREAM:
+    model, temperature = routes["writer"]
+    llms["writer"] = create_llm(LLM_BACKEND, model=model, temperature=temperature, stream=True)
+    if LLM_CACHE != "off":
+      llms["writer"] = CachedLLM(llms["writer"], get_response_cache(), mode=LLM_CACHE)
+
+  return llms
+
+def run_fingerprint(theam, numberOfTopics):
+  # everything that decides what a run produces; a checkpointed run is only resumed under the same fingerprint
+  from schemas import GenerationRequest
+  from routing import load_routing
+
+  corpus = None
+  if RESEARCH_CORPUS:
+    from retrieval import get_corpus_index
+    corpus = get_corpus_index(RESEARCH_CORPUS).meta["signature"]
+  request = GenerationRequest(theme=theam, number_of_topics=numberOfTopics)
+  return request.fingerprint(load_routing(MODEL_ROUTING), PROMPT_VERSION, cli=True, backend=LLM_BACKEND, corpus=corpus)
+
+# prints each task as soon as it is done, instead of staying silent until the whole crew has finished
+def print_task_done(output):
+  print(f"  ✅ {output.name} completed", flush=True)
+
+def build_crew(theam, numberOfTopics, llms):
+  Agent, Task, Crew = load_crewai()
+
+  """
+  Now, we create the agents.
+
+  What all agents are we looking for? We need one agent each for:
+  - planning, and making a list of theme-related topics
+  - researching each topic
+  - condensing each topic into bullet points
+  - collecting the sources used for researching
+  - one for writing a small info para about each
+
+  ## Total: **5** agents
+  """
+
+  research_tools = []
+  if RESEARCH_CORPUS:
+    from retrieval import get_corpus_index
+    from research_tool import CorpusSearchTool
+    # indexed (or its index brought up to date) now, rather than on the researcher's first search
+    get_corpus_index(RESEARCH_CORPUS)
+    research_tools = [CorpusSearchTool(corpus_dir=RESEARCH_CORPUS)]
+
+  planner = Agent(
+    role = "Topic Planner",
+    goal = f"To collect {numberOfTopics} engaging topics related to the theme: {theam}, addressed to an academic audience",
+    backstory = f"You have been given a theme - {theam} - and you must collect {numberOfTopics} topics related to the theme, for people to write articles about. It can be in-depth core topics related to the theme, or informatory topics as well. Your work is the basis for the user to write an article (college graduate level) on these topics.",
+    llm = llms["planner"],
+    max_iter = 100,
+    verbose = False,
+    allow_delegation = False
+  )
+
+  condenser = Agent(
+    role = "Summary Generator",
+    goal = f"To condense paragraphs of information into a title-one liner duo and show it to the user",
+    backstory = "You will take the information the Topic Researcher, and split it into small chunks. Then you will condense it into a bullet point-worth of information and title each of these bullets. The user will elaborate on each point, by themselves, as they see fit. This should be shown to the user under the title 'Condensed Information Points:'",
+    llm = llms["condenser"],
+    max_iter = 100,
+    verbose = False,
+    allow_delegation = False
+  )
+
+  collector = Agent(
+    role = "Link Collector",
+    goal = "To collect all the links of the material that were used as sources by the Topic Researcher",
+    backstory = "You will take all the links from the researcher, and show them to the user at the end of the response under the title: 'Resources Used:'",
+    llm = llms["collector"],
+    max_iter = 100,
+    verbose = False,
+    allow_delegation = False
+  )
+
+  researcher = Agent(
+    role = "Topic Researcher",
+    goal = f"To collect in-depth information (and their sources) on the {numberOfTopics} {theam}-related topics provided by the Topic Planner",
+    backstory = f"For each topic given by the Topic Planner, you will do in-depth research into each, collect information and their source links, and send the links to the Link Collector. Also, you send the relevant informaton you have collected to the Summary Generator.",
+    llm = llms["researcher"],
+    tools = research_tools,
+    # a few searches of the notes do not need the 100 rounds open-ended research may take
+    max_iter = 15 if RESEARCH_CORPUS else 100,
+    verbose = False,
+    allow_delegation = True
+  )
+
+  """```
+  role: The role of the agent.
+  goal: The objective of the agent.
+  backstory: The backstory of the agent.
+  ```
+  knowledge: The knowledge base of the agent.
+  config: Dict representation of agent configuration.
+  ```
+  llm: The language model that will run the agent.
+  ```
+  function_calling_llm: The language model that will handle the tool calling for this agent, it overrides the crew function_calling_llm.
+  ```
+  max_iter: Maximum number of iterations for an agent to execute a task.
+  ```
+  max_rpm: Maximum number of requests per minute for the agent execution to be respected.
+  ```
+  verbose: Whether the agent execution should be in verbose mode.
+  allow_delegation: Whether the agent is allowed to delegate tasks to other agents.
+  ```
+  tools: Tools at agents disposal
+  step_callback: Callback to be executed after each step of the agent execution.
+  knowledge_sources: Knowledge sources for the agent.
+  embedder: Embedder configuration for the agent.
+  """
+  writer = Agent(
+    role = "Article Prompt Writer",
+    goal = f"To take each topic from the {numberOfTopics} topics the Topic Planner has generated, give the condensed article prompt the Summary Generator has generated for the same, and then the links the Link Collector has collected for the same topic, and repeat the steps for the rest of the topics",
+    backstory = f"The Topic Planner has sent {numberOfTopics} topics to the Topic Researcher, who sent the information to the Summary Generator and the research links to the Link Collector, who have all sent their information chunks to you, who orders it and shows it to the user.",
+    llm = llms["writer"],
+    max_iter = 100,
+    verbose = False,
+    allow_delegation = False
+  )
+
+  """
+  Because there are 5 agents, there must be 5 tasks, namely:
+  - planner : plan
+  - condenser : textCondense
+  - collector : linkCollection
+  - researcher : research
+  - writer : chunkJoin
+
+  ## Total: **5** tasks
+  """
+
+  plan = Task(
+    name='Planning',
+    agent = planner,
+    description = f'''
+    1. Identify the latest trends related to {theam}, along with key players and noteworthy news \n
+    2. Identify the target audience based on {theam} and collect relevant headlines/topics \n
+    3. Develop a {theam}-related title list of {numberOfTopics} items \n
+    4. Format the output as a numbered list with no additional commentary \n
+    5. Example: \n
+      1. Topic One \n
+      2. Topic Two \n
+      3. Topic Three \n
+    6. Send the list to the Topic Researcher''',
+    expected_output=f"A {numberOfTopics}-item numbered list of {theam}-related topics with no extra text"
+  )
+
+  """
+  agent: Agent responsible for task execution. Represents entity performing task.
+  <br>async_execution: Boolean flag indicating asynchronous task execution.
+  <br>callback: Function/object executed post task completion for additional actions.
+  <br>config: Dictionary containing task-specific configuration parameters.
+  <br>context: List of Task instances providing task context or input data.
+  <br>description: Descriptive text detailing task's purpose and execution.
+  <br>expected_output: Clear definition of expected task outcome.
+  <br>output_file: File path for storing task output.
+  <br>output_json: Pydantic model for structuring JSON output.
+  <br>output_pydantic: Pydantic model for task output.
+  <br>security_config: Security configuration including fingerprinting.
+  <br>tools: List of tools/resources limited for task execution.
+  """
+
+  if RESEARCH_CORPUS:
+    research_steps = '''
+    1. Search the research notes for the topic, then for its specific aspects
+    2. Base the research findings on the passages found
+    3. Use as source links the links the passages say to cite; add others only where the notes have nothing'''
+  else:
+    research_steps = '''
+    1. Conduct in-depth research on the topic
+    2. Use at least 5-6 sources
+    3. Collect information and source links'''
+
+  research = Task(
+    name='Researching',
+    agent=researcher,
+    description=f'''
+    For each topic received from the Topic Planner:{research_steps}
+    4. Format research content as:
+      - Heading: "### Research Findings"
+      - Bullet points with bolded subheadings
+    5. Format source links as:
+      - Heading: "### Source Links"
+      - Numbered list of exact URLs
+    6. Example:
+      ### Research Findings
+      - **Key Discovery:** Explanation of discovery
+      - **Important Fact:** Detailed fact
+
+      ### Source Links
+      1. <exact link here>
+      2. <exact link here>
+    7. Send the research findings to the Summary Generator''',
+    expected_output="Structured research findings with exact source links for all topics",
+    context=[plan]
+  )
+
+  textCondense = Task(
+    name='Condensing',
+    agent=condenser,
+    description=f'''
+    1. Receive research content from Topic Researcher
+    2. For each logical chunk:
+      a. Create a bolded heading (1-3 words)
+      b. Add colon followed by 1-sentence summary
+    3. Output as:
+      - Heading: "### Condensed Information Points"
+      - Bullet points with headings
+    4. Do not add commentary
+    5. Example:
     ### Condensed Information Points
-    - **heading:** summary (from condenser / Summary Generator)
+    - **Brain-Computer Interface:** Direct pathway between brain and external devices
+    - **Neural Signals:** BCIs interpret signals to control computers''',
+    expected_output = "Markdown section with bolded headings and colon-separated summaries",
+    context=[research]
+  )
+
+  linkCollection = Task(
+    name='Link Collecting',
+    agent=collector,
+    description=f'''
+    1. Collect all source links from Topic Researcher
+    2. Format as:
+      - Heading: "### Resources Used"
+      - Numbered list of exact URLs
+    3. Preserve original link formatting
+    4. Do not modify or shorten URLs
+    5. Example:
     ### Resources Used
-    1. <exact link here>
-  5. Do not add commentary or summaries''',
-  expected_output=f"Structured output with headings, bullet points, and exact links for all topics"
-)
-
-# forming the crew
-crewww = Crew(
-  agents = [planner, researcher, condenser, collector, writer],
-  tasks = [plan, research, textCondense, linkCollection, chunkJoin],
-  process = "sequential",
-  verbose = False,
-  memory = False,
-  share_crew = True,
-  planning = False,
-  chat_llm = llm
-)
-
-"""
-tasks: List of tasks assigned to the crew.
-<br>agents: List of agents part of this crew.
-<br>manager_llm: The language model that will run manager agent.
-<br>manager_agent: Custom agent that will be used as manager.
-<br>memory: Whether the crew should use memory to store memories of it's execution.
-<br>memory_config: Configuration for the memory to be used for the crew.
-<br>cache: Whether the crew should use a cache to store the results of the tools execution.
-<br>function_calling_llm: The language model that will run the tool calling for all the agents.
-<br>process: The process flow that the crew will follow (e.g., sequential, hierarchical).
-<br>verbose: Indicates the verbosity level for logging during execution.
-<br>config: Configuration settings for the crew.
-<br>max_rpm: Maximum number of requests per minute for the crew execution to be respected.
-<br>prompt_file: Path to the prompt json file to be used for the crew.
-<br>id: A unique identifier for the crew instance.
-<br>task_callback: Callback to be executed after each task for every agents execution.
-<br>step_callback: Callback to be executed after each step for every agents execution.
-<br>share_crew: Whether you want to share the complete crew information and execution with crewAI to make the library better, and allow us to train models.
-<br>planning: Plan the crew execution and add the plan to the crew.
-<br>chat_llm: The language model used for orchestrating chat interactions with the crew.
-<br>security_config: Security configuration for the crew, including fingerprinting.
-"""
-
-from IPython.display import Markdown, display, display_markdown
+      1. https://www.nature.com/articles/bci-technology
+      2. https://ieeexplore.ieee.org/document/123456''',
+    expected_output="Numbered list of exact source URLs under heading",
+    context=[research]
+  )
+
+  chunkJoin = Task(
+    name='Joining, Formatting, and Writing',
+    agent=writer,
+    description=f'''
+    For each of the {numberOfTopics} topics:
+    1. Start with H2 heading: "## [Topic Name]"
+    2. Include condensed points from Summary Generator
+    3. Include resource links from Link Collector
+    4. Maintain exact formatting:
+      ## Topic <Number>: <Topic Title>
+      ### Condensed Information Points
+      - **heading:** summary (from condenser / Summary Generator)
+      ### Resources Used
+      1. <exact link here>
+    5. Do not add commentary or summaries''',
+    expected_output=f"Structured output with headings, bullet points, and exact links for all topics",
+    context=[plan, textCondense, linkCollection]
+  )
+
+  # forming the crew
+  crewww = Crew(
+    agents = [planner, researcher, condenser, collector, writer],
+    tasks = [plan, research, textCondense, linkCollection, chunkJoin],
+    process = "sequential",
+    verbose = False,
+    memory = False,
+    share_crew = True,
+    planning = False,
+    chat_llm = llms["planner"],
+    task_callback = print_task_done
+  )
+
+  """
+  tasks: List of tasks assigned to the crew.
+  <br>agents: List of agents part of this crew.
+  <br>manager_llm: The language model that will run manager agent.
+  <br>manager_agent: Custom agent that will be used as manager.
+  <br>memory: Whether the crew should use memory to store memories of it's execution.
+  <br>memory_config: Configuration for the memory to be used for the crew.
+  <br>cache: Whether the crew should use a cache to store the results of the tools execution.
+  <br>function_calling_llm: The language model that will run the tool calling for all the agents.
+  <br>process: The process flow that the crew will follow (e.g., sequential, hierarchical).
+  <br>verbose: Indicates the verbosity level for logging during execution.
+  <br>config: Configuration settings for the crew.
+  <br>max_rpm: Maximum number of requests per minute for the crew execution to be respected.
+  <br>prompt_file: Path to the prompt json file to be used for the crew.
+  <br>id: A unique identifier for the crew instance.
+  <br>task_callback: Callback to be executed after each task for every agents execution.
+  <br>step_callback: Callback to be executed after each step for every agents execution.
+  <br>share_crew: Whether you want to share the complete crew information and execution with crewAI to make the library better, and allow us to train models.
+  <br>planning: Plan the crew execution and add the plan to the crew.
+  <br>chat_llm: The language model used for orchestrating chat interactions with the crew.
+  <br>security_config: Security configuration for the crew, including fingerprinting.
+  """
+
+  return SimpleNamespace(
+    llm=llms["planner"], writer_llm=llms["writer"], crew=crewww,
+    planner=planner, researcher=researcher, condenser=condenser, collector=collector, writer=writer,
+    plan=plan, research=research, textCondense=textCondense, linkCollection=linkCollection, chunkJoin=chunkJoin
+  )
 
 # now to get and print what the crew has produced
 
 # resp = await crewww.kickoff_async(inputs={"theme": theam, "number of topics": numberOfTopics})
-# display(Markdown(resp.raw.strip("`")))
-
-# import asyncio - because shifted above, to the import statements block
+# print(resp.raw.strip("`"))
 
 def get_downloads_folder():
   downloads_path = os.path.join(os.path.expanduser("~"), "Downloads")
@@ -326,40 +427,289 @@ def get_downloads_folder():
 
   return downloads_path
 
-downloads_folder = get_downloads_folder()
-print("\nDownloads folder is:", downloads_folder)
+"""
+Optional per-topic fan-out (set FAN_OUT=1): the planner runs once, then each topic gets its own
+researcher -> condenser -> collector crew, run concurrently (at most MAX_CONCURRENCY at a time).
+The writer is replaced by a plain merge of the per-topic sections, so the total wait is roughly
+the slowest topic instead of the sum of all of them.
+"""
 
-import asyncio
-import datetime
-r = datetime.datetime.today()
-rn = f"{r.day}-{r.month}-{r.year}_{r.hour}-{r.minute}-{r.second}"
+FAN_OUT = os.environ.get("FAN_OUT", "").lower() in ("1", "true", "yes")
+MAX_CONCURRENCY = int(os.environ.get("MAX_CONCURRENCY", "4"))
+
+def topic_crew(crew, topic, task_callback=print_task_done):
+  _, Task, Crew = load_crewai()
+  # copies, so that crews running at the same time never share an agent
+  topic_researcher, topic_condenser, topic_collector = crew.researcher.copy(), crew.condenser.copy(), crew.collector.copy()
+
+  topic_research = Task(
+    name=f'Researching: {topic}',
+    agent=topic_researcher,
+    description=crew.research.description.replace("For each topic received from the Topic Planner:", f'For the single topic "{topic}":'),
+    expected_output=f'Structured research findings with exact source links for "{topic}"'
+  )
+  topic_condense = Task(name=f'Condensing: {topic}', agent=topic_condenser, description=crew.textCondense.description, expected_output=crew.textCondense.expected_output, context=[topic_research])
+  topic_links = Task(name=f'Link Collecting: {topic}', agent=topic_collector, description=crew.linkCollection.description, expected_output=crew.linkCollection.expected_output, context=[topic_research])
+
+  return Crew(
+    agents = [topic_researcher, topic_condenser, topic_collector],
+    tasks = [topic_research, topic_condense, topic_links],
+    process = "sequential",
+    verbose = False,
+    memory = False,
+    task_callback = task_callback
+  )
+
+async def fan_out_kickoff(crew, theam, numberOfTopics, task_callback=print_task_done):
+  from crewai.crews.crew_output import CrewOutput
+  from assembly import parse_topics
+  _, _, Crew = load_crewai()
+
+  planning = Crew(agents = [crew.planner], tasks = [crew.plan], process = "sequential", verbose = False, memory = False, task_callback = task_callback)
+  plan_resp = await planning.kickoff_async(inputs={"theme": theam, "number of topics": numberOfTopics})
+
+  topics = parse_topics(plan_resp.raw or "", limit=numberOfTopics)
+  if not topics:
+    return plan_resp
+
+  print(f"\nResearching {len(topics)} topics, {MAX_CONCURRENCY} at a time... ")
+  semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+  # a pool of its own, so MAX_CONCURRENCY is not capped by the event loop's default one (cpu count + 4 threads)
+  from concurrent.futures import ThreadPoolExecutor
+  from dag import kickoff_in_pool
+  executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY)
+
+  async def run_topic(topic):
+    async with semaphore:
+      return await kickoff_in_pool(executor, topic_crew(crew, topic, task_callback), {"theme": theam, "topic": topic})
 
-async def main():
+  try:
+    outputs = await asyncio.gather(*(run_topic(topic) for topic in topics))
+  finally:
+    executor.shutdown(wait=False)
+
+  sections = []
+  for number, (topic, out) in enumerate(zip(topics, outputs), start=1):
+    _, condensed, links = out.tasks_output
+    sections.append(f"## Topic {number}: {topic}\n\n{condensed.raw.strip('`')}\n\n{links.raw.strip('`')}")
+
+  return CrewOutput(
+    raw = "\n\n---\n\n".join(sections),
+    tasks_output = plan_resp.tasks_output + [task for out in outputs for task in out.tasks_output]
+  )
+
+def resume_crew(crew, checkpoint, task_done, sink, pruner):
+  # Every finished task is saved under the run ID; tasks an earlier attempt already finished get that output back
+  from checkpoints import restore_tasks
+  Agent, Task, Crew = load_crewai()
+
+  remaining = restore_tasks(crew.crew.tasks, checkpoint.completed)
+  for task in crew.crew.tasks:
+    if all(task is not other for other in remaining):
+      print(f"  ♻️  {task.name} restored from checkpoint", flush=True)
+      sink.task(task.output)
+      pruner.prune(task.output)
+
+  if remaining and len(remaining) < len(crew.crew.tasks):
+    agents = []
+    for task in remaining:
+      if all(task.agent is not agent for agent in agents):
+        agents.append(task.agent)
+    crew.crew = Crew(agents = agents, tasks = remaining, process = "sequential", verbose = False, memory = False, task_callback = task_done)
+  return remaining
+
+async def kickoff(crew, inputs):
+  if DAG:
+    from dag import kickoff_dag
+    return await kickoff_dag(crew, inputs)
+  return await crew.kickoff_async(inputs=inputs)
+
+async def generate(crew, theam, numberOfTopics, sink, checkpoint=None):
   print("\nPreparing setup... ")
-  resp = await crewww.kickoff_async(inputs={"theme": theam, "number of topics": numberOfTopics})
-
-  print("\nPrinting the topics collected: \n")
-  # If you want to display markdown in a notebook, use display(Markdown(resp.raw.strip("`")))
-  # For a .py script, just print the result:
-  if resp and resp.raw:
-    print(resp.raw)  # or print(resp) if .raw is not available
+  print("Writing each task to", sink.part_path, "as soon as it is done")
+
+  # each finished output is compacted (code fences and blank lines dropped) before the tasks that read it start; these tasks
+  # write free-form text, so unlike the app's typed outputs nothing is summarized down to CONTEXT_TOKEN_BUDGET;
+  # the checkpoint and the output file have already been given the full text by then
+  from context_pruning import ContextPruner
+  pruner = ContextPruner(crew.crew.tasks)
+
+  def task_done(output):
+    # runs on CrewAI's threads: the sink only queues the section, its own thread does the writing
+    print_task_done(output)
+    if checkpoint:
+      checkpoint.save(output)
+    sink.task(output)
+    pruner.prune(output)
+
+  crew.crew.task_callback = task_done
+  streamed = False
+  if checkpoint and not FAN_OUT and not resume_crew(crew, checkpoint, task_done, sink, pruner):
+    # the run had already finished every task; its last output is the answer
+    resp = crew.chunkJoin.output
+  elif FAN_OUT:
+    resp = await fan_out_kickoff(crew, theam, numberOfTopics, task_done)
+  elif STREAM:
+    from streaming import stream_tokens
+    print("\nPrinting the topics as they are written: \n")
+    chunks = []
+
+    def print_chunk(text):
+      chunks.append(text)
+      print(text, end="", flush=True)
+
+    with stream_tokens(crew.writer_llm, print_chunk):
+      resp = await kickoff(crew.crew, {"theme": theam, "number of topics": numberOfTopics})
+    print()
+    # nothing is streamed when the answer came from the cache (or CrewAI has no streaming events)
+    streamed = bool(chunks)
   else:
-    print("No data received from the LLM. Nothing to write.")
-
-  print("\nDownloading the topics collected as a .md file: ")
+    resp = await kickoff(crew.crew, {"theme": theam, "number of topics": numberOfTopics})
 
-  file_writer = f"Article_Topic_Generated_{rn}.md"
-  fw = os.path.join(downloads_folder, file_writer)
+  if not streamed:
+    print("\nPrinting the topics collected: \n")
+    # If you want to display markdown in a notebook, use IPython's display(Markdown(resp.raw.strip("`")))
+    # For a .py script, just print the result:
+    if resp and resp.raw:
+      print(resp.raw)  # or print(resp) if .raw is not available
+    else:
+      print("No data received from the LLM.")
 
-  f = open(fw, 'w')
-  f.write(f"# Theme: {theam} \n\n---\n\n")
-  f.close()
+  # the final rename (and fsync) happens off the event loop; the file only gets its real name once it is complete
+  path = await asyncio.to_thread(sink.close, resp.raw if resp else None)
+  print("\nSaved the topics collected to:", path)
 
-  f = open(fw, 'a')
-  f.write(resp.raw)
-  f.close()
+  if checkpoint:
+    checkpoint.finish("done")
 
   print("\nDownload complete! Check your downloads folder, and happy writing! :)")
 
+
+def profile_startup():
+  """Print how long each start-up step takes, and which packages the import time goes to"""
+  # A fresh interpreter shows the cold import cost; -X importtime reports every module it loads
+  proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import crewai"], capture_output=True, text=True)
+  packages = {}
+  for line in proc.stderr.splitlines():
+    match = re.match(r"import time:\s+(\d+) \|\s+\d+ \|\s*([\w.]+)", line)
+    if match:
+      package = match.group(2).split(".")[0]
+      packages[package] = packages.get(package, 0) + int(match.group(1))
+
+  print("\nImport time by top-level package (cold, self time):")
+  for package, microseconds in sorted(packages.items(), key=lambda item: -item[1])[:15]:
+    print(f"  {package:<30} {microseconds / 1000:8.1f} ms")
+  print(f"  {'total':<30} {sum(packages.values()) / 1000:8.1f} ms")
+
+  steps = []
+  started = time.perf_counter()
+  load_crewai()
+  steps.append(("import crewai (and litellm)", time.perf_counter() - started))
+
+  started = time.perf_counter()
+  import backends, llm_cache, streaming
+  steps.append(("import helper modules", time.perf_counter() - started))
+
+  # The fake backend needs no API key, so the construction cost can be measured anywhere
+  started = time.perf_counter()
+  llm = backends.create_llm("fake")
+  steps.append(("create the LLM client", time.perf_counter() - started))
+
+  started = time.perf_counter()
+  build_crew("Start-up profiling", 5, dict.fromkeys(("planner", "researcher", "condenser", "collector", "writer"), llm))
+  steps.append(("build agents, tasks and crew", time.perf_counter() - started))
+
+  print("\nStart-up steps (this process):")
+  for name, seconds in steps:
+    print(f"  {name:<30} {seconds * 1000:8.1f} ms")
+
+def main(argv=None):
+  from output_sinks import OUTPUT_FORMATS, open_output
+
+  parser = argparse.ArgumentParser(description="Generate article topics for a theme.")
+  parser.add_argument("--profile-startup", action="store_true", help="report where start-up time goes, then exit")
+  parser.add_argument("--format", dest="output_format", choices=OUTPUT_FORMATS, default="markdown",
+                      help="file written to the downloads folder: markdown (default), jsonl or html")
+  parser.add_argument("--fsync", action="store_true", help="flush every finished task to disk before going on")
+  parser.add_argument("--topics", type=int, help="number of topics (default: drawn from the theme and --seed)")
+  parser.add_argument("--seed", type=int, default=0, help="change it for another topic count; the same theme and seed always get the same one")
+  parser.add_argument("--resume", nargs="?", const="latest", metavar="RUN_ID",
+                      help="continue an interrupted run from its first unfinished task (default: the latest one)")
+  args = parser.parse_args(argv)
+
+  check_python_version()
+  if args.profile_startup:
+    profile_startup()
+    return
+
+  if args.resume and FAN_OUT:
+    print("Resuming is not supported with FAN_OUT=1")
+    sys.exit(1)
+
+  llms = create_llms()
+
+  from schemas import GenerationRequest
+  from checkpoints import get_checkpoint_store, ResumeRefused
+
+  store = get_checkpoint_store()
+  resumed = None
+  if args.resume:
+    # only the CLI's own runs, and none that another process is still running
+    resumed = store.latest_incomplete({"cli": True}) if args.resume == "latest" else store.run(args.resume)
+    if not resumed:
+      print("No interrupted run to resume.")
+      sys.exit(1)
+    theam, numberOfTopics = resumed["theme"], resumed["number_of_topics"]
+  else:
+    # To get the theme of the topics to be decided
+    # theam = input("Enter the theme: ")
+
+    theam = os.environ.get("THEME")
+    if not theam:
+      theam = input("Enter the theme: ")
+
+    # not random: the count is drawn from the theme and the seed, so the same request always has the same inputs
+    # (and can be answered from the response cache)
+    request = GenerationRequest(theme=theam, number_of_topics=args.topics, seed=args.seed)
+    theam, numberOfTopics = request.theme, request.number_of_topics
+
+  print()
+  print("The theme chosen is: {}".format(theam))
+  print("The number of topics that will be generated is: {}".format(numberOfTopics))
+  if not args.resume and args.topics is None:
+    print("(drawn with seed {} - pass --seed for another count, or --topics to choose it)".format(args.seed))
+
+  # fan-out runs build their crews on the fly, so only the five-task crew is checkpointed
+  checkpoint = None
+  if not FAN_OUT:
+    options = {"cli": True, "fingerprint": run_fingerprint(theam, numberOfTopics), "prompt_version": PROMPT_VERSION}
+    try:
+      checkpoint = store.start(theam, numberOfTopics, options, resumed["run_id"] if resumed else None)
+    except ResumeRefused as e:
+      print(e)
+      sys.exit(1)
+    print("Run ID:", checkpoint.run_id, "(continue it with --resume if it is interrupted)")
+
+  crew = build_crew(theam, numberOfTopics, llms)
+
+  downloads_folder = get_downloads_folder()
+  print("\nDownloads folder is:", downloads_folder)
+
+  r = datetime.datetime.today()
+  rn = f"{r.day}-{r.month}-{r.year}_{r.hour}-{r.minute}-{r.second}"
+
+  sink = open_output(args.output_format, downloads_folder, f"Article_Topic_Generated_{rn}", theam,
+                     fsync=args.fsync, answer_task=None if FAN_OUT else crew.chunkJoin.name)
+
+  try:
+    asyncio.run(generate(crew, theam, numberOfTopics, sink, checkpoint))
+  except BaseException:
+    # whatever was finished before the failure stays readable in the .part file
+    print("\nPartial output kept in:", sink.abort())
+    if checkpoint:
+      # no longer running, so --resume picks it up straight away
+      checkpoint.finish("failed")
+    raise
+
 if __name__ == "__main__":
-  asyncio.run(main())
+  main()
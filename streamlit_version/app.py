@@ -2,13 +2,20 @@ __import__('pysqlite3')
 import sys
 sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 
-import os, asyncio, random, uuid, datetime, base64, styles, scripts
+import os, uuid, datetime, base64, styles, scripts
 import streamlit as st 
 
 # from streamlit_extras.let_it_rain import rain 
 
 try:
-    from generator import generate_article_topics
+    from generator import find_similar_result, resume_options, MODES
+    from checkpoints import ResumeRefused
+    from backends import DEFAULT_BACKEND
+    from routing import ROUTING_POLICIES, DEFAULT_ROUTING
+    from retrieval import NOTES_DIR, DEFAULT_RESEARCH_CORPUS
+    from schemas import GenerationRequest, draft_preview
+    from jobs import get_job_runner
+    from history import get_history_store, HistoryStore
     GENERATOR_AVAILABLE = True
 except ImportError as e:
     GENERATOR_AVAILABLE = False
@@ -19,9 +26,33 @@ except ImportError as e:
 # Apply custom styles
 st.markdown(styles.STYLES, unsafe_allow_html=True) 
 
+ANONYMOUS = "anonymous"
+
+def history_owner():
+    """Durable key of this visitor's history: the signed-in user, else ANONYMOUS"""
+    user = getattr(st, "user", None)
+    if user is not None and user.get("is_logged_in") and user.get("email"):
+        return f"user:{user.get('email')}"
+    return ANONYMOUS
+
+def history_store():
+    """Signed-in users' history is kept on disk under their account; an anonymous visitor's lives in session state
+    and ends with the browser session, so nobody else can ever reach it"""
+    if st.session_state.history_owner != ANONYMOUS:
+        return get_history_store()
+    if 'anonymous_history' not in st.session_state:
+        st.session_state.anonymous_history = HistoryStore(":memory:")
+    return st.session_state.anonymous_history
+
 # Initialize session state
-if 'history' not in st.session_state:
-    st.session_state.history = []
+if 'session_id' not in st.session_state:
+    # Identifies this browser session to the jobs it follows
+    st.session_state.session_id = uuid.uuid4().hex
+if 'history_owner' not in st.session_state:
+    # The on-disk history store is shared by the whole process; each owner only sees the entries it added
+    st.session_state.history_owner = history_owner()
+if 'history_page' not in st.session_state:
+    st.session_state.history_page = 0
 if 'notification' not in st.session_state:
     st.session_state.notification = None
 # if 'progress' not in st.session_state:
@@ -32,13 +63,19 @@ if 'generation_started' not in st.session_state:
     st.session_state.generation_started = False
 if 'result_data' not in st.session_state:
     st.session_state.result_data = None
+if 'similar_offer' not in st.session_state:
+    st.session_state.similar_offer = None
+if 'job_id' not in st.session_state:
+    st.session_state.job_id = None
+if 'resume_run' not in st.session_state:
+    st.session_state.resume_run = None
 
 # UI Components
 st.title("✨ Article Topic Generator")
 st.subheader("Create engaging article topics with AI")
 
-# API Key check
-if not os.environ.get("GOOGLE_API_KEY"):
+# API Key check (LLM_BACKEND=fake / replay run without Gemini)
+if DEFAULT_BACKEND == "gemini" and not os.environ.get("GOOGLE_API_KEY"):
     st.error("🔑 GOOGLE_API_KEY not set. Add it in Streamlit Secrets")
     st.stop()
 
@@ -63,49 +100,208 @@ if not os.environ.get("GOOGLE_API_KEY"):
 #         st.balloons()  
 #         st.success("🎉 All tasks completed!")
 
+def generation_options():
+    """The generator options the form's widgets select (read when called, once the form has been drawn)"""
+    return {
+        "mode": mode,
+        "routing": routing,
+        "structured_assembly": structured_assembly,
+        "corpus": (DEFAULT_RESEARCH_CORPUS or NOTES_DIR) if use_corpus else None
+    }
+
 # Main input area
 with st.form("generator_form"):
     theme = st.text_input("Enter theme:", placeholder="e.g., Artificial Intelligence")
+    mode = st.radio(
+        "⚙️ Execution mode",
+        MODES,
+        horizontal=True,
+        help="sequential: one agent after another · dag: condensing and link collecting overlap · fan-out: every topic is researched in parallel"
+    )
+    # A MODEL_ROUTING config file shows up as a choice of its own
+    routing_choices = list(dict.fromkeys([DEFAULT_ROUTING, *ROUTING_POLICIES]))
+    routing = st.radio(
+        "🧠 Model routing",
+        routing_choices,
+        horizontal=True,
+        help="single: every agent on the same model · tiered: a strong model plans and researches, a small model at temperature 0 condenses, collects links and writes"
+    )
+    structured_assembly = st.checkbox(
+        "🧩 Structured assembly",
+        help="Collect the links and write the final Markdown locally instead of with two more AI calls"
+    )
+    # RESEARCH_CORPUS points the researcher at a corpus of your own; the repo's notes are the default one
+    use_corpus = st.checkbox(
+        "📚 Research from local notes",
+        value=bool(DEFAULT_RESEARCH_CORPUS),
+        help="The researcher searches the local Markdown notes and cites them, instead of inventing sources"
+    )
+    use_cache = st.checkbox(
+        "♻️ Reuse cached AI responses",
+        value=True,
+        help="Answer prompts that were already sent before from the local response cache"
+    )
+    offer_similar = st.checkbox(
+        "🔎 Offer results for similar themes",
+        value=True,
+        help="If a near-identical theme was generated before, offer that result instead of running the agents again"
+    )
+    seed = st.number_input(
+        "🎲 Seed",
+        min_value=0,
+        value=0,
+        step=1,
+        help="The same theme and seed always get the same number of topics (so repeated requests can reuse earlier work); change it for another draw"
+    )
     generate_btn = st.form_submit_button("🚀 Generate Topics")
     
-    st.session_state.num_topics = random.randint(5, 10) 
     st.balloons() 
     
     if generate_btn and theme:
+        # The topic count comes from the theme and seed, not from a new random draw on every rerun
+        request = GenerationRequest(theme=theme, seed=int(seed))
+        st.session_state.num_topics = request.number_of_topics
         # Reset state for new generation
-        st.session_state.generation_started = True
-        st.session_state.progress = {"current": 0, "total": 5}
-        st.session_state.progress_messages = []
+        # Only results generated the same way (topic count, backend, models, pipeline, corpus) are offered
+        st.session_state.similar_offer = (
+            find_similar_result(theme, request.number_of_topics, **generation_options()) if offer_similar else None
+        )
+        st.session_state.generation_started = st.session_state.similar_offer is None
         st.session_state.result_data = None 
+        st.session_state.resume_run = None
         # st.balloons()
         # rain()
-        st.success(f"🎉 {st.session_state.num_topics} topics will be generated!")
+        if st.session_state.generation_started:
+            st.success(f"🎉 {st.session_state.num_topics} topics will be generated! (seed {request.seed})")
         
         # Show initial progress
         # show_progress()
         
         st.rerun()
 
-# Generation runner
-if st.session_state.get('generation_started') and not st.session_state.result_data:
-    try:
-        # Show spinner while working
-        with st.spinner("🔮 AI agents are working..."):
-            result = asyncio.run(
-                generate_article_topics(
-                    theme,
-                    st.session_state.num_topics
-                )
-            )
+def submit_generation(resume=None):
+    """Hand the generation (or the resumption of a failed one) to the background job runner and remember its job ID"""
+    if resume:
+        # A resumed run keeps the pipeline it was started with, whatever the widgets say now
+        job = get_job_runner().submit(
+            resume['theme'],
+            resume['topic_count'],
+            run_id=resume['run_id'],
+            cache="on" if use_cache else "off",
+            **resume_options(resume['run_id'])
+        )
+    else:
+        job = get_job_runner().submit(
+            theme,
+            st.session_state.num_topics,
+            cache="on" if use_cache else "off",
+            **generation_options()
+        )
+    st.session_state.job_id = job.id
+
+def submit_regeneration(result, index, options):
+    """Rerun the research chain of one topic of the current result on the job runner
+
+    options are the generator options the result was produced with, so the new topic is written the same way as
+    the rest of the article, whatever the widgets say now.
+    """
+    job = get_job_runner().submit_regeneration(
+        result,
+        index,
+        **{**options, "cache": "off"}  # a cached answer would just bring the same topic back
+    )
+    st.session_state.job_id = job.id
+
+# Offer a previous result for a near-identical theme
+if st.session_state.similar_offer:
+    match, similarity = st.session_state.similar_offer
+    st.info(f"💡 Topics for a similar theme - **{match['theme']}** ({match['topic_count']} topics, {similarity:.0%} match) - were generated on {match['timestamp']}.")
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("📂 Use these topics", use_container_width=True):
             st.session_state.result_data = {
-                'content': result.raw,
-                'theme': theme,
-                'topic_count': st.session_state.num_topics,
-                'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                'content': match['content'],
+                'theme': match['theme'],
+                'topic_count': match['topic_count'],
+                'timestamp': match['timestamp']
             }
-    except Exception as e:
-        st.error(f"❌ Error: {str(e)}")
+            st.session_state.similar_offer = None
+            st.rerun()
+    with col2:
+        if st.button("🚀 Generate anyway", use_container_width=True):
+            st.session_state.similar_offer = None
+            st.session_state.generation_started = True
+            st.rerun()
+
+# Generation runner: the crew runs on the job runner's threads, this script only polls it
+if st.session_state.get('generation_started') and not st.session_state.result_data and not st.session_state.job_id:
+    submit_generation()
+
+@st.fragment(run_every=1)
+def show_job_progress():
+    """Display the background job's progress, refreshing once a second until it finishes"""
+    job = get_job_runner().get(st.session_state.job_id)
+    if job is None:
+        st.session_state.job_id = None
         st.session_state.generation_started = False
+        st.rerun()
+
+    # Polling marks this session as one of the job's subscribers
+    job.poll(st.session_state.session_id)
+    p = job.progress
+    if p["total"]:
+        st.progress(min(p["current"] / p["total"], 1.0), text=f"🔮 AI agents are working... {p['current']}/{p['total']} tasks")
+    else:
+        st.progress(0.0, text="🔮 Waiting for a free worker...")
+    if job.subscribers > 1:
+        st.caption(f"👥 {job.subscribers} identical requests are sharing this generation")
+    for msg in job.messages:
+        st.success(msg)
+    if job.partial_output:
+        # The writer answers in TopicDraft JSON; show what has streamed so far as the article it will become
+        st.markdown(draft_preview(job.partial_output))
+
+    if job.done:
+        # The last events (e.g. the metrics) may have been queued after the poll above, just before the job finished
+        job.poll()
+        job.leave(st.session_state.session_id)
+        st.session_state.job_id = None
+        if job.status == "done":
+            # Recorded once, when the job finishes (identical content is only stored the first time)
+            history_store().add(st.session_state.history_owner, job.theme, job.num_topics, job.result.to_markdown(), job.options)
+            st.session_state.result_data = {
+                'content': job.result.to_markdown(),
+                'result': job.result,
+                'options': job.options,
+                'theme': job.theme,
+                'topic_count': job.num_topics,
+                'timestamp': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                'metrics': job.metrics
+            }
+        else:
+            st.session_state.generation_started = False
+            st.session_state.job_error = str(job.error)
+            if job.run_id:
+                # Its finished tasks are checkpointed, so the run can pick up where it stopped
+                st.session_state.resume_run = {'run_id': job.run_id, 'theme': job.theme, 'topic_count': job.num_topics}
+        st.rerun()
+
+if st.session_state.job_id:
+    show_job_progress()
+
+if st.session_state.get('job_error'):
+    st.error(f"❌ Error: {st.session_state.job_error}")
+    st.session_state.job_error = None
+
+if st.session_state.resume_run and not st.session_state.job_id:
+    if st.button("🔁 Resume from the last completed task"):
+        try:
+            submit_generation(st.session_state.resume_run)
+            st.session_state.generation_started = True
+        except ResumeRefused as error:
+            st.session_state.job_error = str(error)
+        st.session_state.resume_run = None
+        st.rerun()
 
 # Show progress if generation started
 # if st.session_state.get('generation_started'):
@@ -115,7 +311,16 @@ if st.session_state.get('generation_started') and not st.session_state.result_da
 if st.session_state.get('result_data'):
     data = st.session_state.result_data
     st.markdown("### 📝 Generated Topics")
-    st.markdown(data['content'])
+    if data.get('result'):
+        # One section per topic, each of which can be researched again on its own
+        for index, topic in enumerate(data['result'].topics):
+            st.markdown(f"## Topic {index + 1}: {topic.title}\n\n{topic.to_markdown()}")
+            if st.button("🔄 Regenerate this topic", key=f"regenerate_{index}", disabled=bool(st.session_state.job_id)):
+                submit_regeneration(data['result'], index, data['options'])
+                st.rerun()
+            st.markdown("---")
+    else:
+        st.markdown(data['content'])
 
     # Download button
     ts = datetime.datetime.now()
@@ -125,57 +330,84 @@ if st.session_state.get('result_data'):
     b64 = base64.b64encode(data['content'].encode()).decode()
     href = f'<a href="data:file/md;base64,{b64}" download="{filename}" style="color: #9a7bff; font-weight: bold; font-size: 30px;"> 📥 Download Topics </a>'
     st.markdown(href, unsafe_allow_html=True)
-    
-    # Add to history
-    st.session_state.history.insert(0, {
-        "id": str(uuid.uuid4()),
-        "theme": data['theme'],
-        "content": data['content'],
-        "topic_count": data['topic_count'],
-        "timestamp": data['timestamp']
-    })
-    
+
+    # Where the time and the tokens went, task by task
+    if data.get('metrics'):
+        summary = data['metrics']['summary']
+        with st.expander(f"⏱️ {summary['calls']} LLM calls, {summary['prompt_tokens'] + summary['completion_tokens']} tokens, ~${summary['cost_usd']:.4f}"):
+            st.table([
+                {
+                    "Task": task['task'],
+                    "Seconds": task['seconds'],
+                    "LLM calls": task['calls'],
+                    "Prompt tokens": task['prompt_tokens'],
+                    "Completion tokens": task['completion_tokens'],
+                    "Context tokens (unpruned)": f"{task.get('context_tokens', 0)} ({task.get('context_tokens_unpruned', 0)})",
+                    "Retries": task['retries'],
+                    "Cost (USD)": task['cost_usd']
+                }
+                for task in data['metrics']['tasks']
+            ])
+
     # Reset flags
     st.session_state.generation_started = False
 
-# History sidebar
+# History sidebar: newest first, searchable, one page at a time; full content is only loaded on demand
+HISTORY_PAGE_SIZE = 5
+history = history_store()
 st.sidebar.title("📚 Generation History")
-if st.session_state.history:
-    for item in st.session_state.history[:5]:
+search = st.sidebar.text_input("🔍 Search past generations", key="history_search")
+if search != st.session_state.get('history_last_search'):
+    st.session_state.history_last_search = search
+    st.session_state.history_page = 0
+entries, total = history.page(st.session_state.history_owner, st.session_state.history_page, HISTORY_PAGE_SIZE, search)
+if not entries and st.session_state.history_page > 0:
+    # The last entry of the page was deleted
+    st.session_state.history_page -= 1
+    st.rerun()
+
+if entries:
+    for item in entries:
         expander_label = f"{item['theme']} ({item['topic_count']} topics)"
         with st.sidebar.expander(expander_label):
             expanded_key = f"expanded_{item['id']}"
             if expanded_key not in st.session_state:
                 st.session_state[expanded_key] = False
 
+            st.markdown(f"**Generated:** {item['timestamp']}")
+            if item['options']:
+                settings = {key: value for key, value in item['options'].items() if key in ("mode", "routing", "structured_assembly", "corpus")}
+                st.caption("⚙️ " + " · ".join(f"{key}: {value}" for key, value in settings.items()))
             # Show preview or full content based on expanded state
             if not st.session_state[expanded_key]:
-                st.markdown(f"**Generated:** {item['timestamp']}")
-                st.markdown(f"**Preview:** {item['content'][:200]}...")
-            
+                st.markdown(f"**Preview:** {item['preview']}")
+
                 col1, col2 = st.columns(2)
                 with col1:
-                    ts = datetime.datetime.now()
-                    in_ts = f"{ts.day}_{ts.month}_{ts.year}_{ts.hour}_{ts.minute}_{ts.second}"
-                    fn = f"article_topics_{theme.replace(' ', '_')}_{in_ts}.md"
-                    
-                    st.download_button(
-                        label="📥 Download",
-                        data=item['content'],
-                        file_name=fn,
-                        mime="text/markdown",
-                        key=f"download_{item['id']}",
-                        use_container_width=True
-                    )
+                    if st.button("📖 Show all", key=f"expand_{item['id']}", use_container_width=True):
+                        st.session_state[expanded_key] = True
+                        st.rerun()
                 with col2:
                     if st.button("🗑️ Delete", key=f"delete_{item['id']}", use_container_width=True):
-                        st.session_state.history = [h for h in st.session_state.history if h['id'] != item['id']]
+                        history.delete(st.session_state.history_owner, item['id'])
                         st.rerun()
 
             else:
-                st.markdown(f"**Generated:** {item['timestamp']}")
+                content = history.get_content(st.session_state.history_owner, item['id']) or ""
                 st.markdown("**Full Content:**")
-                st.markdown(item['content'])
+                st.markdown(content)
+
+                ts = datetime.datetime.now()
+                in_ts = f"{ts.day}_{ts.month}_{ts.year}_{ts.hour}_{ts.minute}_{ts.second}"
+                fn = f"article_topics_{item['theme'].replace(' ', '_')}_{in_ts}.md"
+                st.download_button(
+                    label="📥 Download",
+                    data=content,
+                    file_name=fn,
+                    mime="text/markdown",
+                    key=f"download_{item['id']}",
+                    use_container_width=True
+                )
 
                 col1, col2 = st.columns(2)
                 with col1:
@@ -184,8 +416,23 @@ if st.session_state.history:
                         st.rerun()
                 with col2:
                     if st.button("🗑️ Delete", key=f"delete_{item['id']}_expanded", use_container_width=True):
-                        st.session_state.history = [h for h in st.session_state.history if h['id'] != item['id']]
+                        history.delete(st.session_state.history_owner, item['id'])
                         st.rerun()
+
+    pages = (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+    col1, col2, col3 = st.sidebar.columns([1, 2, 1])
+    with col1:
+        if st.button("◀", key="history_previous", disabled=st.session_state.history_page == 0):
+            st.session_state.history_page -= 1
+            st.rerun()
+    with col2:
+        st.caption(f"Page {st.session_state.history_page + 1} of {pages} ({total} results)")
+    with col3:
+        if st.button("▶", key="history_next", disabled=st.session_state.history_page + 1 >= pages):
+            st.session_state.history_page += 1
+            st.rerun()
+elif search:
+    st.sidebar.info("No past generations match your search")
 else:
     st.sidebar.info("No history yet")
 
@@ -0,0 +1,93 @@
+import re
+
+TOPIC_LINE = re.compile(r"^\s*(\d+)[.)]\s+(.+?)\s*$")
+CODE_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*$", re.MULTILINE)
+
+
+def strip_fences(text):
+    """Remove the ``` fences the LLM sometimes wraps its Markdown in"""
+    return CODE_FENCE.sub("", text or "").strip()
+
+
+def parse_topics(plan_text, limit=None):
+    """Parse the Topic Planner's numbered list into a list of topic titles"""
+    topics = []
+    for line in strip_fences(plan_text).splitlines():
+        match = TOPIC_LINE.match(line)
+        if not match:
+            continue
+        title = match.group(2).strip().strip("*_").strip()
+        if title:
+            topics.append(title)
+
+    if limit:
+        topics = topics[:limit]
+    return topics
+
+
+def merge_topic_sections(topics, sections):
+    """Join per-topic sections into the final '## Topic <Number>: <Title>' Markdown"""
+    parts = []
+    for number, (title, section) in enumerate(zip(topics, sections), start=1):
+        parts.append(f"## Topic {number}: {title}\n\n{strip_fences(section)}")
+    return "\n\n---\n\n".join(parts)
+
+
+URL = re.compile(r"https?://[^\s<>()\[\]\"'`]+")
+BULLET = re.compile(r"^\s*[-*+]\s+(.+?)\s*$")
+TOPIC_HEADING = re.compile(r"^#{1,3}\s*Topic\s+(\d+)\s*[:.\-]\s*(.+?)\s*$", re.MULTILINE)
+ANY_HEADING = re.compile(r"^#{1,3}\s", re.MULTILINE)
+
+
+def extract_section(text, heading):
+    """Return the body under a '### <heading>' line, up to the next heading (or None)"""
+    match = re.search(rf"^#{{1,3}}\s*{re.escape(heading)}:?\s*$", text, re.MULTILINE | re.IGNORECASE)
+    if not match:
+        return None
+    rest = text[match.end():]
+    following = ANY_HEADING.search(rest)
+    return rest[:following.start()] if following else rest
+
+
+def extract_links(text):
+    """Return the unique URLs of a research output, preferring its '### Source Links' section"""
+    text = strip_fences(text)
+    section = extract_section(text, "Source Links") or text
+    links = []
+    for url in URL.findall(section):
+        url = url.rstrip(".,;:*_")
+        if url not in links:
+            links.append(url)
+    return links
+
+
+def extract_condensed_points(text):
+    """Return the '- **heading:** summary' bullets of a condenser output"""
+    text = strip_fences(text)
+    section = extract_section(text, "Condensed Information Points") or text
+    points = []
+    for line in section.splitlines():
+        match = BULLET.match(line)
+        if match:
+            points.append(match.group(1))
+    return points
+
+
+def split_topics(text):
+    """Split a multi-topic output on its '## Topic <Number>: <Title>' headings into {number: body}"""
+    text = strip_fences(text)
+    headings = list(TOPIC_HEADING.finditer(text))
+    sections = {}
+    for index, heading in enumerate(headings):
+        end = headings[index + 1].start() if index + 1 < len(headings) else len(text)
+        sections[int(heading.group(1))] = text[heading.end():end]
+    return sections
+
+
+def render_topic_body(points, links):
+    """Render the condensed points and resource links of one topic as Markdown"""
+    lines = ["### Condensed Information Points"]
+    lines += [f"- {point}" for point in points] or ["- _No condensed points were returned for this topic._"]
+    lines += ["", "### Resources Used"]
+    lines += [f"{number}. {url}" for number, url in enumerate(links, start=1)] or ["_No source links were returned for this topic._"]
+    return "\n".join(lines)
@@ -0,0 +1,183 @@
+"""
+Headless batch mode: generate topics for a whole file of themes.
+
+    python streamlit_version/batch.py themes.csv --workers 4 --rpm 30 --out-dir article_topics
+    cat themes.txt | python streamlit_version/batch.py - --format jsonl
+
+Themes are read from CSV (a 'theme' column, optional 'topics' column), JSONL ({"theme": ..., "topics": ...})
+or plain text (one theme per line). Results are written as one Markdown (or HTML) file per theme, or as one line
+per theme in results.jsonl; every file is written on a thread pool of its own as soon as its theme is done. Whatever
+the format, every theme that fails gets a line (with its error) in failures.jsonl.
+"""
+
+import os
+import re
+import csv
+import sys
+import json
+import asyncio
+import argparse
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from generator import get_generator, MODES
+from schemas import GenerationRequest
+from backends import BACKENDS, DEFAULT_BACKEND
+from output_sinks import open_output
+from routing import ROUTING_POLICIES, DEFAULT_ROUTING
+from retrieval import DEFAULT_RESEARCH_CORPUS
+
+_jsonl_lock = threading.Lock()
+
+
+def read_themes(path, input_format=None):
+    """Return [{"theme", "topics"}] from a CSV / JSONL / text file ('-' reads stdin)"""
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+
+    if not input_format:
+        extension = os.path.splitext(path)[1].lower()
+        input_format = {".csv": "csv", ".jsonl": "jsonl", ".json": "jsonl"}.get(extension, "text")
+
+    rows = []
+    if input_format == "jsonl":
+        for line in text.splitlines():
+            if line.strip():
+                record = json.loads(line)
+                rows.append({"theme": record["theme"], "topics": record.get("topics")})
+    elif input_format == "csv":
+        reader = csv.reader(text.splitlines())
+        first = next(reader, [])
+        header = [column.strip().lower() for column in first]
+        if "theme" in header:
+            theme_column = header.index("theme")
+            topics_column = header.index("topics") if "topics" in header else None
+        else:
+            # No header row: the first column holds the themes
+            theme_column, topics_column = 0, None
+            reader = [first, *reader]
+        for row in reader:
+            if len(row) > theme_column:
+                topics = row[topics_column] if topics_column is not None and len(row) > topics_column else None
+                rows.append({"theme": row[theme_column], "topics": topics})
+    else:
+        rows = [{"theme": line, "topics": None} for line in text.splitlines()]
+
+    themes = []
+    for row in rows:
+        if row["theme"].strip():
+            # Left as read: the count is validated when its theme runs, so a bad one only fails that theme
+            topics = (row["topics"].strip() or None) if isinstance(row["topics"], str) else row["topics"]
+            themes.append({"theme": row["theme"].strip(), "topics": topics})
+    return themes
+
+
+def append_jsonl(path, record):
+    with _jsonl_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def slugify(theme):
+    return re.sub(r"[^A-Za-z0-9]+", "_", theme).strip("_")[:80] or "theme"
+
+
+async def run_batch(themes, out_dir, output_format="markdown", workers=4, rpm=None, seed=0, **options):
+    """Generate every theme, at most `workers` at a time, writing each result as soon as it is ready
+
+    Themes without a topic count get one drawn from the theme and seed, so rerunning a batch repeats its requests.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    # rpm sets the process-wide rate limiter that every worker's LLM calls go through
+    generator = get_generator(rpm=rpm, **options)
+    # Crews run on the loop's default pool, which holds min(32, CPUs + 4) threads unless replaced: sized to the
+    # workers, so that is how many themes really run at once
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=workers * generator.threads_per_generation,
+                                                 thread_name_prefix="batch"))
+    # Files are written on their own threads, so a finished theme's file never waits for a crew thread to free up
+    writers = ThreadPoolExecutor(max_workers=2, thread_name_prefix="batch-output")
+    semaphore = asyncio.Semaphore(workers)
+    jsonl_path = os.path.join(out_dir, "results.jsonl")
+    failures_path = os.path.join(out_dir, "failures.jsonl")
+    failures = 0
+
+    async def run_theme(index, item):
+        nonlocal failures
+        record = {"theme": item["theme"], "topic_count": item["topics"], "seed": seed}
+        started = datetime.datetime.now()
+        try:
+            # e.g. a topic count that is not a positive number: recorded as this theme's failure
+            request = GenerationRequest(theme=item["theme"], number_of_topics=item["topics"] or None, seed=seed)
+            record.update(theme=request.theme, topic_count=request.number_of_topics)
+            async with semaphore:
+                started = datetime.datetime.now()
+                result = await generator.generate_topics(request.theme, request.number_of_topics)
+            record.update(status="done", content=result.to_markdown())
+        except Exception as error:
+            failures += 1
+            record.update(status="error", error=str(error))
+        record["seconds"] = round((datetime.datetime.now() - started).total_seconds(), 2)
+
+        if output_format == "jsonl":
+            await loop.run_in_executor(writers, append_jsonl, jsonl_path, record)
+        elif record["status"] == "done":
+            sink = open_output(output_format, out_dir, f"{index:03d}_{slugify(item['theme'])}", item["theme"])
+            await loop.run_in_executor(writers, sink.close, record["content"])
+        if record["status"] == "error":
+            await loop.run_in_executor(writers, append_jsonl, failures_path, {"index": index, **record})
+
+        mark = "✅" if record["status"] == "done" else "❌"
+        print(f"{mark} [{index}/{len(themes)}] {item['theme']} ({record['seconds']}s)", flush=True)
+
+    try:
+        await asyncio.gather(*(run_theme(index, item) for index, item in enumerate(themes, start=1)))
+    finally:
+        writers.shutdown()
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate article topics for many themes at once.")
+    parser.add_argument("themes", help="CSV, JSONL or text file of themes ('-' reads stdin)")
+    parser.add_argument("--input-format", choices=("csv", "jsonl", "text"), help="default: guessed from the file extension")
+    parser.add_argument("--out-dir", default="article_topics", help="where results are written")
+    parser.add_argument("--format", dest="output_format", choices=("markdown", "html", "jsonl"), default="markdown")
+    parser.add_argument("--seed", type=int, default=0, help="draws the topic count of themes that do not give one")
+    parser.add_argument("--workers", type=int, default=4, help="themes generated at the same time")
+    parser.add_argument("--rpm", type=int, help="LLM requests per minute across all workers")
+    parser.add_argument("--mode", choices=MODES, default="sequential")
+    parser.add_argument("--structured-assembly", action="store_true")
+    parser.add_argument("--routing", default=DEFAULT_ROUTING, help=f"model routing: {', '.join(ROUTING_POLICIES)} or a JSON config")
+    parser.add_argument("--corpus", default=DEFAULT_RESEARCH_CORPUS or None, help="directory of Markdown / text notes the researcher searches and cites")
+    parser.add_argument("--cache", choices=("off", "on", "replay"), default="on")
+    parser.add_argument("--backend", choices=BACKENDS, default=DEFAULT_BACKEND, help="'fake' and 'replay' run without Gemini")
+    args = parser.parse_args(argv)
+
+    themes = read_themes(args.themes, args.input_format)
+    if not themes:
+        parser.error("no themes found in the input")
+
+    print(f"Generating topics for {len(themes)} themes, {args.workers} at a time...")
+    failures = asyncio.run(run_batch(
+        themes,
+        args.out_dir,
+        output_format=args.output_format,
+        workers=args.workers,
+        rpm=args.rpm,
+        seed=args.seed,
+        mode=args.mode,
+        structured_assembly=args.structured_assembly,
+        routing=args.routing,
+        corpus=args.corpus,
+        cache=args.cache,
+        backend=args.backend
+    ))
+    print(f"\nDone: {len(themes) - failures} succeeded, {failures} failed. Results are in {args.out_dir}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
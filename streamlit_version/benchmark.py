@@ -0,0 +1,199 @@
+"""
+End-to-end benchmark of the agent pipeline against the local fake LLM backend (no network, no API key).
+
+    python streamlit_version/benchmark.py --topics 5-10 --concurrency 1,4 --runs 8 --out benchmark.json
+    python streamlit_version/benchmark.py --mode fan-out --latency 0.2 --compare benchmark.json
+
+Every configuration (topic count x concurrent generations) runs --runs generations in a process of its own
+and reports p50/p95 latency, LLM calls and tokens per generation, the share of the latency spent waiting on the
+LLM, and the peak RSS of that process. Results are saved as JSON; --compare prints the change against an
+earlier file.
+"""
+
+import os
+import sys
+import math
+import json
+import time
+import asyncio
+import argparse
+import datetime
+import platform
+import resource
+import tempfile
+import subprocess
+from generator import ArticleTopicGenerator, MODES
+from routing import ROUTING_POLICIES
+
+
+def parse_range(text):
+    """'5-10' -> [5, ..., 10], '1,4,8' -> [1, 4, 8]"""
+    values = []
+    for part in text.split(","):
+        if "-" in part:
+            start, end = part.split("-")
+            values.extend(range(int(start), int(end) + 1))
+        else:
+            values.append(int(part))
+    return values
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def peak_rss_mb():
+    # ru_maxrss is the peak of the whole process, which is why every configuration gets a process of its own;
+    # it is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+async def run_configuration(generator, number_of_topics, concurrency, runs):
+    """Run `runs` generations, `concurrency` at a time, and summarize them"""
+    # One fake client per routed (model, temperature); their counters are added up
+    llms = list(generator.backend_llms.values())
+    before = {key: sum(llm.usage[key] for llm in llms) for key in llms[0].usage}
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def run_one(index):
+        async with semaphore:
+            started = time.perf_counter()
+            await generator.generate_topics(f"Benchmark theme {index}", number_of_topics)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(run_one(index) for index in range(runs)))
+    wall = time.perf_counter() - started
+
+    # The fake backend clients are shared by every run of this generator, so their counters are per-batch totals
+    used = {key: sum(llm.usage[key] for llm in llms) - before[key] for key in before}
+    return {
+        "topics": number_of_topics,
+        "concurrency": concurrency,
+        "runs": runs,
+        "p50_seconds": round(percentile(latencies, 0.50), 3),
+        "p95_seconds": round(percentile(latencies, 0.95), 3),
+        "mean_seconds": round(sum(latencies) / runs, 3),
+        "generations_per_minute": round(60 * runs / wall, 2),
+        "calls_per_generation": round(used["calls"] / runs, 2),
+        "prompt_tokens_per_generation": round(used["prompt_tokens"] / runs),
+        "completion_tokens_per_generation": round(used["completion_tokens"] / runs),
+        # Simulated LLM time vs everything else (CrewAI orchestration, prompt rendering, assembly)
+        "llm_seconds_per_generation": round(used["seconds"] / runs, 3),
+        "overhead_seconds_per_generation": round(max(0.0, sum(latencies) - used["seconds"]) / runs, 3),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+
+def compare(results, baseline_path):
+    """Print p50/p95 changes against the matching configurations of an earlier results file"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(row["topics"], row["concurrency"]): row for row in json.load(f)["results"]}
+
+    print(f"\nCompared with {baseline_path}:")
+    for row in results:
+        old = baseline.get((row["topics"], row["concurrency"]))
+        if not old:
+            continue
+        changes = []
+        for key in ("p50_seconds", "p95_seconds", "calls_per_generation"):
+            change = (row[key] - old[key]) / old[key] * 100 if old[key] else 0.0
+            changes.append(f"{key} {old[key]} -> {row[key]} ({change:+.1f}%)")
+        print(f"  topics={row['topics']} concurrency={row['concurrency']}: " + ", ".join(changes))
+
+
+def build_generator(args):
+    generator = ArticleTopicGenerator(
+        mode=args.mode,
+        max_concurrency=args.max_concurrency,
+        structured_assembly=args.structured_assembly,
+        backend="fake",
+        routing=args.routing,
+        max_calls_per_task=0,  # no call budget: the benchmark measures what the pipeline actually uses
+        checkpoint_path=None  # checkpoint writes would be counted as overhead of whatever is being measured
+    )
+    for llm in generator.backend_llms.values():
+        llm.latency = args.latency
+        llm.tokens_per_second = args.tokens_per_second
+    return generator
+
+
+def run_in_subprocess(args, number_of_topics, concurrency):
+    """Run one configuration in a fresh interpreter and return its row, so the peak RSS is that configuration's"""
+    command = [
+        sys.executable, os.path.abspath(__file__),
+        "--topics", str(number_of_topics), "--concurrency", str(concurrency), "--runs", str(args.runs),
+        "--mode", args.mode, "--max-concurrency", str(args.max_concurrency), "--routing", args.routing,
+        "--latency", str(args.latency), "--tokens-per-second", str(args.tokens_per_second)
+    ]
+    if args.structured_assembly:
+        command.append("--structured-assembly")
+    # The row goes to a file of its own: CrewAI writes to stdout too, prompts included, without ending its lines
+    with tempfile.TemporaryDirectory() as directory:
+        result_path = os.path.join(directory, "row.json")
+        command.extend(["--configuration-only", result_path])
+        # No trace prompt to wait on, and nothing for it to read if one still comes up; no telemetry exports
+        # running alongside the measured generations either
+        env = {**os.environ, "CREWAI_TRACING_ENABLED": "false", "CREWAI_DISABLE_TELEMETRY": "true", "OTEL_SDK_DISABLED": "true"}
+        proc = subprocess.run(command, capture_output=True, text=True, stdin=subprocess.DEVNULL, env=env)
+        if proc.returncode != 0 or not os.path.exists(result_path):
+            sys.stderr.write(proc.stderr)
+            raise RuntimeError(f"The benchmark of topics={number_of_topics} concurrency={concurrency} failed.")
+        with open(result_path, encoding="utf-8") as f:
+            return json.load(f)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the article topic pipeline against a simulated LLM.")
+    parser.add_argument("--topics", default="5-10", help="topic counts to sweep, e.g. 5-10 or 5,7,10")
+    parser.add_argument("--concurrency", default="1,4", help="generations in flight at once, e.g. 1,4,8")
+    parser.add_argument("--runs", type=int, default=8, help="generations per configuration")
+    parser.add_argument("--mode", choices=MODES, default="sequential")
+    parser.add_argument("--structured-assembly", action="store_true")
+    parser.add_argument("--max-concurrency", type=int, default=4, help="fan-out mode: topics researched at once")
+    parser.add_argument("--routing", default="single", help=f"model routing: {', '.join(ROUTING_POLICIES)} or a JSON config")
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated seconds per LLM call")
+    parser.add_argument("--tokens-per-second", type=float, default=200, help="simulated generation speed")
+    parser.add_argument("--out", default="benchmark.json", help="where the JSON results are written")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    # Used by run_in_subprocess: run the one --topics / --concurrency configuration and write its row to this file
+    parser.add_argument("--configuration-only", metavar="PATH", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.configuration_only:
+        row = asyncio.run(run_configuration(build_generator(args), int(args.topics), int(args.concurrency), args.runs))
+        with open(args.configuration_only, "w", encoding="utf-8") as f:
+            json.dump(row, f)
+        return 0
+
+    results = []
+    for concurrency in parse_range(args.concurrency):
+        for number_of_topics in parse_range(args.topics):
+            row = run_in_subprocess(args, number_of_topics, concurrency)
+            results.append(row)
+            print(f"topics={number_of_topics:<3} concurrency={concurrency:<3} p50={row['p50_seconds']}s "
+                  f"p95={row['p95_seconds']}s calls={row['calls_per_generation']} "
+                  f"tokens={row['prompt_tokens_per_generation'] + row['completion_tokens_per_generation']} "
+                  f"rss={row['peak_rss_mb']}MB", flush=True)
+
+    report = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        "results": results
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,210 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+DEFAULT_CHECKPOINT_PATH = os.environ.get(
+    "CHECKPOINT_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "article_topic_generator", "checkpoints.sqlite3")
+)
+DEFAULT_TTL_SECONDS = 3 * 24 * 60 * 60  # runs untouched for three days are forgotten
+# Every process stamps its running runs this often; a running run whose stamp is older than
+# LIVE_HEARTBEATS beats belongs to a process that is gone, and can be resumed
+HEARTBEAT_SECONDS = 30
+LIVE_HEARTBEATS = 3
+
+
+class ResumeRefused(ValueError):
+    """Raised when a run cannot be resumed: it is unknown, still running, or was started with other settings"""
+
+
+class CheckpointStore:
+    """SQLite store of every completed task output, keyed by run ID, so an interrupted run can resume"""
+
+    def __init__(self, path=DEFAULT_CHECKPOINT_PATH, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    theme TEXT NOT NULL,
+                    number_of_topics INTEGER NOT NULL,
+                    options TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL,
+                    heartbeat REAL
+                )"""
+            )
+            if "heartbeat" not in [row[1] for row in self._conn.execute("PRAGMA table_info(runs)")]:
+                self._conn.execute("ALTER TABLE runs ADD COLUMN heartbeat REAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS task_outputs (
+                    run_id TEXT NOT NULL,
+                    task TEXT NOT NULL,
+                    agent TEXT,
+                    raw TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    PRIMARY KEY (run_id, task)
+                )"""
+            )
+            cutoff = time.time() - ttl_seconds
+            self._conn.execute("DELETE FROM task_outputs WHERE run_id IN (SELECT run_id FROM runs WHERE updated < ?)", (cutoff,))
+            self._conn.execute("DELETE FROM runs WHERE updated < ?", (cutoff,))
+
+        self._live = set()  # run IDs this process is running, stamped by the heartbeat thread
+        self._heartbeat = None
+
+    def start(self, theme, number_of_topics, options=None, run_id=None):
+        """Register a run (a new one unless run_id is given) and return its Checkpoint
+
+        Resuming a run is refused while it is still running somewhere, or when its fingerprint differs
+        from options["fingerprint"] (other models, prompts or pipeline settings).
+        """
+        options = options or {}
+        if run_id and (run := self.run(run_id)):
+            check_resumable(run, options)
+        run_id = run_id or uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO runs (run_id, theme, number_of_topics, options, status, created, updated, heartbeat)
+                   VALUES (?, ?, ?, ?, 'running', ?, ?, ?)
+                   ON CONFLICT (run_id) DO UPDATE SET status = 'running', updated = excluded.updated, heartbeat = excluded.heartbeat""",
+                (run_id, theme, number_of_topics, json.dumps(options, default=str), now, now, now)
+            )
+            self._live.add(run_id)
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._beat, name="checkpoint-heartbeat", daemon=True)
+                self._heartbeat.start()
+        return Checkpoint(self, run_id)
+
+    def _beat(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            with self._lock, self._conn:
+                live = list(self._live)
+                self._conn.executemany("UPDATE runs SET heartbeat = ? WHERE run_id = ?", [(time.time(), run_id) for run_id in live])
+
+    def run(self, run_id):
+        """Return {"run_id", "theme", "number_of_topics", "options", "status", "live"} of a run, or None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_id, theme, number_of_topics, options, status, heartbeat FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        if not row:
+            return None
+        # A running run is live while some process keeps stamping it
+        live = row[4] == "running" and (row[5] or 0) >= time.time() - HEARTBEAT_SECONDS * LIVE_HEARTBEATS
+        return {"run_id": row[0], "theme": row[1], "number_of_topics": row[2], "options": json.loads(row[3]),
+                "status": row[4], "live": live}
+
+    def latest_incomplete(self, origin=None):
+        """The most recently updated run that did not finish and is not still running, or None
+
+        origin (e.g. {"cli": True}) only considers runs whose options include all of its items.
+        """
+        with self._lock:
+            run_ids = [row[0] for row in self._conn.execute("SELECT run_id FROM runs WHERE status != 'done' ORDER BY updated DESC")]
+        for run_id in run_ids:
+            run = self.run(run_id)
+            if run and not run["live"] and all(run["options"].get(key) == value for key, value in (origin or {}).items()):
+                return run
+        return None
+
+    def save(self, run_id, task, agent, raw):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO task_outputs (run_id, task, agent, raw, created) VALUES (?, ?, ?, ?, ?)",
+                (run_id, task, agent, raw, now)
+            )
+            self._conn.execute("UPDATE runs SET updated = ? WHERE run_id = ?", (now, run_id))
+
+    def outputs(self, run_id):
+        """{task name: (agent role, raw output)} of every task the run has completed"""
+        with self._lock:
+            rows = self._conn.execute("SELECT task, agent, raw FROM task_outputs WHERE run_id = ?", (run_id,)).fetchall()
+        return {task: (agent, raw) for task, agent, raw in rows}
+
+    def finish(self, run_id, status):
+        with self._lock, self._conn:
+            self._live.discard(run_id)
+            self._conn.execute("UPDATE runs SET status = ?, updated = ? WHERE run_id = ?", (status, time.time(), run_id))
+
+
+class Checkpoint:
+    """One run's view of the store: what it has completed so far, and where new task outputs go"""
+
+    def __init__(self, store, run_id):
+        self.store = store
+        self.run_id = run_id
+        self.completed = store.outputs(run_id)
+
+    def save(self, output):
+        """Record a finished CrewAI TaskOutput"""
+        raw = output.raw or ""
+        self.completed[output.name] = (output.agent, raw)
+        self.store.save(self.run_id, output.name, output.agent, raw)
+
+    def finish(self, status="done"):
+        self.store.finish(self.run_id, status)
+
+
+def check_resumable(run, options):
+    """Raise ResumeRefused unless run can be picked up by a process that would start it with options"""
+    if run is None:
+        raise ResumeRefused("There is no such run to resume.")
+    if run["live"]:
+        raise ResumeRefused(f"Run {run['run_id']} is still running.")
+    stored = run["options"]
+    if stored.get("fingerprint") != options.get("fingerprint"):
+        if stored.get("prompt_version") != options.get("prompt_version"):
+            reason = f"prompt version {stored.get('prompt_version')}, not {options.get('prompt_version')}"
+        else:
+            reason = "other models, prompts or pipeline settings"
+        raise ResumeRefused(f"Run {run['run_id']} was started with {reason}; start a new run instead.")
+
+
+def restore_tasks(tasks, completed):
+    """Give every already-completed task its recorded output and return the tasks that still have to run"""
+    # Imported here so the CLI only pays for CrewAI once it actually builds a crew
+    from crewai.tasks.task_output import TaskOutput
+    from schemas import parse_output
+
+    remaining = []
+    for task in tasks:
+        if task.name in completed:
+            agent, raw = completed[task.name]
+            # Typed outputs are parsed back, so their context can again be summarized down to the budget
+            pydantic = parse_output(raw, task.output_pydantic) if task.output_pydantic else None
+            parsed_json = parse_output(raw, task.output_json) if task.output_json else None
+            # Downstream tasks read their context from these outputs
+            task.output = TaskOutput(
+                name=task.name, description=task.description, raw=raw, agent=agent or task.agent.role,
+                pydantic=pydantic, json_dict=parsed_json.model_dump() if parsed_json else None
+            )
+        else:
+            remaining.append(task)
+    return remaining
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_checkpoint_store(path=DEFAULT_CHECKPOINT_PATH):
+    """Return the process-wide CheckpointStore for path, opening it on first use"""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = CheckpointStore(path)
+        return _stores[path]
@@ -0,0 +1,97 @@
+import os
+import re
+import json
+from rate_limit import estimate_tokens
+
+# Most tokens one upstream output may take up in a downstream task's prompt (0: no limit, only compaction)
+DEFAULT_CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "3000"))
+# Summarization steps tried in order until an output fits: (longest string in characters, items per nested list)
+SHRINK_STEPS = [(None, None), (400, None), (200, 6), (120, 4), (80, 3)]
+
+
+def first_sentences(text, max_chars):
+    """Cut text at the last sentence end (else word) that fits in max_chars"""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    end = max(cut.rfind(". "), cut.rfind("! "), cut.rfind("? "))
+    if end > max_chars // 3:
+        return cut[:end + 1]
+    return cut.rsplit(" ", 1)[0] + "…"
+
+
+def shrink(value, max_chars=None, max_items=None, depth=0):
+    """Shorten long strings and cap nested lists of objects; top-level lists (the topics) and URLs are kept whole"""
+    if isinstance(value, dict):
+        return {key: shrink(item, max_chars, max_items, depth + 1) for key, item in value.items()}
+    if isinstance(value, list):
+        items = value
+        if max_items and depth > 1 and items and all(isinstance(item, dict) for item in items):
+            items = items[:max_items]
+        return [shrink(item, max_chars, max_items, depth + 1) for item in items]
+    if isinstance(value, str) and max_chars and not value.startswith(("http://", "https://")):
+        return first_sentences(value, max_chars)
+    return value
+
+
+def compact_markdown(text):
+    """Free-form output: drop code fences, trailing spaces and runs of blank lines"""
+    text = re.sub(r"^```\w*\s*$", "", text.strip(), flags=re.MULTILINE)
+    text = re.sub(r"[ \t]+$", "", text, flags=re.MULTILINE)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+def prune_text(output, budget=DEFAULT_CONTEXT_TOKEN_BUDGET):
+    """The smallest faithful rendering of a task output for downstream prompts: compact JSON of its typed
+    output, summarized step by step while it is over budget; free-form text is only compacted"""
+    if getattr(output, "pydantic", None) is None:
+        return compact_markdown(output.raw or "")
+
+    data = output.pydantic.model_dump(mode="json")
+    for max_chars, max_items in SHRINK_STEPS:
+        text = json.dumps(shrink(data, max_chars, max_items), ensure_ascii=False, separators=(",", ":"))
+        if not budget or estimate_tokens(text) <= budget:
+            break
+    return text
+
+
+class ContextPruner:
+    """Shrinks every finished task's output to what the tasks that list it as context need, before they run,
+    and reports the context each task received"""
+
+    def __init__(self, tasks, budget=DEFAULT_CONTEXT_TOKEN_BUDGET):
+        self.budget = budget
+        # A task built without context holds CrewAI's NOT_SPECIFIED sentinel (truthy, not a list) and lists nothing
+        self.context_of = {
+            task.name: [context.name for context in task.context] if isinstance(task.context, list) else []
+            for task in tasks
+        }
+        self.consumed = {name for names in self.context_of.values() for name in names}
+        self.sizes = {}  # task name -> (tokens before, tokens after pruning)
+        self.originals = {}  # task name -> full raw output, put back once the crew has finished
+
+    def prune(self, output):
+        """Call as soon as a task finishes (CrewAI reads its context from output.raw when the next task starts)"""
+        if output.name not in self.consumed or output.name in self.originals:
+            return
+        raw = output.raw or ""
+        pruned = prune_text(output, self.budget)
+        if len(pruned) < len(raw):
+            self.originals[output.name] = raw
+            output.raw = pruned
+        self.sizes[output.name] = (estimate_tokens(raw), estimate_tokens(output.raw or ""))
+
+    def report(self, task_name):
+        """Context tokens a task received, what they would have been unpruned, and the per-output budget"""
+        sizes = [self.sizes.get(name, (0, 0)) for name in self.context_of.get(task_name, [])]
+        return {
+            "context_tokens": sum(after for _, after in sizes),
+            "context_tokens_unpruned": sum(before for before, _ in sizes),
+            "context_budget": self.budget * len(sizes),
+        }
+
+    def restore(self, outputs):
+        """Give the pruned outputs their full text back, so results are built from what the agents wrote"""
+        for output in outputs:
+            if output.name in self.originals:
+                output.raw = self.originals[output.name]
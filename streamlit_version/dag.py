@@ -0,0 +1,53 @@
+import asyncio
+import functools
+import contextvars
+from crewai import Crew
+from crewai.crews.crew_output import CrewOutput
+from crewai.types.usage_metrics import UsageMetrics
+
+
+def dag_stages(tasks):
+    """Group a crew's tasks into stages whose tasks can run at the same time
+
+    A task joins the current stage when it lists its context and reads nothing from that stage; a task
+    without a context list reads every task before it, so it always starts a stage of its own.
+    """
+    stages = []
+    for task in tasks:
+        context = task.context if isinstance(task.context, list) else None
+        if stages and context is not None and all(other is not upstream for other in stages[-1] for upstream in context):
+            stages[-1].append(task)
+        else:
+            stages.append([task])
+    return stages
+
+
+async def kickoff_dag(crew, inputs):
+    """Kick off a crew stage by stage, running every task of a stage as its own single-task crew
+
+    CrewAI's own async_execution never resolves a task's future when the task raises, which leaves the crew
+    waiting forever; here every task runs through kickoff_async, so its exception fails the run at once.
+    """
+    outputs = []
+    token_usage = UsageMetrics()
+    for stage in dag_stages(crew.tasks):
+        runs = [
+            Crew(agents=[task.agent], tasks=[task], process="sequential", verbose=False, memory=False,
+                 task_callback=crew.task_callback)
+            for task in stage
+        ]
+        for output in await asyncio.gather(*(run.kickoff_async(inputs=inputs) for run in runs)):
+            outputs.extend(output.tasks_output)
+            token_usage.add_usage_metrics(output.token_usage)
+    return CrewOutput(raw=outputs[-1].raw, tasks_output=outputs, token_usage=token_usage)
+
+
+async def kickoff_in_pool(executor, crew, inputs):
+    """Crew.kickoff_async, but on executor instead of the event loop's default thread pool
+
+    The default pool only has min(32, CPUs + 4) threads, so crews kicked off together beyond that wait for a thread
+    whatever concurrency the caller allows; a pool of the caller's own size runs them all at once.
+    """
+    # As asyncio.to_thread does, the crew runs in a copy of the caller's context
+    call = functools.partial(contextvars.copy_context().run, crew.kickoff, inputs=inputs)
+    return await asyncio.get_running_loop().run_in_executor(executor, call)
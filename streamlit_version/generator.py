@@ -3,77 +3,160 @@ import sys
 sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 
 import os
+import json
 import asyncio
-from random import randint
-from crewai import Agent, Task, Crew, LLM
+import hashlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from crewai import Agent, Task, Crew
+from crewai.crews.crew_output import CrewOutput
+from crewai.types.usage_metrics import UsageMetrics
+from schemas import (
+    TopicPlan, ResearchReport, TopicResearch, CondensedReport, TopicSummary, LinkReport, TopicLinks, TopicDraft,
+    GenerationRequest, plan_from, research_from, summaries_from, links_from, parse_output, build_result
+)
+from llm_cache import CachedLLM, get_response_cache, CACHE_MODES, DEFAULT_CACHE_PATH
+from theme_cache import get_theme_index, DEFAULT_SIMILARITY_THRESHOLD
+from streaming import stream_tokens, STREAMING_AVAILABLE
+from rate_limit import RateLimitedLLM, CallBudget, get_rate_limiter, DEFAULT_MAX_CALLS_PER_TASK
+from backends import create_llm, BACKENDS, DEFAULT_BACKEND
+from routing import load_routing, DEFAULT_ROUTING
+from instrumentation import MeteredLLM, RunMetrics, get_metrics_sinks
+from checkpoints import get_checkpoint_store, restore_tasks, ResumeRefused, DEFAULT_CHECKPOINT_PATH
+from context_pruning import ContextPruner, DEFAULT_CONTEXT_TOKEN_BUDGET
+from retrieval import get_corpus_index, DEFAULT_RESEARCH_CORPUS, DEFAULT_CORPUS_INDEX_DIR
+from dag import dag_stages, kickoff_dag, kickoff_in_pool
+
+MODES = ("sequential", "dag", "fan-out")
+DEFAULT_MAX_CONCURRENCY = 4
+# Part of every request fingerprint: bump it whenever an agent's or task's prompt changes
+PROMPT_VERSION = 2
+# Research grounded in a corpus is a few searches, not open-ended exploring, so it is cut off much sooner
+GROUNDED_RESEARCH_MAX_ITER = 15
 
 class ArticleTopicGenerator:
-    def __init__(self):
+    def __init__(self, mode="sequential", max_concurrency=DEFAULT_MAX_CONCURRENCY, structured_assembly=False,
+                 cache="off", cache_path=DEFAULT_CACHE_PATH, rpm=None, tpm=None,
+                 max_calls_per_task=DEFAULT_MAX_CALLS_PER_TASK, backend=DEFAULT_BACKEND,
+                 checkpoint_path=DEFAULT_CHECKPOINT_PATH, routing=DEFAULT_ROUTING,
+                 context_budget=DEFAULT_CONTEXT_TOKEN_BUDGET, corpus=DEFAULT_RESEARCH_CORPUS,
+                 corpus_index_dir=DEFAULT_CORPUS_INDEX_DIR):
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode '{mode}'. Choose one of: {', '.join(MODES)}")
+        if cache not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{cache}'. Choose one of: {', '.join(CACHE_MODES)}")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown LLM backend '{backend}'. Choose one of: {', '.join(BACKENDS)}")
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+
+        self.mode = mode
+        self.max_concurrency = max_concurrency
+        # "gemini" calls the API; "fake" and "replay" answer locally (canned / recorded responses)
+        self.backend = backend
+        # Replace the Link Collector and Writer LLM calls with the local parser/renderer in assembly.py
+        self.structured_assembly = structured_assembly
+        # "on" answers repeated prompts from disk, "replay" additionally never touches the network
+        self.cache = cache
+        self.cache_path = cache_path
+        # Limits of the process-wide rate limiter (None keeps the GEMINI_RPM / GEMINI_TPM defaults)
+        self.rpm = rpm
+        self.tpm = tpm
+        # A generation may make this many LLM calls per task before it is stopped
+        self.max_calls_per_task = max_calls_per_task
+        # Every completed task output is saved here by run ID, so a failed run can resume (None: off)
+        self.checkpoint_path = checkpoint_path
+        # {agent: (model, temperature)}: a routing policy name or a JSON config file (see routing.py)
+        self.routing = routing
+        self.routes = load_routing(routing)
+        # Tokens one upstream output may take up in a downstream task's prompt before it is summarized (0: no limit)
+        self.context_budget = context_budget
+        # A directory of Markdown / text documents the researcher searches instead of inventing sources (None: off)
+        self.corpus = corpus or None
+        self.corpus_index_dir = corpus_index_dir
+        # Opened now, so a missing corpus fails here and the first generation does not wait for a first build
+        if self.corpus:
+            get_corpus_index(self.corpus, corpus_index_dir)
+        # The options that decide what a run produces: a checkpointed run is resumed by a generator built from these
+        self.pipeline_options = {
+            "mode": mode, "structured_assembly": structured_assembly, "backend": backend, "routing": routing,
+            "context_budget": context_budget, "corpus": self.corpus, "corpus_index_dir": corpus_index_dir
+        }
+        self.total_tasks = 3 if structured_assembly else 5  # 5 agents/tasks
+        self.tasks_per_topic = 2 if structured_assembly else 3  # fan-out: research, condense[, collect]
+
+        # Built once per generator; every generation kicks off a copy, so templates stay untouched
         self.setup_llm()
-        self.total_tasks = 5  # 5 agents/tasks
-        
-    def task_callback(self, output):
-        """Callback function executed after each task completes"""
-        import streamlit as st
-        # Initialize progress if not exists
-        if 'progress' not in st.session_state:
-            st.session_state.progress = {"current": 0, "total": self.total_tasks}
-        
-        # Increment completed tasks
-        st.session_state.progress["current"] += 1
-        
-        # Get task name
-        task_name = getattr(output, 'name', 'Unknown Task')
-        if not task_name:
-            task_name = getattr(output, 'description', 'Unknown Task')[:50] + "..."
+        self.create_agents()
+        self.create_tasks()
+        self.create_crews()
         
-        # Add completion message
-        if 'progress_messages' not in st.session_state:
-            st.session_state.progress_messages = []
-        st.session_state.progress_messages.append(f"✅ {task_name} completed!")
-        
-        # Force UI update
-        st.rerun()
-    
     def setup_llm(self):
-        """Initialize the LLM with API key from environment"""
+        """Initialize one LLM client per (model, temperature) route, with API key from environment"""
+        self.backend_llms = {route: self.create_backend_llm(route) for route in dict.fromkeys(self.routes.values())}
+        # The planner's client; every agent's unless the routing gives it a model of its own
+        self.base_llm = self.backend_llms[self.routes["planner"]]
+        # Each model has its own quota, so its own limiter; the local backends are only throttled when asked to
+        self.rate_limiters = {}
+        if self.backend == "gemini" or self.rpm or self.tpm:
+            for model, _ in self.backend_llms:
+                self.rate_limiters[model] = get_rate_limiter(model, self.rpm, self.tpm)
+        self.llms = {agent: self.build_llm(route=route) for agent, route in self.routes.items()}
+
+    def create_backend_llm(self, route, stream=False):
+        """Create the client that actually answers prompts (the Gemini API or a local backend)"""
         GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
-        if not GOOGLE_API_KEY:
+        if self.backend == "gemini" and not GOOGLE_API_KEY and self.cache != "replay":
             raise ValueError("GOOGLE_API_KEY environment variable not set.")
-        
-        self.llm = LLM(
-            model="gemini/gemini-2.0-flash",
-            temperature=0.8,
-            api_key=GOOGLE_API_KEY
-        )
+
+        model, temperature = route
+        return create_llm(self.backend, model=model, temperature=temperature, stream=stream, cache_path=self.cache_path)
+
+    def build_llm(self, stream=False, budget=None, route=None):
+        """Wrap a route's backend client in its model's rate limiter and, when enabled, the response cache"""
+        route = route or self.routes["planner"]
+        # Cache hits are answered before the rate limiter, so they never wait or count against the budget
+        backend_llm = self.create_backend_llm(route, stream=True) if stream else self.backend_llms[route]
+        llm = RateLimitedLLM(backend_llm, self.rate_limiters.get(route[0]), budget)
+        if self.cache != "off":
+            llm = CachedLLM(llm, get_response_cache(self.cache_path), mode=self.cache)
+        return llm
     
-    def create_agents(self, theme, number_of_topics):
-        """Create all the CrewAI agents"""
+    def create_agents(self):
+        """Create all the CrewAI agents ({theme} and {number_of_topics} are filled in at kickoff)"""
         self.planner = Agent(
             role = "Topic Planner",
-            goal = f"To collect {number_of_topics} engaging topics related to the theme: {theme}, addressed to an academic audience",
-            backstory = f"You have been given a theme - {theme} - and you must collect {number_of_topics} topics related to the theme, for people to write articles about. It can be in-depth core topics related to the theme, or informatory topics as well. Your work is the basis for the user to write an article (college graduate level) on these topics.",
-            llm = self.llm,
+            goal = "To collect {number_of_topics} engaging topics related to the theme: {theme}, addressed to an academic audience",
+            backstory = "You have been given a theme - {theme} - and you must collect {number_of_topics} topics related to the theme, for people to write articles about. It can be in-depth core topics related to the theme, or informatory topics as well. Your work is the basis for the user to write an article (college graduate level) on these topics.",
+            llm = self.llms["planner"],
             max_iter = 100,
             verbose = False,
             allow_delegation = False
         ) 
         
+        research_tools = []
+        if self.corpus:
+            # Imported here so that runs without a corpus do not need crewai.tools
+            from research_tool import CorpusSearchTool
+            research_tools = [CorpusSearchTool(corpus_dir=self.corpus, index_dir=self.corpus_index_dir)]
+
         self.researcher = Agent(
             role = "Topic Researcher",
-            goal = f"To collect in-depth information (and their sources) on the {number_of_topics} {theme}-related topics provided by the Topic Planner",
-            backstory = f"For each topic given by the Topic Planner, you will do in-depth research into each, collect information and their source links, and send the links to the Link Collector. Also, you send the relevant informaton you have collected to the Summary Generator.",
-            llm = self.llm,
-            max_iter = 100,
+            goal = "To collect in-depth information (and their sources) on the {number_of_topics} {theme}-related topics provided by the Topic Planner",
+            backstory = "For each topic given by the Topic Planner, you will do in-depth research into each, collect information and their source links, and send the links to the Link Collector. Also, you send the relevant informaton you have collected to the Summary Generator.",
+            llm = self.llms["researcher"],
+            tools = research_tools,
+            max_iter = GROUNDED_RESEARCH_MAX_ITER if self.corpus else 100,
             verbose = False,
             allow_delegation = True
         ) 
 
         self.condenser = Agent(
             role = "Summary Generator",
-            goal = f"To condense paragraphs of information into a title-one liner duo and show it to the user",
+            goal = "To condense paragraphs of information into a title-one liner duo and show it to the user",
             backstory = "You will take the information the Topic Researcher, and split it into small chunks. Then you will condense it into a bullet point-worth of information and title each of these bullets. The user will elaborate on each point, by themselves, as they see fit. This should be shown to the user under the title 'Condensed Information Points:'",
-            llm = self.llm,
+            llm = self.llms["condenser"],
             max_iter = 100,
             verbose = False,
             allow_delegation = False
@@ -83,7 +166,7 @@ class ArticleTopicGenerator:
             role = "Link Collector",
             goal = "To collect all the links of the material that were used as sources by the Topic Researcher",
             backstory = "You will take all the links from the researcher, and show them to the user at the end of the response under the title: 'Resources Used:'",
-            llm = self.llm,
+            llm = self.llms["collector"],
             max_iter = 100,
             verbose = False,
             allow_delegation = False
@@ -91,135 +174,464 @@ class ArticleTopicGenerator:
         
         self.writer = Agent(
             role = "Article Prompt Writer",
-            goal = f"To take each topic from the {number_of_topics} topics the Topic Planner has generated, give the condensed article prompt the Summary Generator has generated for the same, and then the links the Link Collector has collected for the same topic, and repeat the steps for the rest of the topics",
-            backstory = f"The Topic Planner has sent {number_of_topics} topics to the Topic Researcher, who sent the information to the Summary Generator and the research links to the Link Collector, who have all sent their information chunks to you, who orders it and shows it to the user.",
-            llm = self.llm,
+            goal = "To take each topic from the {number_of_topics} topics the Topic Planner has generated, give the condensed article prompt the Summary Generator has generated for the same, and then the links the Link Collector has collected for the same topic, and repeat the steps for the rest of the topics",
+            backstory = "The Topic Planner has sent {number_of_topics} topics to the Topic Researcher, who sent the information to the Summary Generator and the research links to the Link Collector, who have all sent their information chunks to you, who orders it and shows it to the user.",
+            llm = self.llms["writer"],
             max_iter = 100,
             verbose = False,
             allow_delegation = False
         ) 
         
-    def create_tasks(self, theme, number_of_topics):
+    def create_tasks(self):
         """Create all the tasks for the agents"""
+        if self.corpus:
+            # Passages from the researcher's search tool stand in for open-ended research and invented sources
+            self.research_steps = '''
+            1. Search the research notes for the topic, then for its specific aspects
+            2. Base the findings on the passages found
+            3. Use as sources the links the passages say to cite; add others only where the notes have nothing'''
+        else:
+            self.research_steps = '''
+            1. Conduct in-depth research on the topic
+            2. Use at least 5-6 sources
+            3. Collect information and source links'''
+
+        # Every task declares its upstream context, so in "dag" mode the two tasks that only
+        # need the research output (condensing and link collecting) can run at the same time (see dag.py)
         self.plan = Task(
             name='Planning',
             agent = self.planner,
-            description = f'''
+            description = '''
             1. Identify the latest trends related to {theme}, along with key players and noteworthy news  
             2. Identify the target audience based on {theme} and collect relevant headlines/topics 
             3. Develop a {theme}-related title list of {number_of_topics} items 
-            4. Format the output as a numbered list with no additional commentary 
-            5. Example: 
-                1. Topic One 
-                2. Topic Two 
-                3. Topic Three
-            6. Send the list to the Topic Researcher''',
-            expected_output=f"A {number_of_topics}-item numbered list of {theme}-related topics with no extra text",
-            callback=self.task_callback
+            4. Return only the titles, in order, with no numbering or additional commentary 
+            5. Send the list to the Topic Researcher''',
+            expected_output="A list of {number_of_topics} {theme}-related topic titles with no extra text",
+            output_pydantic=TopicPlan
         )
         
         self.research = Task(
             name='Researching',
             agent = self.researcher,
-            description=f'''
-            For each topic received from the Topic Planner:
-            1. Conduct in-depth research on the topic
-            2. Use at least 5-6 sources
-            3. Collect information and source links
-            4. Format research content as:
-                - Heading: "### Research Findings"
-                - Bullet points with bolded subheadings
-            5. Format source links as:
-                - Heading: "### Source Links"
-                - Numbered list of exact URLs
-            6. Example:
-                ### Research Findings
-                - **Key Discovery:** Explanation of discovery
-                - **Important Fact:** Detailed fact
-            
-            ### Source Links
-            1. <exact link here>
-            2. <exact link here>
+            description='''
+            For each topic received from the Topic Planner:''' + self.research_steps + '''
+            4. Record each finding as a short subheading and its detail
+            5. Record the exact source URLs, unmodified
+            6. Keep the topics in the Topic Planner's order, with their titles exactly as planned
             7. Send the research findings to the Summary Generator''',
             expected_output="Structured research findings with exact source links for all topics",
-            callback=self.task_callback
+            context=[self.plan],
+            output_pydantic=ResearchReport
         )
         
         self.textCondense = Task(
             name='Condensing',
             agent=self.condenser,
-            description=f'''
+            description='''
             1. Receive research content from Topic Researcher
-            2. For each logical chunk:
-                a. Create a bolded heading (1-3 words)
-                b. Add colon followed by 1-sentence summary
-            3. Output as:
-                - Heading: "### Condensed Information Points"
-                - Bullet points with headings
-            4. Do not add commentary
-            5. Example:
-                ### Condensed Information Points
-                - **Brain-Computer Interface:** Direct pathway between brain and external devices
-                - **Neural Signals:** BCIs interpret signals to control computers''',
-            expected_output = "Markdown section with bolded headings and colon-separated summaries",
-            callback=self.task_callback
+            2. For each topic, and each logical chunk of its research:
+                a. Create a heading (1-3 words)
+                b. Add a 1-sentence summary
+            3. Do not add commentary
+            4. Example point:
+                heading: "Brain-Computer Interface", summary: "Direct pathway between brain and external devices"''',
+            expected_output = "Condensed points (heading and one-sentence summary) for every topic",
+            context=[self.research],
+            output_pydantic=CondensedReport
         )
         
         self.linkCollection = Task(
             name='Link Collecting',
             agent=self.collector,
-            description=f'''
-            1. Collect all source links from Topic Researcher
-            2. Format as:
-                - Heading: "### Resources Used"
-                - Numbered list of exact URLs
-            3. Preserve original link formatting
-            4. Do not modify or shorten URLs
-            5. Example:
-                ### Resources Used
-                1. https://www.nature.com/articles/bci-technology
-                2. https://ieeexplore.ieee.org/document/123456''',
-            expected_output="Numbered list of exact source URLs under heading",
-            callback=self.task_callback
+            description='''
+            1. Collect all source links from Topic Researcher, topic by topic
+            2. Preserve original link formatting
+            3. Do not modify or shorten URLs
+            4. Example links:
+                https://www.nature.com/articles/bci-technology
+                https://ieeexplore.ieee.org/document/123456''',
+            expected_output="The exact source URLs of every topic",
+            context=[self.research],
+            output_pydantic=LinkReport
         )
         
         self.chunkJoin = Task(
             name='Joining, Formatting, and Writing',
             agent=self.writer,
-            description=f'''
-            For each of the {number_of_topics} topics:
-            1. Start with H2 heading: "## [Topic Name]"
+            description='''
+            For each of the {number_of_topics} topics, in the Summary Generator's order:
+            1. Use the topic title exactly as given
             2. Include condensed points from Summary Generator
-            3. Include resource links from Link Collector
-            4. Maintain exact formatting:
-                ## Topic <Number>: <Topic Title>
-                
-                ### Condensed Information Points
-                - **heading:** summary (from condenser / Summary Generator)
-                
-                ### Resources Used
-                1. <exact link here>
-                5. Do not add commentary or summaries''',
-            expected_output=f"Structured output with headings, bullet points, and exact links for all topics",
-            callback=self.task_callback
+            3. Include resource links from Link Collector, unmodified
+            4. Do not add commentary or summaries''',
+            expected_output="Every topic with its condensed points and exact links",
+            # The condensed report already carries every planned title in order, so the plan is left out
+            context=[self.textCondense, self.linkCollection],
+            output_pydantic=TopicDraft
         )
     
-    async def generate_topics(self, theme, number_of_topics):
-        """Generate article topics using CrewAI agents"""
-        self.create_agents(theme, number_of_topics)
-        self.create_tasks(theme, number_of_topics)
-        
-        crew = Crew(
+    def fingerprint(self, request):
+        """The request's fingerprint under this generator's models, prompts and pipeline"""
+        # Sequential and DAG runs send the same prompts; fan-out and structured assembly do not
+        return request.fingerprint(
+            self.routes, PROMPT_VERSION,
+            backend=self.backend, fan_out=self.mode == "fan-out", structured_assembly=self.structured_assembly,
+            # How far upstream outputs are summarized decides what the downstream prompts say
+            context_budget=self.context_budget,
+            # The corpus as currently indexed: research changes with the notes
+            corpus=get_corpus_index(self.corpus, self.corpus_index_dir).meta["signature"] if self.corpus else None
+        )
+
+    def route_of(self, agent):
+        """The (model, temperature) route of an agent or any copy of it (copies keep the role)"""
+        for name in self.routes:
+            if getattr(self, name).role == agent.role:
+                return self.routes[name]
+        return self.routes["planner"]
+
+    def create_crews(self):
+        """Create the template crews that generations are copied from"""
+        self.crew = Crew(
             agents=[self.planner, self.researcher, self.condenser, self.collector, self.writer],
             tasks=[self.plan, self.research, self.textCondense, self.linkCollection, self.chunkJoin],
             process="sequential",
             verbose=False,
             memory=False
         )
-        
-        return await crew.kickoff_async(inputs={"theme": theme, "number of topics": number_of_topics})
 
-async def generate_article_topics(theme, num_topics):
-    """Convenience function to generate topics"""
-    generator = ArticleTopicGenerator()
-    return await generator.generate_topics(theme, num_topics) 
+        self.assembled_crew = Crew(
+            agents=[self.planner, self.researcher, self.condenser],
+            tasks=[self.plan, self.research, self.textCondense],
+            process="sequential",
+            verbose=False,
+            memory=False
+        )
+
+        self.planning_crew = Crew(
+            agents=[self.planner],
+            tasks=[self.plan],
+            process="sequential",
+            verbose=False,
+            memory=False
+        )
+
+        # Threads of the loop's default pool one generation holds at once: a "dag" run's widest stage, else the one
+        # crew it kicks off (fan-out topic crews run on a pool of their own)
+        crew = self.assembled_crew if self.structured_assembly else self.crew
+        self.threads_per_generation = max(map(len, dag_stages(crew.tasks))) if self.mode == "dag" else 1
+
+    def create_topic_crew(self, topic):
+        """Create a research -> condense -> collect crew for a single planned topic"""
+        # Each topic gets its own agent copies so concurrent crews never share executor state
+        researcher = self.researcher.copy()
+        condenser = self.condenser.copy()
+
+        research = Task(
+            name=f'Researching: {topic}',
+            agent=researcher,
+            description='''
+            Research this single {theme}-related topic: "{topic}"''' + self.research_steps + '''
+            4. Record each finding as a short subheading and its detail
+            5. Record the exact source URLs, unmodified
+            6. Do not research any other topic''',
+            expected_output='Structured research findings with exact source links for "{topic}"',
+            output_pydantic=TopicResearch
+        )
+
+        condense = Task(
+            name=f'Condensing: {topic}',
+            agent=condenser,
+            description=self.textCondense.description,
+            expected_output=self.textCondense.expected_output,
+            context=[research],
+            output_pydantic=TopicSummary
+        )
+
+        agents, tasks = [researcher, condenser], [research, condense]
+        if not self.structured_assembly:
+            collector = self.collector.copy()
+            collect = Task(
+                name=f'Link Collecting: {topic}',
+                agent=collector,
+                description=self.linkCollection.description,
+                expected_output=self.linkCollection.expected_output,
+                context=[research],
+                output_pydantic=TopicLinks
+            )
+            agents.append(collector)
+            tasks.append(collect)
+
+        return Crew(
+            agents=agents,
+            tasks=tasks,
+            process="sequential",
+            verbose=False,
+            memory=False
+        )
+
+    async def kickoff(self, crew, inputs, listener=None, budget=None, metrics=None, checkpoint=None, executor=None):
+        """Kick off a per-run crew, reporting finished tasks (with their metrics) and the writer's tokens to listener
+
+        The crew runs on executor when one is given, else on the event loop's default thread pool.
+        """
+        # Finished outputs are cut down to what their downstream tasks read, before those tasks start
+        tasks = list(crew.tasks)
+        pruner = ContextPruner(tasks, self.context_budget)
+        restored = []
+        if checkpoint:
+            # Tasks this run already completed get their saved output back; only the others are run
+            remaining = restore_tasks(crew.tasks, checkpoint.completed)
+            restored = [task.output for task in crew.tasks if all(task is not other for other in remaining)]
+            for output in restored:
+                pruner.prune(output)
+                if listener:
+                    listener({"type": "task", "name": output.name, "metrics": None, "restored": True})
+            if not remaining:
+                pruner.restore(restored)
+                return CrewOutput(raw=restored[-1].raw, tasks_output=restored, token_usage=UsageMetrics())
+            if restored:
+                agents = []
+                for task in remaining:
+                    if all(task.agent is not agent for agent in agents):
+                        agents.append(task.agent)
+                crew = Crew(agents=agents, tasks=remaining, process="sequential", verbose=False, memory=False)
+
+        writer = next((agent for agent in crew.agents if agent.role == self.writer.role), None)
+        stream = bool(listener) and writer is not None and STREAMING_AVAILABLE
+
+        # Per-run clients share the network client and rate limiter but spend this generation's call budget;
+        # the writer's streaming client is its own, so its chunks can be told apart from concurrent runs.
+        # Every agent works on one task per crew, so its meter measures exactly that task
+        meters = {}
+        for agent in crew.agents:
+            llm = self.build_llm(stream=stream and agent is writer, budget=budget, route=self.route_of(agent))
+            agent.llm = meters[agent.role] = MeteredLLM(llm)
+
+        def task_callback(output):
+            if checkpoint:
+                checkpoint.save(output)
+            pruner.prune(output)
+            record = None
+            if metrics:
+                record = metrics.task_finished(output.name, output.agent, meters.get(output.agent), **pruner.report(output.name))
+            if listener:
+                listener({"type": "task", "name": output.name, "metrics": record})
+
+        crew.task_callback = task_callback
+        # "dag" runs schedule independent tasks themselves, so a failing branch fails the run instead of hanging it
+        if executor:
+            run = functools.partial(kickoff_in_pool, executor)
+        else:
+            run = kickoff_dag if self.mode == "dag" else Crew.kickoff_async
+        if not stream:
+            output = await run(crew, inputs)
+        else:
+            with stream_tokens(writer.llm, lambda text: listener({"type": "token", "text": text})):
+                output = await run(crew, inputs)
+
+        if restored:
+            output = CrewOutput(raw=output.raw, tasks_output=restored + list(output.tasks_output), token_usage=output.token_usage)
+        # Results are built from what the agents wrote, not from the pruned context
+        pruner.restore([task.output for task in tasks if task.output is not None])
+        return output
+
+    async def generate_topics(self, theme, number_of_topics, listener=None, run_id=None, deadline=None):
+        """Generate article topics using CrewAI agents and return them as an ArticleTopics result
+
+        Passing the run_id of an earlier, interrupted run resumes it from its first incomplete task; this is refused
+        (ResumeRefused) unless the run was started with the same fingerprint and is no longer running. Past the
+        deadline (a time.time()), its next LLM call raises CallBudgetExceeded and the generation stops.
+        """
+        # Fan-out mode only knows its real total once the topics are planned (and re-reports it then)
+        total = 1 + self.tasks_per_topic * number_of_topics if self.mode == "fan-out" else self.total_tasks
+        if listener:
+            listener({"type": "total", "total": total})
+        budget = CallBudget(self.max_calls_per_task * total, deadline)
+        fingerprint = self.fingerprint(GenerationRequest(theme=theme, number_of_topics=number_of_topics))
+        checkpoint = None
+        if self.checkpoint_path:
+            options = {"fingerprint": fingerprint, "prompt_version": PROMPT_VERSION, "generator": self.pipeline_options}
+            checkpoint = get_checkpoint_store(self.checkpoint_path).start(theme, number_of_topics, options, run_id)
+            if listener:
+                listener({"type": "run", "run_id": checkpoint.run_id, "fingerprint": fingerprint})
+        metrics = RunMetrics(theme, number_of_topics, self.base_llm.model, get_metrics_sinks(),
+                             run_id=checkpoint.run_id if checkpoint else None)
+
+        if self.mode == "fan-out":
+            work = self.generate_topics_fan_out(theme, number_of_topics, listener, budget, metrics, checkpoint)
+        else:
+            work = self.generate_topics_crew(theme, number_of_topics, listener, budget, metrics, checkpoint)
+        try:
+            result = await self.measure(work, metrics, listener)
+        except Exception:
+            if checkpoint:
+                checkpoint.finish("failed")
+            raise
+        if checkpoint:
+            checkpoint.finish("done")
+        return result
+
+    async def regenerate_topic(self, result, index, listener=None, deadline=None):
+        """Rerun research -> condense[ -> collect] for one topic of an ArticleTopics result and splice it back in"""
+        # The plan and every other topic's research are reused; only this topic's chain runs again
+        topic = result.topics[index].title
+        if listener:
+            listener({"type": "total", "total": self.tasks_per_topic})
+        budget = CallBudget(self.max_calls_per_task * self.tasks_per_topic, deadline)
+        metrics = RunMetrics(result.theme, 1, self.base_llm.model, get_metrics_sinks())
+
+        inputs = {"theme": result.theme, "number_of_topics": len(result.topics), "topic": topic}
+        output = await self.measure(self.kickoff(self.create_topic_crew(topic), inputs, listener, budget, metrics), metrics, listener)
+
+        research = research_from(output.tasks_output[0], [topic])
+        summaries = summaries_from(output.tasks_output[1], [topic])
+        links = None if self.structured_assembly else links_from(output.tasks_output[2], [topic])
+        section = build_result(result.theme, [topic], research, summaries, links).topics[0]
+
+        topics = list(result.topics)
+        topics[index] = section
+        stored_research = list(result.research)
+        if len(stored_research) == len(topics):
+            stored_research[index] = research[0]
+        token_usage = dict(result.token_usage)
+        for key, value in usage_of(output.token_usage).items():
+            if isinstance(value, (int, float)):
+                token_usage[key] = token_usage.get(key, 0) + value
+        return result.model_copy(update={"topics": topics, "research": stored_research, "token_usage": token_usage})
+
+    async def measure(self, work, metrics, listener=None):
+        """Await a generation's coroutine, closing its metrics run and reporting the totals to listener"""
+        try:
+            result = await work
+        except Exception:
+            metrics.finish(status="error")
+            raise
+
+        summary = metrics.finish()
+        if listener:
+            listener({"type": "metrics", "summary": summary, "tasks": metrics.tasks})
+        return result
+
+    async def generate_topics_crew(self, theme, number_of_topics, listener=None, budget=None, metrics=None, checkpoint=None):
+        """Run the five-task crew (or, with structured assembly, only planning, research and condensing)"""
+        inputs = {"theme": theme, "number_of_topics": number_of_topics}
+        crew = self.assembled_crew if self.structured_assembly else self.crew
+        run = crew.copy()
+        output = await self.kickoff(run, inputs, listener, budget, metrics, checkpoint)
+
+        # Read from the tasks themselves rather than by position in tasks_output
+        outputs = {task.name: task.output for task in run.tasks}
+        topics = plan_from(outputs[self.plan.name], limit=number_of_topics)
+        if not topics:
+            raise ValueError("The Topic Planner did not return a list of topics.")
+
+        research = research_from(outputs[self.research.name], topics)
+        summaries = summaries_from(outputs[self.textCondense.name], topics)
+        links = draft = None
+        if not self.structured_assembly:
+            links = links_from(outputs[self.linkCollection.name], topics)
+            draft = parse_output(outputs[self.chunkJoin.name], TopicDraft)
+        return build_result(theme, topics, research, summaries, links, draft, usage_of(output.token_usage))
+
+    async def generate_topics_fan_out(self, theme, number_of_topics, listener=None, budget=None, metrics=None, checkpoint=None):
+        """Plan once, then run every topic's research chain concurrently and merge locally"""
+        inputs = {"theme": theme, "number_of_topics": number_of_topics}
+        plan_output = await self.kickoff(self.planning_crew.copy(), inputs, listener, budget, metrics, checkpoint)
+
+        topics = plan_from(plan_output.tasks_output[0], limit=number_of_topics)
+        if not topics:
+            raise ValueError("The Topic Planner did not return a list of topics.")
+
+        # Planning + (research, condense[, collect]) per topic; the writer is replaced by the local merge
+        if listener:
+            listener({"type": "total", "total": 1 + self.tasks_per_topic * len(topics)})
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        # A pool of max_concurrency threads, so the limit is not capped by the loop's default pool
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="fan-out")
+
+        async def run_topic(topic):
+            async with semaphore:
+                return await self.kickoff(self.create_topic_crew(topic), {**inputs, "topic": topic}, listener, budget,
+                                          metrics, checkpoint, executor)
+
+        try:
+            topic_outputs = await asyncio.gather(*(run_topic(topic) for topic in topics))
+        finally:
+            # Not waited for: after a failure, the other topics' crews finish on their own without blocking the loop
+            executor.shutdown(wait=False)
+
+        research, summaries, links = [], [], []
+        token_usage = UsageMetrics()
+        token_usage.add_usage_metrics(plan_output.token_usage)
+        for topic, output in zip(topics, topic_outputs):
+            research.extend(research_from(output.tasks_output[0], [topic]))
+            summaries.extend(summaries_from(output.tasks_output[1], [topic]))
+            if not self.structured_assembly:
+                links.extend(links_from(output.tasks_output[2], [topic]))
+            token_usage.add_usage_metrics(output.token_usage)
+
+        return build_result(theme, topics, research, summaries, links or None, token_usage=usage_of(token_usage))
+
+def usage_of(token_usage):
+    """CrewAI's UsageMetrics as a plain dict (for the typed result)"""
+    return token_usage.model_dump() if token_usage else {}
+
+_generators = {}
+_generators_lock = threading.Lock()
+
+def get_generator(**options):
+    """Return the process-wide ArticleTopicGenerator for these options, building it on first use"""
+    # Imported modules survive Streamlit reruns, so this pool lives as long as the server process
+    key = tuple(sorted(options.items()))
+    with _generators_lock:
+        if key not in _generators:
+            _generators[key] = ArticleTopicGenerator(**options)
+        return _generators[key]
+
+async def generate_article_topics(theme, num_topics=None, remember=True, listener=None, run_id=None, seed=0,
+                                  deadline=None, **options):
+    """Convenience function to generate topics (without num_topics, the count is drawn from seed; run_id resumes
+    an interrupted run; past the deadline, the generation stops at its next LLM call)"""
+    request = GenerationRequest(theme=theme, number_of_topics=num_topics, seed=seed)
+    generator = get_generator(**options)
+    result = await generator.generate_topics(request.theme, request.number_of_topics, listener, run_id, deadline)
+    # Recorded so that near-identical themes can later be offered this result (see find_similar_result)
+    if remember and result.topics:
+        settings = result_settings_key(request.number_of_topics, **options)
+        get_theme_index().add(request.theme, request.number_of_topics, result.to_markdown(), settings)
+    return result
+
+def resume_options(run_id, checkpoint_path=DEFAULT_CHECKPOINT_PATH):
+    """The generator options an interrupted run was started with (pass them to resume it on the same pipeline)"""
+    run = get_checkpoint_store(checkpoint_path).run(run_id)
+    if run is None or "generator" not in run["options"]:
+        raise ResumeRefused(f"Run {run_id} was not started by the generator, so it cannot be resumed here.")
+    return run["options"]["generator"]
+
+async def regenerate_article_topic(result, index, listener=None, deadline=None, **options):
+    """Convenience function to regenerate one topic of a result"""
+    generator = get_generator(**options)
+    return await generator.regenerate_topic(result, index, listener, deadline)
+
+def result_settings_key(number_of_topics, **options):
+    """Hash of what decides a result besides its theme (topic count, models, prompts, pipeline), from the generator
+    options alone: a stored result is only offered for requests that share it"""
+    settings = {
+        "number_of_topics": number_of_topics,
+        "models": {agent: list(route) for agent, route in load_routing(options.get("routing", DEFAULT_ROUTING)).items()},
+        "prompt_version": PROMPT_VERSION,
+        "backend": options.get("backend", DEFAULT_BACKEND),
+        # Sequential and DAG runs send the same prompts; fan-out and structured assembly do not
+        "fan_out": options.get("mode") == "fan-out",
+        "structured_assembly": bool(options.get("structured_assembly")),
+        "context_budget": options.get("context_budget", DEFAULT_CONTEXT_TOKEN_BUDGET),
+        "corpus": options.get("corpus", DEFAULT_RESEARCH_CORPUS) or None
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+def find_similar_result(theme, number_of_topics, threshold=DEFAULT_SIMILARITY_THRESHOLD, **options):
+    """Return (entry, similarity) for a previous result whose theme is close enough to theme and that was generated
+    with the same topic count and settings as these generator options would use, or None"""
+    return get_theme_index().lookup(theme, result_settings_key(number_of_topics, **options), threshold)
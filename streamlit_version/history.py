@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_HISTORY_PATH = os.environ.get(
+    "HISTORY_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "article_topic_generator", "history.sqlite3")
+)
+PREVIEW_CHARS = 200
+# Retention per owner: the newest HISTORY_MAX_ENTRIES entries, none older than HISTORY_MAX_AGE_DAYS (0: no limit)
+DEFAULT_MAX_ENTRIES = int(os.environ.get("HISTORY_MAX_ENTRIES", "200"))
+DEFAULT_MAX_AGE_SECONDS = float(os.environ.get("HISTORY_MAX_AGE_DAYS", "90")) * 24 * 60 * 60
+
+
+class HistoryStore:
+    """Persistent, searchable history of generations (SQLite, FTS5 full-text index on theme and content)
+
+    The store is shared by every session of the process; each entry belongs to the owner that added it (a
+    durable identity such as the signed-in user, not a single browser session), and is only listed, loaded
+    and deleted for that owner. Each owner keeps at most max_entries entries, none older than max_age_seconds.
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH, max_entries=DEFAULT_MAX_ENTRIES, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS generations (
+                    id INTEGER PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    theme TEXT NOT NULL,
+                    topic_count INTEGER NOT NULL,
+                    content TEXT NOT NULL,
+                    options TEXT,
+                    created REAL NOT NULL,
+                    UNIQUE (owner, content_hash)
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS generations_created ON generations (owner, created)")
+            self.full_text = self._create_fts_index()
+            if max_age_seconds:
+                # Owners who never come back are only ever cleaned up here
+                self._conn.execute("DELETE FROM generations WHERE created < ?", (time.time() - max_age_seconds,))
+
+    def _create_fts_index(self):
+        """External-content FTS5 table kept in sync by triggers; False when SQLite was built without FTS5"""
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS generations_fts USING fts5(theme, content, content='generations', content_rowid='id')"
+            )
+        except sqlite3.OperationalError:
+            return False
+        self._conn.executescript(
+            """CREATE TRIGGER IF NOT EXISTS generations_ai AFTER INSERT ON generations BEGIN
+                INSERT INTO generations_fts (rowid, theme, content) VALUES (new.id, new.theme, new.content);
+            END;
+            CREATE TRIGGER IF NOT EXISTS generations_ad AFTER DELETE ON generations BEGIN
+                INSERT INTO generations_fts (generations_fts, rowid, theme, content) VALUES ('delete', old.id, old.theme, old.content);
+            END;"""
+        )
+        return True
+
+    @staticmethod
+    def content_hash(content):
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def add(self, owner, theme, topic_count, content, options=None):
+        """Store an owner's generation once (identical content is only kept the first time) and return its id;
+        options are the generator options that produced it"""
+        digest = self.content_hash(content)
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO generations (owner, content_hash, theme, topic_count, content, options, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (owner, digest, theme, topic_count, content, json.dumps(options) if options is not None else None, now)
+            )
+            entry_id = self._conn.execute(
+                "SELECT id FROM generations WHERE owner = ? AND content_hash = ?", (owner, digest)
+            ).fetchone()[0]
+            self._evict(owner, now)
+        return entry_id
+
+    def _evict(self, owner, now):
+        """Drop the owner's entries past the age limit, then the oldest ones past the entry limit"""
+        if self.max_age_seconds:
+            self._conn.execute("DELETE FROM generations WHERE owner = ? AND created < ?", (owner, now - self.max_age_seconds))
+        if self.max_entries:
+            self._conn.execute(
+                """DELETE FROM generations WHERE owner = ? AND id NOT IN (
+                    SELECT id FROM generations WHERE owner = ? ORDER BY created DESC, id DESC LIMIT ?
+                )""",
+                (owner, owner, self.max_entries)
+            )
+
+    def _where(self, owner, query):
+        if not query or not query.strip():
+            return "WHERE owner = ?", (owner,)
+        if self.full_text:
+            # Every word must match, as a prefix, in the theme or the content
+            terms = " ".join('"{}"*'.format(word.replace('"', '""')) for word in query.split())
+            return "WHERE owner = ? AND id IN (SELECT rowid FROM generations_fts WHERE generations_fts MATCH ?)", (owner, terms)
+        pattern = f"%{query.strip()}%"
+        return "WHERE owner = ? AND (theme LIKE ? OR content LIKE ?)", (owner, pattern, pattern)
+
+    def page(self, owner, page=0, page_size=5, query=None):
+        """Return (entries, total) for one page of an owner's newest-first history; entries only carry a preview
+        (and the options they were generated with, {} if unknown)"""
+        where, params = self._where(owner, query)
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM generations {where}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"""SELECT id, theme, topic_count, created, substr(content, 1, {PREVIEW_CHARS}), length(content) > {PREVIEW_CHARS}, options
+                    FROM generations {where} ORDER BY created DESC, id DESC LIMIT ? OFFSET ?""",
+                (*params, page_size, page * page_size)
+            ).fetchall()
+        entries = [
+            {
+                "id": row[0],
+                "theme": row[1],
+                "topic_count": row[2],
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row[3])),
+                "preview": row[4] + ("..." if row[5] else ""),
+                "options": json.loads(row[6]) if row[6] else {}
+            }
+            for row in rows
+        ]
+        return entries, total
+
+    def get_content(self, owner, entry_id):
+        """Full Markdown of one of an owner's generations (loaded only when it is asked for)"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM generations WHERE owner = ? AND id = ?", (owner, entry_id)
+            ).fetchone()
+        return row[0] if row else None
+
+    def delete(self, owner, entry_id):
+        """Delete one of an owner's generations; other owners' entries are left alone"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM generations WHERE owner = ? AND id = ?", (owner, entry_id))
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_history_store(path=DEFAULT_HISTORY_PATH):
+    """Return the process-wide HistoryStore for path, opening it on first use"""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = HistoryStore(path)
+        return _stores[path]
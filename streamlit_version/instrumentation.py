@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import uuid
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from rate_limit import estimate_tokens
+from wrapped_llm import WrappedLLM
+
+# USD per million (prompt, completion) tokens; models that are not listed (e.g. the fake backend) cost nothing
+MODEL_PRICES = {
+    "gemini/gemini-2.0-flash": (0.10, 0.40),
+    "gemini/gemini-2.0-flash-lite": (0.075, 0.30),
+    "gemini/gemini-2.5-flash": (0.30, 2.50),
+    "gemini/gemini-2.5-pro": (1.25, 10.00),
+}
+# Comma-separated list of sinks every task record is sent to: log, prometheus, otel
+METRICS_SINK = os.environ.get("METRICS_SINK", "")
+METRICS_LOG_PATH = os.environ.get("METRICS_LOG_PATH", "task_metrics.jsonl")
+METRICS_SPANS_PATH = os.environ.get("METRICS_SPANS_PATH", "task_spans.jsonl")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))  # serve /metrics on this port (prometheus sink)
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+def stage_of(task_name):
+    """'Researching: Quantum Sensors' -> 'Researching' (fan-out tasks carry their topic in the name)"""
+    return task_name.split(":", 1)[0].strip()
+
+
+class MeteredLLM(WrappedLLM):
+    """Outermost per-agent wrapper counting the calls, tokens and time of the task its agent is working on"""
+
+    def __init__(self, llm):
+        super().__init__(llm)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.first_call = None
+            self.calls = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+            self.seconds = 0.0
+            self._inner_start = self._inner_counters()
+
+    def _inner_counters(self):
+        # Retries happen in the rate limiter and cache hits in the cache wrapper further down the chain
+        counters = {"retries": 0, "hits": 0}
+        llm = self.llm
+        while True:
+            for name in counters:
+                counters[name] += getattr(llm, name, 0)
+            if not getattr(llm, "wraps_llm", False):
+                return counters
+            llm = llm.llm
+
+    def call(self, messages, tools=None, *args, **kwargs):
+        started = time.time()
+        try:
+            response = self._delegate(messages, tools, *args, **kwargs)
+        finally:
+            with self._lock:
+                self.first_call = self.first_call or started
+                self.calls += 1
+                self.seconds += time.time() - started
+                self.prompt_tokens += estimate_tokens(messages)
+        if isinstance(response, str):
+            with self._lock:
+                self.completion_tokens += estimate_tokens(response)
+        return response
+
+    def snapshot(self):
+        with self._lock:
+            inner = self._inner_counters()
+            return {
+                "start": self.first_call,
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "llm_seconds": round(self.seconds, 3),
+                "retries": inner["retries"] - self._inner_start["retries"],
+                "cache_hits": inner["hits"] - self._inner_start["hits"],
+            }
+
+
+class RunMetrics:
+    """Collects one generation's per-task records and hands each of them to the sinks"""
+
+    def __init__(self, theme, number_of_topics, model, sinks=(), run_id=None):
+        self.run_id = run_id or uuid.uuid4().hex
+        self.theme = theme
+        self.number_of_topics = number_of_topics
+        self.model = model
+        self.sinks = list(sinks)
+        self.started = time.time()
+        self.tasks = []
+        self._lock = threading.Lock()
+
+    def task_finished(self, task_name, agent, meter=None, **extra):
+        """Record a finished task from its agent's MeteredLLM (plus any extra fields) and return the record"""
+        end = time.time()
+        usage = meter.snapshot() if meter else {}
+        # With model routing every agent may be on a different model (and price)
+        model = meter.model if meter else self.model
+        record = {
+            "run_id": self.run_id,
+            "task": task_name,
+            "stage": stage_of(task_name),
+            "agent": agent,
+            "model": model,
+            # A task starts working when its agent first calls the LLM
+            "start": usage.get("start") or end,
+            "end": end,
+            "calls": usage.get("calls", 0),
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "completion_tokens": usage.get("completion_tokens", 0),
+            "llm_seconds": usage.get("llm_seconds", 0.0),
+            "retries": usage.get("retries", 0),
+            "cache_hits": usage.get("cache_hits", 0),
+            "cost_usd": round(estimate_cost(model, usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)), 6),
+        }
+        record["seconds"] = round(record["end"] - record["start"], 3)
+        record.update(extra)
+        if meter:
+            meter.reset()
+        with self._lock:
+            self.tasks.append(record)
+        for sink in self.sinks:
+            sink.task(self, record)
+        return record
+
+    def finish(self, status="done"):
+        """Close the run and return its totals"""
+        with self._lock:
+            tasks = list(self.tasks)
+        summary = {
+            "run_id": self.run_id,
+            "theme": self.theme,
+            "number_of_topics": self.number_of_topics,
+            "model": self.model,
+            "status": status,
+            "start": self.started,
+            "end": time.time(),
+            "tasks": len(tasks),
+        }
+        for key in ("calls", "prompt_tokens", "completion_tokens", "retries", "cache_hits", "cost_usd"):
+            summary[key] = round(sum(task[key] for task in tasks), 6)
+        # Tokens of upstream output the tasks' prompts carried, after and before context pruning
+        for key in ("context_tokens", "context_tokens_unpruned"):
+            summary[key] = sum(task.get(key, 0) for task in tasks)
+        for sink in self.sinks:
+            sink.run(self, summary)
+        return summary
+
+
+class LogSink:
+    """Appends every task and run record to a JSON Lines file"""
+
+    def __init__(self, path=METRICS_LOG_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def task(self, run, record):
+        self.write({"type": "task", **record})
+
+    def run(self, run, summary):
+        self.write({"type": "run", **summary})
+
+
+class PrometheusSink:
+    """Per-stage totals in the Prometheus text format, optionally served over HTTP at /metrics"""
+
+    COUNTERS = ("calls", "prompt_tokens", "completion_tokens", "retries", "cache_hits", "cost_usd", "seconds")
+
+    def __init__(self, port=METRICS_PORT):
+        self.totals = {}  # (stage, agent) -> {"tasks": n, counter: total}
+        self.runs = {}  # status -> count
+        self._lock = threading.Lock()
+        if port:
+            self.serve(port)
+
+    def task(self, run, record):
+        with self._lock:
+            totals = self.totals.setdefault((record["stage"], record["agent"]), dict.fromkeys(("tasks",) + self.COUNTERS, 0))
+            totals["tasks"] += 1
+            for counter in self.COUNTERS:
+                totals[counter] += record[counter]
+
+    def run(self, run, summary):
+        with self._lock:
+            self.runs[summary["status"]] = self.runs.get(summary["status"], 0) + 1
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name in ("tasks",) + self.COUNTERS:
+                metric = f"article_task_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                for (stage, agent), totals in sorted(self.totals.items()):
+                    lines.append(f'{metric}{{stage="{stage}",agent="{agent}"}} {totals[name]}')
+            lines.append("# TYPE article_generations_total counter")
+            for status, count in sorted(self.runs.items()):
+                lines.append(f'article_generations_total{{status="{status}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port):
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = sink.render().encode()
+                self.send_response(200 if self.path == "/metrics" else 404)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.end_headers()
+                if self.path == "/metrics":
+                    self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+
+
+class SpanSink:
+    """Writes OpenTelemetry-style spans (one per run, a child per task) as JSON Lines"""
+
+    def __init__(self, path=METRICS_SPANS_PATH):
+        self.log = LogSink(path)
+
+    @staticmethod
+    def root_span_id(run):
+        return run.run_id[:16]
+
+    def task(self, run, record):
+        attributes = {key: value for key, value in record.items() if key not in ("run_id", "start", "end", "task")}
+        self.log.write({
+            "trace_id": run.run_id,
+            "span_id": uuid.uuid4().hex[:16],
+            "parent_span_id": self.root_span_id(run),
+            "name": record["task"],
+            "start_time_unix_nano": int(record["start"] * 1e9),
+            "end_time_unix_nano": int(record["end"] * 1e9),
+            "attributes": {f"task.{key}": value for key, value in attributes.items()},
+        })
+
+    def run(self, run, summary):
+        attributes = {key: value for key, value in summary.items() if key not in ("run_id", "start", "end")}
+        self.log.write({
+            "trace_id": run.run_id,
+            "span_id": self.root_span_id(run),
+            "parent_span_id": None,
+            "name": "generate_topics",
+            "start_time_unix_nano": int(summary["start"] * 1e9),
+            "end_time_unix_nano": int(summary["end"] * 1e9),
+            "attributes": {f"generation.{key}": value for key, value in attributes.items()},
+        })
+
+
+SINKS = {"log": LogSink, "prometheus": PrometheusSink, "otel": SpanSink}
+
+_sinks = None
+_sinks_lock = threading.Lock()
+
+
+def get_metrics_sinks():
+    """Return the process-wide sinks named in METRICS_SINK, creating them on first use"""
+    global _sinks
+    with _sinks_lock:
+        if _sinks is None:
+            names = [name.strip().lower() for name in METRICS_SINK.split(",") if name.strip()]
+            unknown = [name for name in names if name not in SINKS]
+            if unknown:
+                raise ValueError(f"Unknown METRICS_SINK '{', '.join(unknown)}'. Choose from: {', '.join(SINKS)}")
+            _sinks = [SINKS[name]() for name in names]
+        return _sinks
@@ -0,0 +1,238 @@
+import os
+import time
+import uuid
+import queue
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from generator import generate_article_topics, regenerate_article_topic, PROMPT_VERSION
+from schemas import GenerationRequest
+from routing import load_routing, DEFAULT_ROUTING
+
+DEFAULT_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+FINISHED_JOB_TTL_SECONDS = 60 * 60  # forget finished jobs after an hour
+# A job still running this long after it started fails; its crew stops at its next LLM call
+JOB_TIMEOUT_SECONDS = float(os.environ.get("JOB_TIMEOUT_SECONDS", str(20 * 60)))
+# A running job that has reported nothing for this long no longer takes in identical requests
+JOB_STALL_SECONDS = float(os.environ.get("JOB_STALL_SECONDS", str(5 * 60)))
+# A session that has not polled a job for this long is no longer counted as sharing it
+WATCHER_TTL_SECONDS = 10
+# Identical generations submitted while one is still running share it instead of starting a crew of their own
+COALESCE_JOBS = os.environ.get("COALESCE_JOBS", "1").lower() not in ("0", "false", "no")
+
+
+def coalescing_key(theme, num_topics, options):
+    """The request's fingerprint under the generator options: requests sharing it run the same crew on the same
+    prompts and models
+
+    Worked out from the options alone; the generator (backend clients, corpus index) is only built on the job's worker.
+    """
+    try:
+        settings = dict(options)
+        routes = load_routing(settings.pop("routing", DEFAULT_ROUTING))
+        return GenerationRequest(theme=theme, number_of_topics=num_topics).fingerprint(routes, PROMPT_VERSION, **settings)
+    except Exception:
+        # e.g. an unreadable routing file; the job itself reports the error, so it just isn't shared
+        return None
+
+
+class JobTimeout(TimeoutError):
+    """Raised (as the job's error) when a job is still running at its deadline"""
+
+
+class Job:
+    """One background generation; its progress arrives as events on a thread-safe queue"""
+
+    def __init__(self, theme, num_topics, options, work=None, run_id=None, key=None, timeout=JOB_TIMEOUT_SECONDS):
+        self.id = str(uuid.uuid4())
+        self.key = key  # the coalescing key it is in flight under (None: not shared)
+        self.theme = theme
+        self.num_topics = num_topics
+        self.options = options
+        # Called with the event listener and the deadline, returns the coroutine to run; a full generation (or its
+        # resumption) unless given
+        self.work = work or (lambda listener, deadline: generate_article_topics(
+            theme, num_topics, listener=listener, run_id=run_id, deadline=deadline, **options
+        ))
+        self.run_id = run_id  # the checkpointed run, known once the generation has started
+        self.status = "queued"  # queued -> running -> done | error
+        self.events = queue.Queue()
+        self.progress = {"current": 0, "total": 0}
+        self.messages = []
+        self.partial_output = ""
+        self.metrics = None  # {"summary", "tasks"} once the generation has finished
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.timeout = timeout
+        self.deadline = None  # set when a worker starts it; the generation stops at its first LLM call past it
+        self.last_progress = self.submitted  # when it was last started or reported an event
+        self.finished = None
+        self.watchers = {}  # session -> when it last polled (identical requests are coalesced onto the job)
+        self._poll_lock = threading.Lock()
+
+    @property
+    def done(self):
+        return self.status in ("done", "error")
+
+    @property
+    def making_progress(self):
+        """True while the job is queued, or running, within its deadline and reporting events"""
+        now = time.time()
+        if self.done or (self.deadline and now > self.deadline):
+            return False
+        return self.status == "queued" or now - self.last_progress < JOB_STALL_SECONDS
+
+    @property
+    def subscribers(self):
+        """Sessions that have polled the job lately"""
+        cutoff = time.time() - WATCHER_TTL_SECONDS
+        return sum(1 for polled in list(self.watchers.values()) if polled >= cutoff)
+
+    def poll(self, watcher=None):
+        """Apply every event received since the last poll; call from the UI thread (of any session sharing the job)"""
+        with self._poll_lock:
+            if watcher:
+                self.watchers[watcher] = time.time()
+            self._apply_events()
+        return self
+
+    def leave(self, watcher):
+        """Stop counting a session that no longer follows the job"""
+        with self._poll_lock:
+            self.watchers.pop(watcher, None)
+
+    def _listen(self, event):
+        # Called from the generation's threads; an abandoned job's late events are dropped
+        if not self.done:
+            self.last_progress = time.time()
+            self.events.put(event)
+
+    def _apply_events(self):
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                return
+
+            if event["type"] == "total":
+                self.progress["total"] = event["total"]
+            elif event["type"] == "run":
+                self.run_id = event["run_id"]
+            elif event["type"] == "task":
+                self.progress["current"] += 1
+                if event.get("restored"):
+                    self.messages.append(f"♻️ {event['name']} restored from checkpoint")
+                else:
+                    self.messages.append(f"✅ {event['name']} completed!")
+            elif event["type"] == "token":
+                self.partial_output += event["text"]
+            elif event["type"] == "metrics":
+                self.metrics = {"summary": event["summary"], "tasks": event["tasks"]}
+
+    def run(self):
+        self.status = "running"
+        self.last_progress = time.time()
+        self.deadline = self.last_progress + self.timeout
+        outcome = {}
+
+        def work():
+            try:
+                outcome["result"] = asyncio.run(self.work(self._listen, self.deadline))
+            except Exception as error:
+                outcome["error"] = error
+
+        # The generation gets a thread of its own, so the job fails at its deadline even while a call is in progress
+        thread = threading.Thread(target=work, name=f"generation-{self.id[:8]}", daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            self.error = JobTimeout(f"The generation did not finish within {self.timeout:.0f} seconds.")
+            self.status = "error"
+            self.finished = time.time()
+            # Its crew stops at its next LLM call; the worker is held until then, so JOB_WORKERS still caps how
+            # many crews run at once
+            thread.join()
+        elif "error" in outcome:
+            self.error = outcome["error"]
+            self.status = "error"
+        else:
+            self.result = outcome["result"]
+            self.status = "done"
+        self.finished = self.finished or time.time()
+
+
+class JobRunner:
+    """Runs generations on a shared thread pool so no Streamlit script thread waits on a crew"""
+
+    def __init__(self, max_workers=DEFAULT_WORKERS, coalesce=COALESCE_JOBS, job_timeout=JOB_TIMEOUT_SECONDS):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generation")
+        self.jobs = {}
+        self.coalesce = coalesce
+        self.job_timeout = job_timeout
+        self.in_flight = {}  # coalescing key -> the unfinished job every identical request shares
+        self._lock = threading.Lock()
+
+    def submit(self, theme, num_topics, run_id=None, **options):
+        """Queue a generation and return its Job (keep job.id in session state); run_id resumes a failed run
+
+        While an identical generation (or resumption of the same run) is still in flight and making progress, its
+        Job is returned instead, so every session gets the same progress and result from a single crew.
+        """
+        if not self.coalesce:
+            return self._start(Job(theme, num_topics, options, run_id=run_id, timeout=self.job_timeout))
+
+        key = ("resume", run_id) if run_id else coalescing_key(theme, num_topics, options)
+        if key is None:
+            return self._start(Job(theme, num_topics, options, run_id=run_id, timeout=self.job_timeout))
+        with self._lock:
+            job = self.in_flight.get(key)
+            if job is not None and job.making_progress:
+                return job
+            # A stalled or expired job runs until its crew stops, on its own; new requests get a fresh one
+            job = self.in_flight[key] = Job(theme, num_topics, options, run_id=run_id, key=key, timeout=self.job_timeout)
+        return self._start(job)
+
+    def submit_regeneration(self, result, index, **options):
+        """Queue the regeneration of one topic of an ArticleTopics result; the job's result is the updated copy"""
+        work = lambda listener, deadline: regenerate_article_topic(result, index, listener=listener, deadline=deadline, **options)
+        return self._start(Job(result.theme, len(result.topics), options, work=work, timeout=self.job_timeout))
+
+    def _start(self, job):
+        with self._lock:
+            self._forget_finished()
+            self.jobs[job.id] = job
+        self.executor.submit(self._run, job)
+        return job
+
+    def _run(self, job):
+        job.run()
+        with self._lock:
+            # Finished or failed, the job takes in no more requests
+            if self.in_flight.get(job.key) is job:
+                del self.in_flight[job.key]
+
+    def get(self, job_id):
+        """Return the Job with this id, or None if it is unknown or was forgotten"""
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def _forget_finished(self):
+        cutoff = time.time() - FINISHED_JOB_TTL_SECONDS
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and job.finished < cutoff]:
+            del self.jobs[job_id]
+        for key in [key for key, job in self.in_flight.items() if not job.making_progress]:
+            del self.in_flight[key]
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_job_runner():
+    """Return the process-wide JobRunner, starting it on first use"""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = JobRunner()
+        return _runner
@@ -0,0 +1,151 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from wrapped_llm import WrappedLLM
+
+CACHE_MODES = ("off", "on", "replay")
+DEFAULT_CACHE_PATH = os.environ.get(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.expanduser("~"), ".cache", "article_topic_generator", "llm_responses.sqlite3")
+)
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60  # one week
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024    # 64 MB of stored responses
+
+
+class CacheMiss(LookupError):
+    """Raised in replay mode when a prompt has no recorded response"""
+
+
+class ResponseCache:
+    """SQLite-backed store of LLM responses with TTL and size (least recently used) eviction"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL
+                )"""
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    @staticmethod
+    def make_key(model, temperature, messages):
+        """Content address of a call: hash of (model, temperature, rendered prompt)"""
+        payload = json.dumps(
+            {"model": model, "temperature": temperature, "messages": messages},
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the stored response for key, or None if it is missing or expired"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self.ttl_seconds and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, model, response):
+        """Store a response and evict expired / least recently used entries"""
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, size, now, now)
+            )
+            self._evict(now)
+
+    def _evict(self, now):
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        if not self.max_bytes:
+            return
+
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed").fetchall():
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def clear(self):
+        """Drop every stored response"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        """Return the number of stored responses and their total size in bytes"""
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"entries": count, "bytes": size}
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_response_cache(path=DEFAULT_CACHE_PATH):
+    """Return the process-wide ResponseCache for path, opening it on first use"""
+    with _caches_lock:
+        if path not in _caches:
+            _caches[path] = ResponseCache(path)
+        return _caches[path]
+
+
+class CachedLLM(WrappedLLM):
+    """Wraps a CrewAI LLM so that identical prompts are answered from a ResponseCache"""
+
+    def __init__(self, llm, cache, mode="on"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{mode}'. Choose one of: {', '.join(CACHE_MODES)}")
+        super().__init__(llm)
+        self.cache = cache
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+
+    def call(self, messages, tools=None, *args, **kwargs):
+        # Tool-calling turns can return structured results or run side effects, so never cache them
+        if self.mode == "off" or tools:
+            return self._delegate(messages, tools, *args, **kwargs)
+
+        key = self.cache.make_key(self.model, self.temperature, messages)
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        self.misses += 1
+        if self.mode == "replay":
+            raise CacheMiss(f"No recorded response for prompt {key[:12]} (model {self.model}).")
+
+        response = self._delegate(messages, tools, *args, **kwargs)
+        if isinstance(response, str) and response.strip():
+            self.cache.set(key, self.model, response)
+        return response
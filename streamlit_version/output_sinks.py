@@ -0,0 +1,192 @@
+import os
+import re
+import html
+import json
+import time
+import queue
+import threading
+
+OUTPUT_FORMATS = ("markdown", "jsonl", "html")
+
+
+class OutputSink:
+    """Writes a generation to disk while it runs: each finished task is appended to '<path>.part' by a
+    background thread (so callers never wait on the disk), and the file is renamed to its final path on close"""
+
+    extension = ".md"
+
+    def __init__(self, path, theme, fsync=False, answer_task=None):
+        self.path = path
+        self.part_path = path + ".part"
+        self.theme = theme
+        self.fsync = fsync  # fsync after every section (and so before the final rename)
+        # The task whose output is the finished answer (the others are the working that led to it)
+        self.answer_task = answer_task
+        self.answered = False
+        self.error = None
+        self._queue = queue.Queue()
+        self._file = open(self.part_path, "w", encoding="utf-8")
+        self._thread = threading.Thread(target=self._write_loop, name="output-sink", daemon=True)
+        self._thread.start()
+        self.write(self.header())
+
+    def write(self, text):
+        self._queue.put(text)
+
+    def task(self, output):
+        """Queue a finished CrewAI TaskOutput; safe to call from any thread"""
+        raw = output.raw or ""
+        if output.name == self.answer_task:
+            self.answered = True
+            self.write(self.answer(raw))
+        else:
+            self.write(self.section(output.name, output.agent, raw))
+
+    def _write_loop(self):
+        while True:
+            text = self._queue.get()
+            if text is None:
+                return
+            if self.error:
+                continue
+            try:
+                self._file.write(text)
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+            except OSError as error:
+                self.error = error
+
+    def _stop(self):
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+
+    def close(self, result=None):
+        """Write the answer (unless its task already did) and the footer, then move the file into place.
+        Blocks until everything is on disk, so call it off the event loop (asyncio.to_thread)."""
+        if not self.answered:
+            self.write(self.answer(result) if result else self.empty())
+        self.write(self.footer())
+        self._stop()
+        if self.error:
+            raise self.error
+        os.replace(self.part_path, self.path)
+        return self.path
+
+    def abort(self):
+        """Stop writing and keep whatever was written in '<path>.part'"""
+        self._stop()
+        return self.part_path
+
+    def header(self):
+        return f"# Theme: {self.theme} \n\n"
+
+    def section(self, name, agent, text):
+        return f"<details>\n<summary>{name} ({agent})</summary>\n\n{text.strip().strip('`')}\n\n</details>\n\n"
+
+    def answer(self, text):
+        return f"---\n\n{text.strip()}\n"
+
+    def empty(self):
+        return "---\n\nNo data received from the LLM.\n"
+
+    def footer(self):
+        return ""
+
+
+class JsonlSink(OutputSink):
+    """One JSON record per line: the run, every finished task, then the answer"""
+
+    extension = ".jsonl"
+
+    def record(self, **fields):
+        return json.dumps({**fields, "time": time.time()}) + "\n"
+
+    def header(self):
+        return self.record(type="run", theme=self.theme)
+
+    def task(self, output):
+        # Every task gets a record of its own; the answer task's output is repeated as the "answer" record
+        self.write(self.section(output.name, output.agent, output.raw or ""))
+        if output.name == self.answer_task:
+            self.answered = True
+            self.write(self.answer(output.raw or ""))
+
+    def section(self, name, agent, text):
+        return self.record(type="task", name=name, agent=agent, raw=text)
+
+    def answer(self, text):
+        return self.record(type="answer", raw=text)
+
+    def empty(self):
+        return self.record(type="answer", raw=None)
+
+
+class HtmlSink(OutputSink):
+    """A standalone HTML page; task outputs are collapsed, the answer is shown in full"""
+
+    extension = ".html"
+
+    def header(self):
+        title = html.escape(f"Theme: {self.theme}")
+        return f'<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n<title>{title}</title>\n</head>\n<body>\n<h1>{title}</h1>\n'
+
+    def section(self, name, agent, text):
+        return f"<details>\n<summary>{html.escape(f'{name} ({agent})')}</summary>\n{markdown_to_html(text)}\n</details>\n"
+
+    def answer(self, text):
+        return f"<hr>\n<main>\n{markdown_to_html(text)}\n</main>\n"
+
+    def empty(self):
+        return "<hr>\n<p>No data received from the LLM.</p>\n"
+
+    def footer(self):
+        return "</body>\n</html>\n"
+
+
+def inline_html(text):
+    """Escape a line and render **bold** and bare or [titled](links)"""
+    text = html.escape(text, quote=False)
+    text = re.sub(r"\*\*(.+?)\*\*", r"<strong>\1</strong>", text)
+    text = re.sub(r"\[([^\]]+)\]\((https?://[^\s)]+)\)", r'<a href="\2">\1</a>', text)
+    return re.sub(r'(?<!href=")(?<!">)(https?://[^\s<)]+)', r'<a href="\1">\1</a>', text)
+
+
+def markdown_to_html(text):
+    """Just enough Markdown for the crew's output: headings, bullet/numbered lists, rules and paragraphs"""
+    lines = []
+    in_list = False
+    for line in text.strip().strip("`").splitlines():
+        stripped = line.strip()
+        item = re.match(r"(?:[-*+]|\d+[.)])\s+(.*)", stripped)
+        if in_list and not item:
+            lines.append("</ul>")
+            in_list = False
+        heading = re.match(r"(#{1,6})\s+(.*)", stripped)
+        if heading:
+            level = len(heading.group(1))
+            lines.append(f"<h{level}>{inline_html(heading.group(2))}</h{level}>")
+        elif item:
+            if not in_list:
+                lines.append("<ul>")
+                in_list = True
+            lines.append(f"<li>{inline_html(item.group(1))}</li>")
+        elif re.fullmatch(r"-{3,}|\*{3,}", stripped):
+            lines.append("<hr>")
+        elif stripped:
+            lines.append(f"<p>{inline_html(stripped)}</p>")
+    if in_list:
+        lines.append("</ul>")
+    return "\n".join(lines)
+
+
+SINKS = {"markdown": OutputSink, "jsonl": JsonlSink, "html": HtmlSink}
+
+
+def open_output(output_format, folder, name, theme, fsync=False, answer_task=None):
+    """Start writing '<folder>/<name>' plus the format's extension and return its sink"""
+    if output_format not in SINKS:
+        raise ValueError(f"Unknown output format '{output_format}'. Choose from: {', '.join(OUTPUT_FORMATS)}")
+    sink = SINKS[output_format]
+    return sink(os.path.join(folder, name + sink.extension), theme, fsync=fsync, answer_task=answer_task)
@@ -0,0 +1,171 @@
+import os
+import re
+import time
+import random
+import threading
+from wrapped_llm import WrappedLLM
+
+DEFAULT_RPM = int(os.environ.get("GEMINI_RPM", "15"))
+DEFAULT_TPM = int(os.environ.get("GEMINI_TPM", "1000000"))
+DEFAULT_MAX_CALLS_PER_TASK = int(os.environ.get("MAX_CALLS_PER_TASK", "8"))
+MAX_RETRIES = 5
+BACKOFF_BASE_SECONDS = 2.0
+BACKOFF_CAP_SECONDS = 60.0
+# A bare "429" can be any number in a message (a port, a token count), so only these phrases count
+RATE_LIMIT_MESSAGE = re.compile(r"\bresource_exhausted\b|\brate[ _-]?limit|\b429\b.*\btoo many requests\b")
+
+
+class CallBudgetExceeded(RuntimeError):
+    """Raised when one generation has made more LLM calls than it is allowed"""
+
+
+def estimate_tokens(content):
+    """Rough token count (~4 characters per token) of a prompt or a response"""
+    if isinstance(content, str):
+        return max(1, len(content) // 4)
+    return max(1, sum(len(str(message.get("content", ""))) for message in content) // 4)
+
+
+def is_rate_limit_error(error):
+    """True for Gemini / LiteLLM quota errors (HTTP 429, RESOURCE_EXHAUSTED)"""
+    if type(error).__name__ == "RateLimitError" or getattr(error, "status_code", None) == 429:
+        return True
+    return bool(RATE_LIMIT_MESSAGE.search(str(error).lower()))
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter for the given retry attempt (0-based)"""
+    return random.uniform(0, min(BACKOFF_CAP_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at per_minute / 60 per second"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount):
+        """Take amount right away (running into debt if needed) and return the seconds to wait before using it"""
+        with self._lock:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+            return max(0.0, -self.level / self.rate)
+
+    def resize(self, per_minute):
+        """Change the limit, keeping what has been used so far (the level is capped at the new capacity)"""
+        with self._lock:
+            self._refill()
+            self.capacity = float(per_minute)
+            self.rate = per_minute / 60.0
+            self.level = min(self.level, self.capacity)
+
+    def drain(self):
+        """Empty the bucket, so every caller waits for a fresh refill"""
+        with self._lock:
+            self._refill()
+            self.level = min(self.level, 0.0)
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits shared by every generation in the process"""
+
+    def __init__(self, rpm=DEFAULT_RPM, tpm=DEFAULT_TPM):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+
+    def acquire(self, prompt_tokens):
+        """Block until one request carrying prompt_tokens may be sent"""
+        wait = max(self.requests.reserve(1), self.tokens.reserve(prompt_tokens))
+        if wait:
+            time.sleep(wait)
+
+    def record_completion(self, completion_tokens):
+        """Charge the tokens of a response (only known after the call) against the tokens-per-minute limit"""
+        self.tokens.reserve(completion_tokens)
+
+    def penalize(self):
+        """Slow every caller down after the provider reported a rate limit"""
+        self.requests.drain()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model, rpm=None, tpm=None):
+    """Return the process-wide RateLimiter for a model; explicit rpm/tpm values change its limits
+
+    The buckets are created once per model, so a generator built later does not hand every caller a full bucket.
+    """
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = RateLimiter(rpm or DEFAULT_RPM, tpm or DEFAULT_TPM)
+        limiter = _limiters[model]
+        if rpm and rpm != limiter.requests.capacity:
+            limiter.requests.resize(rpm)
+        if tpm and tpm != limiter.tokens.capacity:
+            limiter.tokens.resize(tpm)
+        return limiter
+
+
+class CallBudget:
+    """Maximum number of LLM calls one generation may make, shared by all of its agents, and the time.time() after
+    which it may make none (None: no deadline)"""
+
+    def __init__(self, max_calls, deadline=None):
+        self.max_calls = max_calls
+        self.deadline = deadline
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def spend(self):
+        if self.deadline and time.time() > self.deadline:
+            # Checked before every call, so a generation past its deadline stops at its next LLM call
+            raise CallBudgetExceeded("This generation ran past its deadline.")
+        with self._lock:
+            self.calls += 1
+            if self.max_calls and self.calls > self.max_calls:
+                raise CallBudgetExceeded(f"This generation used up its budget of {self.max_calls} LLM calls.")
+
+
+class RateLimitedLLM(WrappedLLM):
+    """Wraps a CrewAI LLM with the shared rate limiter (None: unlimited), 429 retries and an optional per-generation budget"""
+
+    def __init__(self, llm, limiter, budget=None, max_retries=MAX_RETRIES):
+        super().__init__(llm)
+        self.limiter = limiter
+        self.budget = budget
+        self.max_retries = max_retries
+        self.retries = 0
+
+    def call(self, messages, tools=None, *args, **kwargs):
+        prompt_tokens = estimate_tokens(messages)
+        for attempt in range(self.max_retries + 1):
+            if self.budget:
+                self.budget.spend()
+            if self.limiter:
+                self.limiter.acquire(prompt_tokens)
+
+            try:
+                response = self._delegate(messages, tools, *args, **kwargs)
+            except Exception as error:
+                if not is_rate_limit_error(error) or attempt == self.max_retries:
+                    raise
+                if self.limiter:
+                    self.limiter.penalize()
+                self.retries += 1
+                time.sleep(backoff_delay(attempt))
+                continue
+
+            if isinstance(response, str) and self.limiter:
+                self.limiter.record_completion(estimate_tokens(response))
+            return response
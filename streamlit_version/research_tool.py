@@ -0,0 +1,28 @@
+from typing import Type
+from pydantic import BaseModel, Field
+from crewai.tools import BaseTool
+from retrieval import get_corpus_index, format_results, DEFAULT_CORPUS_INDEX_DIR, DEFAULT_TOP_K
+
+
+class CorpusSearchInput(BaseModel):
+    query: str = Field(description="What to look up: a topic title, or a specific question about one")
+
+
+class CorpusSearchTool(BaseTool):
+    """Top-k retrieval over a local document corpus, for the Topic Researcher"""
+
+    name: str = "Search research notes"
+    description: str = (
+        "Find the passages of the local research notes most relevant to a query. "
+        "Every passage comes with the source to cite for it."
+    )
+    args_schema: Type[BaseModel] = CorpusSearchInput
+    corpus_dir: str
+    index_dir: str = DEFAULT_CORPUS_INDEX_DIR
+    top_k: int = DEFAULT_TOP_K
+
+    def _run(self, query: str) -> str:
+        results = get_corpus_index(self.corpus_dir, self.index_dir).search(query, self.top_k)
+        if not results:
+            return "No passages of the research notes match this query; try other words."
+        return format_results(results)
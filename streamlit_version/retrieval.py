@@ -0,0 +1,455 @@
+"""
+Local research corpus: a BM25 index of a folder of Markdown / text documents, searched by the Topic Researcher.
+
+    python streamlit_version/retrieval.py notes --workers 8 --search "retrieval augmented generation"
+
+The index is updated incrementally: a manifest of every document's size, mtime and content hash means only new or
+edited documents are chunked again (across a process pool when there are many). Everything else is carried over
+from the previous index as is. The index is a few memory-mapped arrays and one text file, so opening it takes the
+same time however large the corpus grows.
+"""
+
+import os
+import re
+import sys
+import json
+import mmap
+import zlib
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from theme_cache import normalize_theme
+
+# The Markdown notes shipped with the repo: the first research corpus
+NOTES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "notes")
+# Directory of documents the researcher searches ("" or unset: research is not grounded in a corpus)
+DEFAULT_RESEARCH_CORPUS = os.environ.get("RESEARCH_CORPUS", "")
+DEFAULT_CORPUS_INDEX_DIR = os.environ.get(
+    "CORPUS_INDEX_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "article_topic_generator", "corpus_index")
+)
+DEFAULT_TOP_K = int(os.environ.get("RESEARCH_TOP_K", "5"))
+# How an existing index is brought up to date when a process first opens it: "background" searches the index as it
+# is while the changed documents are indexed, "startup" indexes them before the first search, "off" never does
+# (update it with this script instead)
+REFRESH_MODES = ("background", "startup", "off")
+DEFAULT_CORPUS_REFRESH = os.environ.get("CORPUS_REFRESH", "background")
+DEFAULT_INDEX_WORKERS = int(os.environ.get("CORPUS_INDEX_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Below this many changed documents, starting worker processes costs more than it saves
+PARALLEL_MIN_DOCUMENTS = 8
+CORPUS_EXTENSIONS = (".md", ".markdown", ".txt")
+CHUNK_WORDS = 180
+CHUNK_OVERLAP = 30
+# Terms are hashed, so searching needs no vocabulary loaded into memory
+TERM_BUCKETS = 1 << 20
+BM25_K1 = 1.2
+BM25_B = 0.75
+INDEX_VERSION = 2
+URL_PATTERN = re.compile(r"https?://[^\s<>)\]]+")
+
+
+def tokenize(text):
+    """Search terms of a text: the theme cache's normalization (abbreviations expanded, filler words dropped)"""
+    return normalize_theme(text).split()
+
+
+def term_ids(tokens):
+    return np.array([zlib.crc32(token.encode("utf-8")) % TERM_BUCKETS for token in tokens], dtype=np.uint32)
+
+
+def list_documents(corpus_dir):
+    """Paths (relative to corpus_dir, sorted) of every Markdown / text document under it"""
+    paths = []
+    for root, dirs, files in os.walk(corpus_dir):
+        dirs[:] = sorted(name for name in dirs if not name.startswith("."))
+        for name in files:
+            if name.lower().endswith(CORPUS_EXTENSIONS) and not name.startswith("."):
+                paths.append(os.path.relpath(os.path.join(root, name), corpus_dir))
+    return sorted(paths)
+
+
+def split_words(text, max_words=CHUNK_WORDS, overlap=CHUNK_OVERLAP):
+    """Split a long passage into windows of max_words that overlap by `overlap` words"""
+    words = text.split()
+    if len(words) <= max_words:
+        return [text]
+    step = max_words - overlap
+    return [" ".join(words[start:start + max_words]) for start in range(0, len(words) - overlap, step)]
+
+
+def chunk_document(text, max_words=CHUNK_WORDS):
+    """Split a Markdown document into [(heading, text)] passages of up to max_words, never across a heading or rule"""
+    chunks = []
+    heading = ""
+    paragraphs = []
+
+    def flush():
+        size = 0
+        passage = []
+        for paragraph in paragraphs:
+            words = len(paragraph.split())
+            if passage and size + words > max_words:
+                chunks.append((heading, "\n".join(passage)))
+                passage, size = [], 0
+            passage.append(paragraph)
+            size += words
+        if passage:
+            chunks.extend((heading, part) for part in split_words("\n".join(passage), max_words))
+        paragraphs.clear()
+
+    for line in re.sub(r"<br\s*/?>", "", text).splitlines():
+        stripped = line.strip()
+        match = re.match(r"#{1,6}\s+(.*)", stripped)
+        if match or re.fullmatch(r"-{3,}|\*{3,}|_{3,}", stripped):
+            flush()
+            if match:
+                heading = match.group(1).strip("# ")
+        elif stripped:
+            paragraphs.append(stripped)
+    flush()
+    return chunks
+
+
+def document_url(text):
+    """The first link of a document: where the notes were taken from, cited when no passage has a link of its own"""
+    match = URL_PATTERN.search(text)
+    return match.group(0) if match else None
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def ingest_document(corpus_dir, path):
+    """Chunk and tokenize one document: its records (encoded JSON), postings and passage lengths.
+    Runs in the indexer's worker processes, so it only returns bytes and arrays."""
+    with open(os.path.join(corpus_dir, path), "rb") as f:
+        data = f.read()
+    text = data.decode("utf-8", errors="replace")
+    url = document_url(text)
+
+    records, terms, chunks, counts, lengths = [], [], [], [], []
+    for chunk_id, (heading, passage) in enumerate(chunk_document(text)):
+        record = {"source": path, "heading": heading, "url": document_url(passage) or url, "text": passage}
+        records.append(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+        ids = term_ids(tokenize(f"{heading} {passage}"))
+        unique, frequencies = np.unique(ids, return_counts=True)
+        terms.append(unique)
+        chunks.append(np.full(len(unique), chunk_id, dtype=np.int64))
+        counts.append(frequencies)
+        lengths.append(len(ids))
+
+    return {
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "records": records,
+        "terms": np.concatenate(terms) if terms else np.zeros(0, dtype=np.uint32),
+        "chunks": np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.int64),
+        "counts": np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64),
+        "lengths": np.array(lengths, dtype=np.int32),
+    }
+
+
+def ingest_documents(corpus_dir, paths, workers=DEFAULT_INDEX_WORKERS):
+    """Return {path: ingested document}, chunking across a process pool when there are enough documents"""
+    if workers > 1 and len(paths) >= PARALLEL_MIN_DOCUMENTS:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            documents = pool.map(partial(ingest_document, corpus_dir), paths, chunksize=max(1, len(paths) // (workers * 4)))
+            return dict(zip(paths, documents))
+    return {path: ingest_document(corpus_dir, path) for path in paths}
+
+
+def scan_corpus(corpus_dir, manifest):
+    """Compare the corpus with an index's manifest and return (manifest entries of every document, changed paths).
+
+    A document whose size and mtime match its entry is not opened; one that was only touched (same contents
+    under a new mtime) is hashed and kept.
+    """
+    entries, changed = {}, []
+    for path in list_documents(corpus_dir):
+        full_path = os.path.join(corpus_dir, path)
+        stat = os.stat(full_path)
+        entry = manifest.get(path)
+        if entry and (entry["mtime_ns"], entry["size"]) != (stat.st_mtime_ns, stat.st_size):
+            if entry["size"] != stat.st_size or file_hash(full_path) != entry["sha256"]:
+                entry = None
+        if entry:
+            entries[path] = {**entry, "mtime_ns": stat.st_mtime_ns}
+        else:
+            # Statted before it is read: if it changes in between, the next scan sees a newer mtime and redoes it
+            entries[path] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+            changed.append(path)
+    return entries, changed
+
+
+def write_json(path, data):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(path + ".tmp", path)
+
+
+def write_index(directory, corpus_dir, entries, ingested, old=None, old_manifest=None):
+    """Write the index of every document in entries: the ingested ones from their new chunks, the rest copied
+    from the old index (their passages byte for byte, their postings renumbered)"""
+    building = f"{directory}.building-{os.getpid()}"
+    shutil.rmtree(building, ignore_errors=True)
+    os.makedirs(building)
+
+    # The manifest lists documents in chunk order, so it gives every old document's range of chunks
+    old_ranges, start = {}, 0
+    for path, entry in (old_manifest or {}).items():
+        old_ranges[path] = (start, start + entry["chunks"])
+        start += entry["chunks"]
+    old_to_new = np.full(len(old) if old else 0, -1, dtype=np.int64)
+
+    lengths, offsets, terms, chunks, counts = [], [], [], [], []
+    next_chunk = next_byte = 0
+    with open(os.path.join(building, "chunks.bin"), "wb") as f:
+        for path, entry in entries.items():
+            if path in ingested:
+                document = ingested[path]
+                entry.update(sha256=document["sha256"], chunks=len(document["records"]))
+                sizes = np.array([len(record) for record in document["records"]], dtype=np.int64)
+                f.write(b"".join(document["records"]))
+                offsets.append(next_byte + np.cumsum(sizes) - sizes)
+                lengths.append(document["lengths"])
+                terms.append(document["terms"])
+                chunks.append(document["chunks"] + next_chunk)
+                counts.append(document["counts"])
+                next_byte += int(sizes.sum())
+            else:
+                first, last = old_ranges[path]
+                begin, end = int(old.chunk_offsets[first]), int(old.chunk_offsets[last])
+                f.write(old.blob[begin:end])
+                offsets.append(np.asarray(old.chunk_offsets[first:last]) - begin + next_byte)
+                lengths.append(np.asarray(old.lengths[first:last]))
+                old_to_new[first:last] = np.arange(next_chunk, next_chunk + last - first)
+                next_byte += end - begin
+            next_chunk += entry["chunks"]
+
+    if old is not None and len(old.postings):
+        # Postings of the carried-over chunks, without tokenizing their text again
+        old_terms = np.repeat(np.asarray(old.terms), np.diff(np.asarray(old.term_offsets)))
+        renumbered = old_to_new[np.asarray(old.postings)]
+        kept = renumbered >= 0
+        terms.append(old_terms[kept])
+        chunks.append(renumbered[kept])
+        counts.append(np.asarray(old.frequencies)[kept])
+
+    terms = np.concatenate(terms).astype(np.uint32) if terms else np.zeros(0, dtype=np.uint32)
+    chunks = np.concatenate(chunks).astype(np.int32) if chunks else np.zeros(0, dtype=np.int32)
+    counts = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+    order = np.lexsort((chunks, terms))
+    terms, chunks, counts = terms[order], chunks[order], counts[order]
+    vocabulary, starts = np.unique(terms, return_index=True)
+    lengths = np.concatenate(lengths).astype(np.int32) if lengths else np.zeros(0, dtype=np.int32)
+
+    np.save(os.path.join(building, "terms.npy"), vocabulary)
+    np.save(os.path.join(building, "term_offsets.npy"), np.append(starts, len(terms)).astype(np.int64))
+    np.save(os.path.join(building, "postings.npy"), chunks)
+    np.save(os.path.join(building, "frequencies.npy"), np.minimum(counts, np.iinfo(np.uint16).max).astype(np.uint16))
+    np.save(os.path.join(building, "lengths.npy"), lengths)
+    np.save(os.path.join(building, "chunk_offsets.npy"), np.append(np.concatenate(offsets) if offsets else [], next_byte).astype(np.int64))
+    write_json(os.path.join(building, "manifest.json"), entries)
+
+    # The corpus's contents (not its mtimes) identify it, so touching a file leaves the signature alone
+    signature = hashlib.sha256()
+    for path, entry in entries.items():
+        signature.update(f"{path}\0{entry['sha256']}\n".encode("utf-8"))
+    write_json(os.path.join(building, "meta.json"), {
+        "version": INDEX_VERSION,
+        "corpus": corpus_dir,
+        "signature": signature.hexdigest(),
+        "documents": len(entries),
+        "chunks": next_chunk,
+        "average_length": float(lengths.mean()) if len(lengths) else 0.0,
+    })
+
+    # Swapped in whole, so a reader never sees half an index; readers of the old one keep their mapped files
+    retired = f"{directory}.old-{os.getpid()}"
+    shutil.rmtree(retired, ignore_errors=True)
+    if os.path.exists(directory):
+        os.replace(directory, retired)
+    os.replace(building, directory)
+    shutil.rmtree(retired, ignore_errors=True)
+
+
+def open_index(directory):
+    """The index in directory, or None when there is none (or it is from an older version)"""
+    try:
+        return CorpusIndex(directory)
+    except (OSError, ValueError):
+        return None
+
+
+def update_index(corpus_dir, directory, workers=DEFAULT_INDEX_WORKERS):
+    """Bring directory's index of corpus_dir up to date, chunking only new and changed documents again,
+    and return (index, {"documents", "changed", "removed"})"""
+    corpus_dir = os.path.abspath(corpus_dir)
+    old = open_index(directory)
+    manifest = old.manifest() if old else {}
+    entries, changed = scan_corpus(corpus_dir, manifest)
+    removed = [path for path in manifest if path not in entries]
+    stats = {"documents": len(entries), "changed": len(changed), "removed": len(removed)}
+
+    if old and not changed and not removed:
+        # Nothing to reindex; touched documents only get their new mtimes recorded
+        if any(entry["mtime_ns"] != manifest[path]["mtime_ns"] for path, entry in entries.items()):
+            write_json(os.path.join(directory, "manifest.json"), entries)
+        return old, stats
+
+    ingested = ingest_documents(corpus_dir, changed, workers)
+    write_index(directory, corpus_dir, entries, ingested, old, manifest)
+    return CorpusIndex(directory), stats
+
+
+class CorpusIndex:
+    """BM25 index of a document corpus; its arrays are memory-mapped, so opening it reads almost nothing"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("version") != INDEX_VERSION:
+            raise ValueError(f"Corpus index in {directory} has an unsupported version; rebuild it.")
+
+        def load(name):
+            return np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+
+        self.terms = load("terms")
+        self.term_offsets = load("term_offsets")
+        self.postings = load("postings")
+        self.frequencies = load("frequencies")
+        self.lengths = load("lengths")
+        self.chunk_offsets = load("chunk_offsets")
+        with open(os.path.join(directory, "chunks.bin"), "rb") as f:
+            # mmap refuses empty files
+            self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+
+    def __len__(self):
+        return self.meta["chunks"]
+
+    def manifest(self):
+        """{path: {mtime_ns, size, sha256, chunks}} of every indexed document, in chunk order (only the indexer reads it)"""
+        with open(os.path.join(self.directory, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def chunk(self, chunk_id):
+        """The {source, heading, url, text} record of a chunk"""
+        start, end = int(self.chunk_offsets[chunk_id]), int(self.chunk_offsets[chunk_id + 1])
+        return json.loads(self.blob[start:end].decode("utf-8"))
+
+    def search(self, query, k=DEFAULT_TOP_K):
+        """The k chunks that best match query by BM25, best first, each with its score"""
+        if not len(self) or not len(self.terms):
+            return []
+        scores = np.zeros(len(self), dtype=np.float32)
+        average_length = self.meta["average_length"] or 1.0
+        for term in np.unique(term_ids(tokenize(query))):
+            position = int(np.searchsorted(self.terms, term))
+            if position == len(self.terms) or self.terms[position] != term:
+                continue
+            start, end = int(self.term_offsets[position]), int(self.term_offsets[position + 1])
+            chunks = self.postings[start:end]
+            frequencies = self.frequencies[start:end].astype(np.float32)
+            idf = np.log(1.0 + (len(self) - (end - start) + 0.5) / ((end - start) + 0.5))
+            norms = BM25_K1 * (1.0 - BM25_B + BM25_B * self.lengths[chunks] / average_length)
+            scores[chunks] += idf * frequencies * (BM25_K1 + 1.0) / (frequencies + norms)
+
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best], kind="stable")]
+        return [{**self.chunk(int(i)), "score": round(float(scores[i]), 4)} for i in best if scores[i] > 0]
+
+
+def format_results(results):
+    """Numbered passages, each headed by the source to cite for it"""
+    blocks = []
+    for number, result in enumerate(results, start=1):
+        where = result["source"] + (f" § {result['heading']}" if result["heading"] else "")
+        cite = f"\nCite: {result['url']}" if result["url"] else f"\nCite: {result['source']}"
+        blocks.append(f"[{number}] {where}{cite}\n{result['text']}")
+    return "\n\n".join(blocks)
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def index_directory(corpus_dir, index_dir=DEFAULT_CORPUS_INDEX_DIR):
+    """Where a corpus's index lives: one per corpus, so several corpora can share the index directory"""
+    return os.path.join(index_dir, hashlib.sha256(os.path.abspath(corpus_dir).encode("utf-8")).hexdigest()[:16])
+
+
+def refresh_index(corpus_dir, directory):
+    """Update an index that is already being searched, then swap the result in"""
+    try:
+        index, _ = update_index(corpus_dir, directory)
+    except Exception as error:
+        # The index as it was keeps being searched
+        print(f"Could not update the index of {corpus_dir}: {error}", file=sys.stderr)
+        return
+    with _indexes_lock:
+        _indexes[directory] = index
+
+
+def get_corpus_index(corpus_dir, index_dir=DEFAULT_CORPUS_INDEX_DIR, refresh=DEFAULT_CORPUS_REFRESH):
+    """Return the process-wide index of corpus_dir, building it if there is none yet
+
+    An existing index is opened as is (a few memory maps, however large the corpus) and brought up to date
+    according to refresh (see REFRESH_MODES).
+    """
+    if refresh not in REFRESH_MODES:
+        raise ValueError(f"Unknown corpus refresh '{refresh}'. Choose one of: {', '.join(REFRESH_MODES)}")
+    corpus_dir = os.path.abspath(corpus_dir)
+    if not os.path.isdir(corpus_dir):
+        raise ValueError(f"Research corpus '{corpus_dir}' is not a directory.")
+
+    directory = index_directory(corpus_dir, index_dir)
+    with _indexes_lock:
+        index = _indexes.get(directory)
+        if index is None:
+            index = open_index(directory)
+            if index is None or refresh == "startup":
+                # Nothing to search yet (or asked to be up to date first)
+                index, _ = update_index(corpus_dir, directory)
+            elif refresh == "background":
+                threading.Thread(
+                    target=refresh_index, args=(corpus_dir, directory), name="corpus-indexer", daemon=True
+                ).start()
+            _indexes[directory] = index
+        return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Index a folder of notes for the Topic Researcher, or bring its index up to date.")
+    parser.add_argument("corpus", nargs="?", default=DEFAULT_RESEARCH_CORPUS or NOTES_DIR, help="default: RESEARCH_CORPUS, else notes/")
+    parser.add_argument("--index-dir", default=DEFAULT_CORPUS_INDEX_DIR)
+    parser.add_argument("--workers", type=int, default=DEFAULT_INDEX_WORKERS, help="processes chunking documents at the same time")
+    parser.add_argument("--search", metavar="QUERY", help="then show the passages that best match QUERY")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.corpus):
+        parser.error(f"'{args.corpus}' is not a directory")
+    started = time.perf_counter()
+    index, stats = update_index(args.corpus, index_directory(args.corpus, args.index_dir), args.workers)
+    print(
+        f"{stats['documents']} documents ({stats['changed']} new or changed, {stats['removed']} removed), "
+        f"{len(index)} passages, in {time.perf_counter() - started:.2f}s"
+    )
+    if args.search:
+        results = index.search(args.search)
+        print("\n" + (format_results(results) if results else "No passages match."))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
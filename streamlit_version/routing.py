@@ -0,0 +1,52 @@
+import os
+import json
+from backends import DEFAULT_MODEL, DEFAULT_TEMPERATURE
+
+AGENTS = ("planner", "researcher", "condenser", "collector", "writer")
+# Built-in routing policies; any other value of MODEL_ROUTING / routing= is read as the path of a JSON config
+# with the same shape: {"default": {"model", "temperature"}, "agents": {<agent>: {"model", "temperature"}}}
+ROUTING_POLICIES = {
+    # Every agent on the same model, as the crew has always run
+    "single": {},
+    # Planning and research decide the quality of the topics and keep the strong model; condensing,
+    # collecting links and joining are mechanical reformatting that a small model at temperature 0 does
+    # faster and cheaper (and more repeatably)
+    "tiered": {
+        "agents": {
+            "planner": {"model": "gemini/gemini-2.5-flash", "temperature": 0.8},
+            "researcher": {"model": "gemini/gemini-2.5-flash", "temperature": 0.8},
+            "condenser": {"model": "gemini/gemini-2.0-flash-lite", "temperature": 0.0},
+            "collector": {"model": "gemini/gemini-2.0-flash-lite", "temperature": 0.0},
+            "writer": {"model": "gemini/gemini-2.0-flash-lite", "temperature": 0.0},
+        }
+    },
+}
+DEFAULT_ROUTING = os.environ.get("MODEL_ROUTING", "single")
+
+
+def read_route(config, fallback):
+    """(model, temperature) from a {"model", "temperature"} entry; missing keys come from fallback"""
+    unknown = set(config) - {"model", "temperature"}
+    if unknown:
+        raise ValueError(f"Unknown model routing setting '{', '.join(sorted(unknown))}'. Use 'model' and 'temperature'.")
+    return str(config.get("model", fallback[0])), float(config.get("temperature", fallback[1]))
+
+
+def load_routing(routing=DEFAULT_ROUTING):
+    """Return {agent: (model, temperature)} for a policy name, a JSON config path or an already parsed config"""
+    if isinstance(routing, dict):
+        config = routing
+    elif routing in ROUTING_POLICIES:
+        config = ROUTING_POLICIES[routing]
+    elif os.path.isfile(routing):
+        with open(routing, encoding="utf-8") as f:
+            config = json.load(f)
+    else:
+        raise ValueError(f"Unknown model routing '{routing}'. Choose one of: {', '.join(ROUTING_POLICIES)}, or give a JSON config file.")
+
+    default = read_route(config.get("default", {}), (DEFAULT_MODEL, DEFAULT_TEMPERATURE))
+    agents = config.get("agents", {})
+    unknown = set(agents) - set(AGENTS)
+    if unknown:
+        raise ValueError(f"Unknown agent '{', '.join(sorted(unknown))}' in model routing. Choose from: {', '.join(AGENTS)}")
+    return {agent: read_route(agents.get(agent, {}), default) for agent in AGENTS}
@@ -0,0 +1,259 @@
+import re
+import json
+import random
+import hashlib
+from typing import List, Optional
+from pydantic import BaseModel, Field, ValidationError, field_validator, model_validator
+from assembly import (
+    strip_fences, parse_topics, split_topics, extract_links,
+    extract_condensed_points, merge_topic_sections, render_topic_body
+)
+
+
+MIN_TOPICS = 5
+MAX_TOPICS = 10
+
+
+def canonical_theme(theme):
+    """'  AI in   Healthcare ' -> 'ai in healthcare': requests differing only in case and spacing are the same"""
+    return " ".join(theme.split()).casefold()
+
+
+class GenerationRequest(BaseModel):
+    """What a generation is asked for; the topic count is explicit or drawn from the seed, never at random"""
+    theme: str
+    number_of_topics: Optional[int] = Field(default=None, ge=1)
+    seed: int = Field(default=0, description="Picks the topic count when none is given; shown to the user so a draw can be repeated")
+
+    @field_validator("theme")
+    @classmethod
+    def collapse_whitespace(cls, theme):
+        theme = " ".join(theme.split())
+        if not theme:
+            raise ValueError("The theme is empty.")
+        return theme
+
+    @model_validator(mode="after")
+    def draw_topic_count(self):
+        # Seeded by the theme as well, so the same seed gives different themes different (but repeatable) counts
+        if self.number_of_topics is None:
+            self.number_of_topics = random.Random(f"{canonical_theme(self.theme)}:{self.seed}").randint(MIN_TOPICS, MAX_TOPICS)
+        return self
+
+    def fingerprint(self, routes, prompt_version, **settings):
+        """Hash of everything that decides the output (normalized theme, topic count, per-agent model and
+        temperature, prompt version, pipeline settings): requests that share it can share a result"""
+        canonical = {
+            "theme": canonical_theme(self.theme),
+            "number_of_topics": self.number_of_topics,
+            "models": {agent: list(route) for agent, route in routes.items()},
+            "prompt_version": prompt_version,
+            **settings
+        }
+        return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class TopicPlan(BaseModel):
+    """Output of the Topic Planner"""
+    topics: List[str] = Field(description="The topic titles, in order, without numbering or commentary")
+
+
+class Finding(BaseModel):
+    heading: str = Field(description="Bolded subheading of the finding")
+    detail: str = Field(description="What was found")
+
+
+class TopicResearch(BaseModel):
+    """Output of the Topic Researcher for one topic"""
+    topic: str = Field(description="The topic title exactly as planned")
+    findings: List[Finding] = Field(default_factory=list)
+    sources: List[str] = Field(default_factory=list, description="Exact source URLs, unmodified")
+
+
+class ResearchReport(BaseModel):
+    topics: List[TopicResearch] = Field(description="One entry per planned topic, in the planner's order")
+
+
+class CondensedPoint(BaseModel):
+    heading: str = Field(description="A 1-3 word heading")
+    summary: str = Field(description="A one-sentence summary")
+
+    def to_markdown(self):
+        return f"**{self.heading}:** {self.summary}"
+
+
+class TopicSummary(BaseModel):
+    """Output of the Summary Generator for one topic"""
+    topic: str = Field(description="The topic title exactly as planned")
+    points: List[CondensedPoint] = Field(default_factory=list)
+
+
+class CondensedReport(BaseModel):
+    topics: List[TopicSummary] = Field(description="One entry per planned topic, in the planner's order")
+
+
+class TopicLinks(BaseModel):
+    """Output of the Link Collector for one topic"""
+    topic: str = Field(description="The topic title exactly as planned")
+    links: List[str] = Field(default_factory=list, description="Exact source URLs, unmodified")
+
+
+class LinkReport(BaseModel):
+    topics: List[TopicLinks] = Field(description="One entry per planned topic, in the planner's order")
+
+
+class TopicSection(BaseModel):
+    """One finished topic: its condensed points and the resources behind them"""
+    title: str
+    points: List[CondensedPoint] = Field(default_factory=list)
+    links: List[str] = Field(default_factory=list)
+
+    def to_markdown(self):
+        return render_topic_body([point.to_markdown() for point in self.points], self.links)
+
+
+class TopicDraft(BaseModel):
+    """Output of the Article Prompt Writer"""
+    topics: List[TopicSection] = Field(description="One entry per planned topic, in the planner's order")
+
+
+# A complete JSON string, and whether it is followed by ':' (a key) or not (a value)
+JSON_STRING = re.compile(r'"((?:[^"\\]|\\.)*)"(\s*:)?')
+
+
+def draft_preview(text):
+    """Markdown of a TopicDraft still being streamed as JSON, from the strings that are complete so far;
+    an answer that is not TopicDraft JSON is returned as is"""
+    start = text.find("{")
+    if start == -1 or '"topics"' not in text:
+        return text
+    titles, sections = [], []
+    key = heading = None
+    for match in JSON_STRING.finditer(text, start):
+        try:
+            value = json.loads(f'"{match.group(1)}"')
+        except ValueError:
+            continue
+        if match.group(2):
+            key = value
+        elif key == "title":
+            titles.append(value)
+            sections.append(([], []))
+        elif key == "heading":
+            heading = value
+        elif key == "summary" and sections:
+            sections[-1][0].append(CondensedPoint(heading=heading or "", summary=value).to_markdown())
+        elif key == "links" and sections:
+            sections[-1][1].append(value)
+    return merge_topic_sections(titles, [render_topic_body(points, links) for points, links in sections])
+
+
+class ArticleTopics(BaseModel):
+    """The typed result of a generation; Markdown is only rendered by to_markdown()"""
+    theme: str
+    topics: List[TopicSection]
+    # Kept so a single topic can be regenerated later without planning or researching again
+    research: List[TopicResearch] = Field(default_factory=list)
+    token_usage: dict = Field(default_factory=dict)
+
+    def to_markdown(self):
+        return merge_topic_sections([topic.title for topic in self.topics], [topic.to_markdown() for topic in self.topics])
+
+
+def parse_output(output, model):
+    """Return a task's output as model: CrewAI's conversion if it is one, else the raw text parsed as JSON, else None"""
+    # A single-topic task is converted to TopicResearch / TopicSummary / TopicLinks, not to the report being asked for
+    if isinstance(getattr(output, "pydantic", None), model):
+        return output.pydantic
+    text = strip_fences(output.raw if hasattr(output, "raw") else output)
+    start = text.find("{")
+    if start == -1:
+        return None
+    try:
+        return model.model_validate(json.JSONDecoder().raw_decode(text[start:])[0])
+    except (ValueError, ValidationError):
+        return None
+
+
+def plan_from(output, limit=None):
+    """Topic titles from the planner's typed output, falling back to its numbered list"""
+    plan = parse_output(output, TopicPlan)
+    topics = [topic.strip() for topic in plan.topics if topic.strip()] if plan else parse_topics(output.raw)
+    return topics[:limit] if limit else topics
+
+
+def research_from(output, topics):
+    """TopicResearch per planned topic from a (multi-topic or single-topic) research output"""
+    report = parse_output(output, ResearchReport)
+    if report is None:
+        single = parse_output(output, TopicResearch)
+        report = ResearchReport(topics=[single]) if single else None
+    if report is not None:
+        return match_topics(topics, report.topics, lambda topic: TopicResearch(topic=topic))
+
+    # Free-form Markdown: split on the '## Topic <n>:' headings (or take it whole for a single topic)
+    sections = split_topics(output.raw)
+    return [
+        TopicResearch(topic=topic, sources=extract_links(sections.get(number) or (output.raw if len(topics) == 1 else "")))
+        for number, topic in enumerate(topics, start=1)
+    ]
+
+
+def summaries_from(output, topics):
+    """TopicSummary per planned topic from a condenser output"""
+    report = parse_output(output, CondensedReport)
+    if report is None:
+        single = parse_output(output, TopicSummary)
+        report = CondensedReport(topics=[single]) if single else None
+    if report is not None:
+        return match_topics(topics, report.topics, lambda topic: TopicSummary(topic=topic))
+
+    sections = split_topics(output.raw)
+    summaries = []
+    for number, topic in enumerate(topics, start=1):
+        points = []
+        for point in extract_condensed_points(sections.get(number) or (output.raw if len(topics) == 1 else "")):
+            heading, _, summary = point.partition(":")
+            points.append(CondensedPoint(heading=heading.strip("* "), summary=summary.strip("* ")))
+        summaries.append(TopicSummary(topic=topic, points=points))
+    return summaries
+
+
+def links_from(output, topics):
+    """TopicLinks per planned topic from a Link Collector output"""
+    report = parse_output(output, LinkReport)
+    if report is None:
+        single = parse_output(output, TopicLinks)
+        report = LinkReport(topics=[single]) if single else None
+    if report is not None:
+        return match_topics(topics, report.topics, lambda topic: TopicLinks(topic=topic))
+    return [TopicLinks(topic=topic, links=extract_links(output.raw) if len(topics) == 1 else []) for topic in topics]
+
+
+def match_topics(topics, items, empty):
+    """Line items up with the planned topics by title (falling back to position); missing topics get empty()"""
+    by_title = {item.topic.strip().lower(): item for item in items}
+    matched = []
+    for index, topic in enumerate(topics):
+        item = by_title.get(topic.strip().lower())
+        if item is None and index < len(items) and items[index].topic.strip().lower() not in {t.strip().lower() for t in topics}:
+            item = items[index]
+        matched.append(item or empty(topic))
+    return matched
+
+
+def build_result(theme, topics, research, summaries, links=None, draft=None, token_usage=None):
+    """Assemble the typed result, preferring the writer's sections and filling in anything it dropped"""
+    drafted = {section.title.strip().lower(): section for section in (draft.topics if draft else [])}
+    sections = []
+    for index, topic in enumerate(topics):
+        section = drafted.get(topic.strip().lower())
+        points = summaries[index].points
+        # The Link Collector's list when there is one, else the researcher's sources
+        urls = links[index].links if links and links[index].links else research[index].sources
+        if section is None or not section.points:
+            section = TopicSection(title=topic, points=points, links=urls)
+        elif not section.links:
+            section = section.model_copy(update={"links": urls})
+        sections.append(section)
+    return ArticleTopics(theme=theme, topics=sections, research=research, token_usage=token_usage or {})
@@ -0,0 +1,67 @@
+import threading
+from contextlib import contextmanager
+
+try:
+    from crewai.events import crewai_event_bus, LLMStreamChunkEvent
+except ImportError:
+    try:
+        from crewai.utilities.events import crewai_event_bus, LLMStreamChunkEvent
+    except ImportError:  # CrewAI releases without LLM streaming events
+        crewai_event_bus = LLMStreamChunkEvent = None
+
+STREAMING_AVAILABLE = crewai_event_bus is not None
+FINAL_ANSWER = "Final Answer:"
+
+# id(LLM) -> callback; the event bus is process-wide, so chunks are routed by the LLM that emitted them
+_listeners = {}
+_listeners_lock = threading.Lock()
+
+
+def _dispatch_chunk(source, event):
+    with _listeners_lock:
+        listener = _listeners.get(id(source))
+    if listener:
+        listener(event.chunk)
+
+
+if STREAMING_AVAILABLE:
+    crewai_event_bus.on(LLMStreamChunkEvent)(_dispatch_chunk)
+
+
+class FinalAnswerFilter:
+    """Pass on only the text an agent streams after its 'Final Answer:' marker"""
+
+    def __init__(self, on_text):
+        self.on_text = on_text
+        self.buffer = ""
+        self.answering = False
+
+    def feed(self, chunk):
+        if self.answering:
+            self.on_text(chunk)
+            return
+
+        # The marker can be split across chunks, so look for it in everything received so far
+        self.buffer += chunk
+        position = self.buffer.find(FINAL_ANSWER)
+        if position != -1:
+            self.answering = True
+            rest = self.buffer[position + len(FINAL_ANSWER):].lstrip()
+            if rest:
+                self.on_text(rest)
+
+
+@contextmanager
+def stream_tokens(llm, on_token):
+    """Send the answer text llm streams to on_token for the duration of the block"""
+    # The cache / rate limit wrappers sit around the LLM that actually streams (and emits the chunk events)
+    source = llm
+    while getattr(source, "wraps_llm", False):
+        source = source.llm
+    with _listeners_lock:
+        _listeners[id(source)] = FinalAnswerFilter(on_token).feed
+    try:
+        yield
+    finally:
+        with _listeners_lock:
+            _listeners.pop(id(source), None)
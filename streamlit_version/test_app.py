@@ -0,0 +1,51 @@
+import os
+import time
+import pytest
+
+pytest.importorskip("crewai")
+pytest.importorskip("pysqlite3")
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+
+@pytest.fixture
+def app_env(tmp_path, monkeypatch):
+    """The app on the fake backend, its generations and theme index kept apart from the real ones"""
+    import backends
+    import generator
+    import theme_cache
+
+    monkeypatch.setattr(backends, "DEFAULT_BACKEND", "fake")
+    get_generator = generator.get_generator
+
+    def get_fake_generator(**options):
+        fake = get_generator(**{"backend": "fake", "checkpoint_path": None, **options})
+        for llm in fake.backend_llms.values():
+            llm.latency = llm.tokens_per_second = 0
+        return fake
+
+    monkeypatch.setattr(generator, "get_generator", get_fake_generator)
+    monkeypatch.setattr(generator, "get_theme_index", lambda: theme_cache.ThemeIndex(str(tmp_path / "themes")))
+
+
+def generate(theme):
+    at = AppTest.from_file(APP, default_timeout=60).run()
+    at.text_input[0].input(theme)
+    at.button[0].click().run()
+    for _ in range(120):
+        if at.session_state.result_data:
+            return at
+        time.sleep(0.5)
+        at.run()
+    raise AssertionError("the generation did not finish")
+
+
+def test_anonymous_history_stays_in_its_own_session(app_env):
+    first = generate("Ocean Robotics")
+    assert "Ocean Robotics (" in [expander.label for expander in first.sidebar.expander][0]
+    # Nothing in the URL grants access to it, and another visitor does not see it
+    assert "history" not in first.query_params
+    other = AppTest.from_file(APP, default_timeout=60).run()
+    assert not other.sidebar.expander
+    assert [info.value for info in other.sidebar.info] == ["No history yet"]
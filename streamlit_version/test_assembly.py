@@ -0,0 +1,68 @@
+import asyncio
+import pytest
+
+from assembly import extract_links, extract_condensed_points, split_topics, render_topic_body
+from schemas import research_from, summaries_from, build_result
+
+RESEARCH = """```markdown
+## Topic 1: Sea Robots
+### Research Findings
+- **Power:** Wave gliders, see https://example.org/ignored-in-findings
+### Source Links
+- https://example.org/gliders.
+- https://example.org/gliders
+- (https://example.org/power)
+
+## Topic 2: Reef Mapping
+### Source Links
+1. https://example.org/sonar
+```"""
+
+CONDENSED = """## Topic 1: Sea Robots
+### Condensed Information Points
+- **Power:** Runs on waves.
+- **Range:** Crosses oceans.
+
+## Topic 2: Reef Mapping
+### Condensed Information Points
+- **Sonar:** Maps the reef floor.
+"""
+
+
+class Output:
+    def __init__(self, raw):
+        self.raw = raw
+
+
+def test_free_form_outputs_are_split_per_topic():
+    sections = split_topics(RESEARCH)
+    assert sorted(sections) == [1, 2]
+    # The Source Links section wins over URLs in the findings; duplicates and trailing punctuation are dropped
+    assert extract_links(sections[1]) == ["https://example.org/gliders", "https://example.org/power"]
+    assert extract_condensed_points(split_topics(CONDENSED)[1]) == ["**Power:** Runs on waves.", "**Range:** Crosses oceans."]
+
+
+def test_structured_assembly_builds_sections_from_condenser_points_and_research_links():
+    topics = ["Sea Robots", "Reef Mapping"]
+    result = build_result("Oceans", topics, research_from(Output(RESEARCH), topics), summaries_from(Output(CONDENSED), topics))
+
+    assert [section.links for section in result.topics] == [
+        ["https://example.org/gliders", "https://example.org/power"], ["https://example.org/sonar"]
+    ]
+    assert result.topics[1].points[0].heading == "Sonar"
+    assert result.to_markdown().startswith("## Topic 1: Sea Robots\n\n### Condensed Information Points\n- **Power:** Runs on waves.")
+    assert render_topic_body([], []).endswith("_No source links were returned for this topic._")
+
+
+def test_structured_assembly_skips_the_collector_and_writer_calls():
+    pytest.importorskip("crewai")
+    from generator import ArticleTopicGenerator
+
+    generator = ArticleTopicGenerator(backend="fake", structured_assembly=True, checkpoint_path=None)
+    for llm in generator.backend_llms.values():
+        llm.latency = llm.tokens_per_second = 0
+    calls = sum(llm.usage["calls"] for llm in generator.backend_llms.values())
+    result = asyncio.run(generator.generate_topics("Ocean Robotics", 3))
+
+    assert sum(llm.usage["calls"] for llm in generator.backend_llms.values()) - calls == 3
+    assert len(result.topics) == 3 and all(topic.points and topic.links for topic in result.topics)
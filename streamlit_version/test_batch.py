@@ -0,0 +1,72 @@
+import json
+import pytest
+
+pytest.importorskip("crewai")
+
+from batch import main, read_themes
+
+
+def read_jsonl(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_invalid_topic_counts_fail_only_their_theme(tmp_path):
+    themes = tmp_path / "themes.csv"
+    themes.write_text("theme,topics\nOcean Robotics,five\nSoil Health,0\nDeep Sea Mining, 6 \n", encoding="utf-8")
+    assert [item["topics"] for item in read_themes(str(themes))] == ["five", "0", "6"]
+
+    themes.write_text("theme,topics\nOcean Robotics,five\nSoil Health,0\n", encoding="utf-8")
+    out_dir = tmp_path / "out"
+    assert main([str(themes), "--out-dir", str(out_dir), "--format", "jsonl", "--backend", "fake", "--cache", "off"]) == 1
+
+    records = read_jsonl(out_dir / "results.jsonl")
+    assert sorted(record["theme"] for record in records) == ["Ocean Robotics", "Soil Health"]
+    assert all(record["status"] == "error" and "number_of_topics" in record["error"] for record in records)
+
+
+@pytest.mark.parametrize("output_format", ["markdown", "html", "jsonl"])
+def test_failed_themes_are_recorded_on_disk_in_every_format(tmp_path, output_format):
+    themes = tmp_path / "themes.csv"
+    themes.write_text("theme,topics\nOcean Robotics,five\n", encoding="utf-8")
+    out_dir = tmp_path / "out"
+    assert main([str(themes), "--out-dir", str(out_dir), "--format", output_format, "--backend", "fake", "--cache", "off"]) == 1
+
+    [failure] = read_jsonl(out_dir / "failures.jsonl")
+    assert failure["index"] == 1 and failure["theme"] == "Ocean Robotics"
+    assert failure["status"] == "error" and "number_of_topics" in failure["error"]
+
+
+def test_workers_run_at_once_whatever_the_default_pool(tmp_path, monkeypatch):
+    import os
+    import time
+    import asyncio
+    import threading
+    import backends
+    from batch import run_batch
+
+    running, peak, lock = 0, 0, threading.Lock()
+    call = backends.SimulatedLLM.call
+
+    def counting_call(self, messages, *args, **kwargs):
+        nonlocal running, peak
+        self.latency, self.tokens_per_second = 0, 0
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        try:
+            time.sleep(0.2)
+            return call(self, messages, *args, **kwargs)
+        finally:
+            with lock:
+                running -= 1
+
+    monkeypatch.setattr(backends.SimulatedLLM, "call", counting_call)
+    # As on a one-CPU machine, where the loop's default pool would only hold 5 threads
+    monkeypatch.setattr(os, "cpu_count", lambda: 1)
+    themes = [{"theme": f"Theme {index}", "topics": "3"} for index in range(8)]
+    failures = asyncio.run(run_batch(themes, str(tmp_path), output_format="jsonl", workers=8,
+                                     backend="fake", cache="off", checkpoint_path=None))
+
+    assert failures == 0
+    assert len(read_jsonl(tmp_path / "results.jsonl")) == 8
+    assert peak == 8
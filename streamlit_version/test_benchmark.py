@@ -0,0 +1,19 @@
+import argparse
+import pytest
+
+pytest.importorskip("crewai")
+
+from benchmark import run_in_subprocess
+
+
+def test_configurations_report_their_row_on_a_fresh_home(tmp_path, monkeypatch):
+    # A HOME CrewAI has never seen, as in CI, is where it prompts about execution traces on stdout
+    monkeypatch.setenv("HOME", str(tmp_path))
+    args = argparse.Namespace(
+        runs=1, mode="sequential", max_concurrency=4, routing="single", latency=0.0, tokens_per_second=1e6,
+        structured_assembly=False
+    )
+    row = run_in_subprocess(args, 3, 1)
+    assert row["topics"] == 3 and row["concurrency"] == 1
+    assert row["calls_per_generation"] > 0
+    assert row["p50_seconds"] < 15
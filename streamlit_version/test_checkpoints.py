@@ -0,0 +1,61 @@
+import pytest
+
+from checkpoints import CheckpointStore, ResumeRefused, HEARTBEAT_SECONDS, LIVE_HEARTBEATS
+
+
+def age_heartbeat(store, run_id, seconds):
+    with store._conn:
+        store._conn.execute("UPDATE runs SET heartbeat = heartbeat - ? WHERE run_id = ?", (seconds, run_id))
+
+
+def test_latest_incomplete_skips_other_origins_and_live_runs(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite3"))
+    cli = store.start("Ocean Robotics", 5, {"cli": True, "fingerprint": "a"})
+    store.start("Soil Health", 5, {"fingerprint": "b"}).finish("failed")
+
+    # Still running (and stamped) in this process
+    assert store.run(cli.run_id)["live"]
+    assert store.latest_incomplete({"cli": True}) is None
+
+    # Its process is gone: the stamp is older than the allowed number of heartbeats
+    age_heartbeat(store, cli.run_id, HEARTBEAT_SECONDS * (LIVE_HEARTBEATS + 1))
+    assert store.latest_incomplete({"cli": True})["run_id"] == cli.run_id
+    assert store.latest_incomplete()["theme"] == "Soil Health"
+
+
+def test_resuming_needs_the_same_fingerprint_and_a_stopped_run(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite3"))
+    options = {"fingerprint": "a", "prompt_version": 2}
+    run_id = store.start("Ocean Robotics", 5, options).run_id
+
+    with pytest.raises(ResumeRefused, match="still running"):
+        store.start("Ocean Robotics", 5, options, run_id)
+
+    store.finish(run_id, "failed")
+    with pytest.raises(ResumeRefused, match="prompt version 2, not 3"):
+        store.start("Ocean Robotics", 5, {"fingerprint": "b", "prompt_version": 3}, run_id)
+    with pytest.raises(ResumeRefused, match="other models"):
+        store.start("Ocean Robotics", 5, {"fingerprint": "b", "prompt_version": 2}, run_id)
+    assert store.start("Ocean Robotics", 5, options, run_id).run_id == run_id
+
+
+def test_restored_outputs_are_typed_again_so_they_can_be_pruned_to_the_budget():
+    pytest.importorskip("crewai")
+    from checkpoints import restore_tasks
+    from context_pruning import prune_text
+    from generator import ArticleTopicGenerator
+    from schemas import ResearchReport, TopicResearch, Finding
+
+    report = ResearchReport(topics=[
+        TopicResearch(topic=f"Topic {number}", findings=[Finding(heading="Finding", detail="A long detail. " * 40)] * 6,
+                      sources=[f"https://example.org/{number}"])
+        for number in range(3)
+    ])
+    tasks = ArticleTopicGenerator(backend="fake", checkpoint_path=None).crew.copy().tasks
+    research = tasks[1]
+    remaining = restore_tasks(tasks, {research.name: (None, "```json\n" + report.model_dump_json() + "\n```")})
+
+    assert research not in remaining and len(remaining) == 4
+    assert research.output.pydantic == report
+    pruned = prune_text(research.output, budget=500)
+    assert len(pruned) < len(report.model_dump_json()) // 2 and "https://example.org/2" in pruned
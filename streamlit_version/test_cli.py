@@ -0,0 +1,32 @@
+import os
+import sys
+import glob
+import subprocess
+import pytest
+
+pytest.importorskip("crewai")
+
+CLI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "py_01_article_topic_generator.py")
+
+
+def run_cli(home, *args, **env):
+    """Run the CLI on the fake backend with HOME (and so its Downloads folder and caches) in home"""
+    env = {
+        **os.environ, "HOME": str(home), "LLM_BACKEND": "fake", "FAKE_LLM_LATENCY": "0",
+        "FAKE_LLM_TOKENS_PER_SECOND": "0", "CREWAI_TRACING_ENABLED": "false", "CREWAI_DISABLE_TELEMETRY": "true",
+        "OTEL_SDK_DISABLED": "true", **env
+    }
+    return subprocess.run([sys.executable, CLI, *args], env=env, stdin=subprocess.DEVNULL, capture_output=True,
+                          text=True, timeout=300)
+
+
+def test_cli_fan_out_researches_every_planned_topic(tmp_path):
+    proc = run_cli(tmp_path, "--topics", "3", FAN_OUT="1", THEME="Ocean Robotics")
+    assert proc.returncode == 0, proc.stderr
+
+    [path] = glob.glob(str(tmp_path / "Downloads" / "Article_Topic_Generated_*.md"))
+    with open(path, encoding="utf-8") as f:
+        article = f.read()
+    assert "## Topic 1: Topic\n" not in article
+    for aspect in ("Emerging Trends", "Key Players and Institutions", "Ethical Questions"):
+        assert f"ocean-robotics-{aspect.lower().replace(' ', '-')}" in article
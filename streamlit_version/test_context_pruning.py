@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+import pytest
+
+crewai = pytest.importorskip("crewai")
+
+from backends import create_llm
+from context_pruning import ContextPruner
+
+
+def make_crew():
+    """Planning -> Researching (no context given, as the CLI builds it) -> Condensing (reads the research)"""
+    agent = crewai.Agent(role="Topic Planner", goal="Plan", backstory="Plans topics", llm=create_llm("fake"))
+    plan = crewai.Task(name="Planning", description="Plan", expected_output="Titles", agent=agent)
+    research = crewai.Task(name="Researching", description="Research", expected_output="Findings", agent=agent)
+    condense = crewai.Task(name="Condensing", description="Condense", expected_output="Points", agent=agent, context=[research])
+    return crewai.Crew(agents=[agent], tasks=[plan, research, condense])
+
+
+def test_tasks_without_context_list_nothing():
+    pruner = ContextPruner(make_crew().tasks)
+    assert pruner.context_of == {"Planning": [], "Researching": [], "Condensing": ["Researching"]}
+    assert pruner.consumed == {"Researching"}
+    assert pruner.report("Researching")["context_tokens"] == 0
+
+
+def test_only_consumed_outputs_are_pruned_and_restored():
+    pruner = ContextPruner(make_crew().tasks)
+    plan = SimpleNamespace(name="Planning", raw="```\nA\n\n\n\nB\n```", pydantic=None)
+    research = SimpleNamespace(name="Researching", raw="```\nFinding one.\n\n\n\nFinding two.   \n```", pydantic=None)
+    pruner.prune(plan)
+    pruner.prune(research)
+    assert plan.raw == "```\nA\n\n\n\nB\n```"
+    assert research.raw == "Finding one.\n\nFinding two."
+    assert pruner.report("Condensing")["context_tokens"] <= pruner.report("Condensing")["context_tokens_unpruned"]
+
+    pruner.restore([plan, research])
+    assert research.raw == "```\nFinding one.\n\n\n\nFinding two.   \n```"
@@ -0,0 +1,132 @@
+import os
+import asyncio
+import pytest
+
+pytest.importorskip("crewai")
+# The fake backend answers locally; no need to simulate its latency here
+os.environ.setdefault("FAKE_LLM_LATENCY", "0")
+
+from generator import ArticleTopicGenerator
+
+
+@pytest.mark.parametrize("structured_assembly", [False, True])
+def test_dag_mode_builds_every_topic(structured_assembly):
+    generator = ArticleTopicGenerator(
+        mode="dag", backend="fake", structured_assembly=structured_assembly, checkpoint_path=None
+    )
+    result = asyncio.run(generator.generate_topics("Ocean Robotics", 5))
+
+    assert len(result.topics) == 5
+    assert len(result.research) == 5
+    for topic in result.topics:
+        assert topic.points
+        assert topic.links
+
+
+def test_dag_mode_fails_promptly_when_a_branch_raises(monkeypatch):
+    import time
+    import backends
+
+    respond = backends.FakeLLM.respond
+
+    def failing_collector(self, messages):
+        if any(str(m.get("content", "")).lstrip().startswith("You are Link Collector") for m in messages):
+            raise RuntimeError("collector failed")
+        return respond(self, messages)
+
+    monkeypatch.setattr(backends.FakeLLM, "respond", failing_collector)
+    generator = ArticleTopicGenerator(mode="dag", backend="fake", checkpoint_path=None)
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="collector failed"):
+        asyncio.run(asyncio.wait_for(generator.generate_topics("Ocean Robotics", 3), timeout=60))
+    assert time.monotonic() - started < 30
+
+
+def test_resume_rebuilds_the_pipeline_the_run_was_started_with(tmp_path, monkeypatch):
+    import backends
+    from checkpoints import ResumeRefused
+    from generator import get_generator, resume_options
+
+    path = str(tmp_path / "checkpoints.sqlite3")
+    respond = backends.FakeLLM.respond
+
+    def failing_writer(self, messages):
+        if any(str(m.get("content", "")).lstrip().startswith("You are Article Prompt Writer") for m in messages):
+            raise RuntimeError("writer failed")
+        return respond(self, messages)
+
+    events = []
+    monkeypatch.setattr(backends.FakeLLM, "respond", failing_writer)
+    with pytest.raises(RuntimeError, match="writer failed"):
+        asyncio.run(ArticleTopicGenerator(mode="dag", backend="fake", checkpoint_path=path).generate_topics("Ocean Robotics", 3, events.append))
+    run_id = next(event["run_id"] for event in events if event["type"] == "run")
+    monkeypatch.setattr(backends.FakeLLM, "respond", respond)
+
+    options = resume_options(run_id, path)
+    assert options["mode"] == "dag" and options["structured_assembly"] is False
+    with pytest.raises(ResumeRefused):
+        asyncio.run(ArticleTopicGenerator(backend="fake", structured_assembly=True, checkpoint_path=path).generate_topics("Ocean Robotics", 3, run_id=run_id))
+
+    events = []
+    result = asyncio.run(get_generator(checkpoint_path=path, **options).generate_topics("Ocean Robotics", 3, events.append, run_id))
+    assert len(result.topics) == 3
+    assert [event["name"] for event in events if event.get("restored")] == ["Planning", "Researching", "Condensing", "Link Collecting"]
+
+
+def test_fan_out_runs_max_concurrency_topics_at_once_whatever_the_default_pool(monkeypatch):
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+    import backends
+
+    running, peak, lock = 0, 0, threading.Lock()
+    call = backends.SimulatedLLM.call
+
+    def counting_call(self, messages, *args, **kwargs):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        try:
+            return call(self, messages, *args, **kwargs)
+        finally:
+            with lock:
+                running -= 1
+
+    monkeypatch.setattr(backends.SimulatedLLM, "call", counting_call)
+    generator = ArticleTopicGenerator(mode="fan-out", max_concurrency=4, backend="fake", checkpoint_path=None)
+    for llm in generator.backend_llms.values():
+        llm.latency = 0.2
+
+    async def generate():
+        # A default pool of one thread, as on a small machine
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=1))
+        return await generator.generate_topics("Ocean Robotics", 4)
+
+    assert len(asyncio.run(generate()).topics) == 4
+    assert peak == 4
+
+
+def test_the_context_budget_is_part_of_the_fingerprint():
+    from schemas import GenerationRequest
+
+    request = GenerationRequest(theme="Ocean Robotics", number_of_topics=3)
+    fingerprints = {
+        ArticleTopicGenerator(backend="fake", checkpoint_path=None, context_budget=budget).fingerprint(request)
+        for budget in (0, 3000, 3000, 500)
+    }
+    assert len(fingerprints) == 3
+
+
+def test_regenerating_a_topic_replaces_only_that_topic():
+    generator = ArticleTopicGenerator(backend="fake", checkpoint_path=None)
+    result = asyncio.run(generator.generate_topics("Ocean Robotics", 3))
+    # Mark every section so the one that was rebuilt can be told apart from the ones that were kept
+    stale = result.model_copy(update={"topics": [topic.model_copy(update={"links": ["https://stale.example"]}) for topic in result.topics]})
+    events = []
+
+    regenerated = asyncio.run(generator.regenerate_topic(stale, 1, events.append))
+
+    assert [topic.title for topic in regenerated.topics] == [topic.title for topic in result.topics]
+    assert regenerated.topics[1] == result.topics[1]
+    assert regenerated.topics[0] == stale.topics[0] and regenerated.topics[2] == stale.topics[2]
+    assert events[0] == {"type": "total", "total": generator.tasks_per_topic}
@@ -0,0 +1,43 @@
+from history import HistoryStore
+
+
+def test_owners_only_see_and_delete_their_own_entries():
+    store = HistoryStore(":memory:")
+    mine = store.add("alice", "Ocean Robotics", 5, "## Topic 1: Sea Robots")
+    theirs = store.add("bob", "Ocean Robotics", 5, "## Topic 1: Sea Robots")
+    assert mine != theirs
+
+    entries, total = store.page("alice", query="robots")
+    assert total == 1 and entries[0]["id"] == mine
+    assert store.get_content("alice", theirs) is None
+
+    store.delete("alice", theirs)
+    assert store.get_content("bob", theirs) == "## Topic 1: Sea Robots"
+    store.delete("alice", mine)
+    assert store.page("alice") == ([], 0)
+
+
+def test_each_owner_keeps_only_its_newest_entries_within_the_age_limit(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.sqlite3"), max_entries=2, max_age_seconds=60)
+    ids = [store.add("alice", f"Theme {number}", 5, f"## Topic 1: Entry {number}") for number in range(3)]
+    store.add("bob", "Theme", 5, "## Topic 1: Entry")
+
+    entries, total = store.page("alice")
+    assert total == 2 and [entry["id"] for entry in entries] == ids[:0:-1]
+    assert store.page("bob")[1] == 1
+
+    # Entries past the age limit are dropped when the store is next opened
+    with store._conn:
+        store._conn.execute("UPDATE generations SET created = created - 120 WHERE owner = ?", ("bob",))
+    reopened = HistoryStore(str(tmp_path / "history.sqlite3"), max_entries=2, max_age_seconds=60)
+    assert reopened.page("bob") == ([], 0)
+    assert reopened.page("alice")[1] == 2
+
+
+def test_entries_keep_the_options_they_were_generated_with():
+    store = HistoryStore(":memory:")
+    store.add("alice", "Ocean Robotics", 5, "## Topic 1: Sea Robots", {"mode": "dag", "routing": "tiered"})
+    store.add("alice", "Soil Health", 5, "## Topic 1: Microbes")
+
+    entries, _ = store.page("alice")
+    assert [entry["options"] for entry in entries] == [{}, {"mode": "dag", "routing": "tiered"}]
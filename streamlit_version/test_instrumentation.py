@@ -0,0 +1,56 @@
+import json
+import pytest
+
+pytest.importorskip("crewai")
+
+import instrumentation
+from instrumentation import MeteredLLM, RunMetrics, LogSink, PrometheusSink, SpanSink, estimate_cost
+from backends import FakeLLM
+from llm_cache import CachedLLM, ResponseCache
+
+MESSAGES = [{"role": "system", "content": "You are Topic Planner."}, {"role": "user", "content": "Plan 3 topics"}]
+
+
+def test_the_meter_counts_a_task_and_starts_over_once_it_is_recorded():
+    meter = MeteredLLM(CachedLLM(FakeLLM(model="gemini/gemini-2.0-flash", latency=0), ResponseCache(":memory:")))
+    meter.call(MESSAGES)
+    meter.call(MESSAGES)  # answered by the cache further down the chain
+    run = RunMetrics("Ocean Robotics", 3, "gemini/gemini-2.0-flash")
+
+    record = run.task_finished("Researching: Sea Robots", "Topic Researcher", meter, context_tokens=7)
+    assert record["stage"] == "Researching"
+    assert record["calls"] == 2 and record["cache_hits"] == 1
+    assert record["prompt_tokens"] > 0 and record["completion_tokens"] > 0
+    assert record["cost_usd"] == round(estimate_cost(meter.model, record["prompt_tokens"], record["completion_tokens"]), 6)
+    assert record["context_tokens"] == 7
+    assert meter.snapshot()["calls"] == 0 and meter.snapshot()["cache_hits"] == 0
+
+
+def test_the_run_totals_its_tasks_and_every_sink_sees_them(tmp_path):
+    log, spans, prometheus = LogSink(tmp_path / "tasks.jsonl"), SpanSink(tmp_path / "spans.jsonl"), PrometheusSink(port=0)
+    meter = MeteredLLM(FakeLLM(latency=0))
+    run = RunMetrics("Ocean Robotics", 3, meter.model, sinks=[log, spans, prometheus])
+    for task in ("Planning", "Researching: Sea Robots", "Researching: Reef Drones"):
+        meter.call(MESSAGES)
+        run.task_finished(task, "Agent", meter)
+    summary = run.finish()
+
+    assert summary["tasks"] == 3 and summary["calls"] == 3 and summary["status"] == "done"
+    records = [json.loads(line) for line in (tmp_path / "tasks.jsonl").read_text().splitlines()]
+    assert [record["type"] for record in records] == ["task", "task", "task", "run"]
+
+    spans = [json.loads(line) for line in (tmp_path / "spans.jsonl").read_text().splitlines()]
+    root = spans[-1]
+    assert root["parent_span_id"] is None and root["name"] == "generate_topics"
+    assert all(span["parent_span_id"] == root["span_id"] and span["trace_id"] == run.run_id for span in spans[:-1])
+
+    metrics = prometheus.render()
+    assert 'article_task_tasks_total{stage="Researching",agent="Agent"} 2' in metrics
+    assert 'article_generations_total{status="done"} 1' in metrics
+
+
+def test_an_unknown_sink_is_refused(monkeypatch):
+    monkeypatch.setattr(instrumentation, "METRICS_SINK", "log,statsd")
+    monkeypatch.setattr(instrumentation, "_sinks", None)
+    with pytest.raises(ValueError, match="statsd"):
+        instrumentation.get_metrics_sinks()
@@ -0,0 +1,125 @@
+import time
+import asyncio
+import threading
+import pytest
+
+pytest.importorskip("crewai")
+
+import jobs
+from jobs import JobRunner, JobTimeout, coalescing_key
+from rate_limit import CallBudgetExceeded
+
+OPTIONS = {"backend": "fake", "cache": "off", "checkpoint_path": None}
+
+
+@pytest.fixture
+def release(monkeypatch):
+    """Generations wait until the returned event is set instead of running a crew, and stop at their deadline as a
+    crew does at its next LLM call"""
+    event = threading.Event()
+
+    async def generate(theme, num_topics, listener=None, deadline=None, **options):
+        listener({"type": "total", "total": 1})
+        if not await asyncio.to_thread(event.wait, deadline - time.time()):
+            raise CallBudgetExceeded("This generation ran past its deadline.")
+        return f"{theme}: {num_topics}"
+
+    monkeypatch.setattr(jobs, "generate_article_topics", generate)
+    yield event
+    event.set()
+
+
+def wait_until_done(runner, job):
+    for _ in range(200):
+        if job.done and runner.in_flight.get(job.key) is not job:
+            return
+        threading.Event().wait(0.05)
+    raise AssertionError("job did not finish")
+
+
+def test_identical_requests_share_one_job_until_it_finishes(release):
+    runner = JobRunner(max_workers=2)
+    job = runner.submit("Ocean Robotics", 3, **OPTIONS)
+    assert runner.submit("Ocean Robotics", 3, **OPTIONS) is job
+    assert runner.submit("Ocean Robotics", 4, **OPTIONS) is not job
+
+    job.poll("alice")
+    job.poll("bob")
+    assert job.subscribers == 2
+    job.leave("bob")
+    assert job.subscribers == 1
+
+    release.set()
+    wait_until_done(runner, job)
+    assert job.result == "Ocean Robotics: 3"
+    assert job.key not in runner.in_flight
+    assert runner.submit("Ocean Robotics", 3, **OPTIONS) is not job
+
+
+def test_jobs_past_their_deadline_fail_and_free_their_worker(release):
+    runner = JobRunner(max_workers=1, job_timeout=0.3)
+    stuck = runner.submit("Ocean Robotics", 3, **OPTIONS)
+    wait_until_done(runner, stuck)
+
+    assert isinstance(stuck.error, JobTimeout)
+    assert stuck.key not in runner.in_flight
+    # The next identical request starts over, and the single worker is free to run it
+    runner.job_timeout = 30
+    retry = runner.submit("Ocean Robotics", 3, **OPTIONS)
+    assert retry is not stuck
+    release.set()
+    wait_until_done(runner, retry)
+    assert retry.status == "done"
+
+
+def test_stalled_jobs_take_in_no_more_requests(release, monkeypatch):
+    runner = JobRunner(max_workers=1)
+    job = runner.submit("Ocean Robotics", 3, **OPTIONS)
+    for _ in range(100):
+        if job.status == "running":
+            break
+        threading.Event().wait(0.05)
+
+    monkeypatch.setattr(jobs, "JOB_STALL_SECONDS", 0)
+    assert not job.making_progress
+    retry = runner.submit("Ocean Robotics", 3, **OPTIONS)
+    assert retry is not job
+    # Both finish while generations are still stubbed out
+    release.set()
+    wait_until_done(runner, retry)
+
+
+def test_a_timed_out_crew_stops_making_llm_calls(monkeypatch):
+    import backends
+
+    calls = []
+    call = backends.SimulatedLLM.call
+
+    def slow_call(self, messages, *args, **kwargs):
+        calls.append(time.time())
+        self.latency, self.tokens_per_second = 0.4, 0
+        return call(self, messages, *args, **kwargs)
+
+    monkeypatch.setattr(backends.SimulatedLLM, "call", slow_call)
+    runner = JobRunner(max_workers=1, job_timeout=0.6)
+    job = runner.submit("Ocean Robotics", 3, **OPTIONS)
+    wait_until_done(runner, job)
+
+    assert isinstance(job.error, JobTimeout)
+    # The worker was held until the crew stopped, at the first call past the deadline: a full crew makes 5
+    assert 1 <= len(calls) < 5
+    assert all(called <= job.deadline for called in calls)
+    threading.Event().wait(1)
+    assert len(calls) < 5 and not [thread for thread in threading.enumerate() if thread.name.startswith("generation-")]
+
+
+def test_the_coalescing_key_does_not_build_the_generator(monkeypatch):
+    import generator
+
+    def build(**options):
+        raise AssertionError("the generator was built on the submitting thread")
+
+    monkeypatch.setattr(generator, "get_generator", build)
+    key = coalescing_key("Ocean Robotics", 3, OPTIONS)
+    assert key == coalescing_key("  ocean robotics ", 3, OPTIONS)
+    assert key != coalescing_key("Ocean Robotics", 3, {**OPTIONS, "mode": "fan-out"})
@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("crewai")
+
+from llm_cache import ResponseCache, CachedLLM, CacheMiss
+from backends import FakeLLM
+
+MESSAGES = [{"role": "system", "content": "You are Topic Planner."}, {"role": "user", "content": "Plan 3 topics"}]
+
+
+def age(cache, key, column, seconds):
+    with cache._conn:
+        cache._conn.execute(f"UPDATE responses SET {column} = {column} - ? WHERE key = ?", (seconds, key))
+
+
+def test_entries_expire_and_the_least_recently_used_go_first():
+    cache = ResponseCache(":memory:", ttl_seconds=60, max_bytes=10)
+    cache.set("a", "model", "aaaa")
+    cache.set("b", "model", "bbbb")
+    age(cache, "a", "accessed", 10)
+    age(cache, "b", "accessed", 20)
+    assert cache.get("a") == "aaaa"  # used again: b is now the least recently used
+
+    cache.set("c", "model", "cccc")  # 12 bytes: b goes
+    assert cache.get("b") is None
+    assert cache.get("a") == "aaaa" and cache.get("c") == "cccc"
+    assert cache.stats() == {"entries": 2, "bytes": 8}
+
+    age(cache, "a", "created", 61)
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 1
+
+
+def test_identical_prompts_are_answered_from_the_cache_and_replay_never_calls_out():
+    cache = ResponseCache(":memory:")
+    backend = FakeLLM(model="fake/model", latency=0, tokens_per_second=0)
+    llm = CachedLLM(backend, cache)
+
+    first = llm.call(MESSAGES)
+    assert llm.call(MESSAGES) == first
+    assert (llm.hits, llm.misses, backend.usage["calls"]) == (1, 1, 1)
+
+    replay = CachedLLM(backend, cache, mode="replay")
+    assert replay.call(MESSAGES) == first
+    with pytest.raises(CacheMiss):
+        replay.call([*MESSAGES, {"role": "user", "content": "and one more"}])
+    assert backend.usage["calls"] == 1
@@ -0,0 +1,50 @@
+import os
+import json
+import pytest
+from types import SimpleNamespace
+
+from output_sinks import open_output, markdown_to_html
+
+
+def output(name, raw, agent="Agent"):
+    return SimpleNamespace(name=name, agent=agent, raw=raw)
+
+
+def test_the_file_is_written_as_a_part_file_and_moved_into_place_on_close(tmp_path):
+    sink = open_output("markdown", str(tmp_path), "ocean", "Ocean Robotics", answer_task="Assembling")
+    sink.task(output("Planning", "1. Sea Robots"))
+    sink.task(output("Assembling", "## Topic 1: Sea Robots\n"))
+    assert os.listdir(tmp_path) == ["ocean.md.part"]
+
+    path = sink.close("ignored: the answer task already wrote the answer")
+    assert path == str(tmp_path / "ocean.md") and os.listdir(tmp_path) == ["ocean.md"]
+    text = (tmp_path / "ocean.md").read_text()
+    assert text.startswith("# Theme: Ocean Robotics")
+    assert "<summary>Planning (Agent)</summary>" in text
+    assert text.count("## Topic 1: Sea Robots") == 1 and "ignored" not in text
+
+
+def test_an_aborted_run_keeps_what_was_written(tmp_path):
+    sink = open_output("jsonl", str(tmp_path), "ocean", "Ocean Robotics")
+    sink.task(output("Planning", "1. Sea Robots"))
+    part = sink.abort()
+
+    assert part == str(tmp_path / "ocean.jsonl.part") and os.listdir(tmp_path) == ["ocean.jsonl.part"]
+    records = [json.loads(line) for line in open(part, encoding="utf-8")]
+    assert [record["type"] for record in records] == ["run", "task"]
+
+
+def test_the_html_page_escapes_the_crew_output(tmp_path):
+    sink = open_output("html", str(tmp_path), "ocean", "<Ocean>")
+    path = sink.close("## Topic 1: Sea <Robots>\n- **Power:** https://example.com/a")
+    page = open(path, encoding="utf-8").read()
+    assert "<title>Theme: &lt;Ocean&gt;</title>" in page and page.rstrip().endswith("</html>")
+    assert "<h2>Topic 1: Sea &lt;Robots&gt;</h2>" in page
+    assert '<li><strong>Power:</strong> <a href="https://example.com/a">https://example.com/a</a></li>' in page
+    assert markdown_to_html("") == ""
+
+
+def test_an_unknown_format_is_refused(tmp_path):
+    with pytest.raises(ValueError, match="Unknown output format 'pdf'"):
+        open_output("pdf", str(tmp_path), "ocean", "Ocean Robotics")
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,32 @@
+import pytest
+
+pytest.importorskip("crewai")
+
+from rate_limit import get_rate_limiter
+
+
+def test_limits_change_without_refilling_the_buckets():
+    limiter = get_rate_limiter("test/shared-buckets", rpm=60, tpm=6000)
+    requests, tokens = limiter.requests, limiter.tokens
+    for _ in range(60):
+        requests.reserve(1)
+
+    assert get_rate_limiter("test/shared-buckets", rpm=60, tpm=6000) is limiter
+    assert limiter.requests is requests and limiter.tokens is tokens
+    assert requests.reserve(1) > 0  # still empty, not handed a fresh bucket
+
+    get_rate_limiter("test/shared-buckets", rpm=120)
+    assert limiter.requests is requests
+    assert requests.capacity == 120 and requests.rate == 2
+    assert requests.level < 1
+
+
+def test_only_quota_errors_count_as_rate_limits():
+    from rate_limit import is_rate_limit_error
+
+    assert is_rate_limit_error(RuntimeError("429 RESOURCE_EXHAUSTED: quota exceeded"))
+    assert is_rate_limit_error(RuntimeError("Rate limit reached for gemini-2.0-flash"))
+    assert is_rate_limit_error(RuntimeError("HTTP 429: Too Many Requests"))
+    assert not is_rate_limit_error(RuntimeError("Prompt of 14290 tokens is too long"))
+    assert not is_rate_limit_error(RuntimeError("Connection refused on port 4290"))
+    assert not is_rate_limit_error(RuntimeError("Error 429 while parsing the response"))
@@ -0,0 +1,65 @@
+import os
+import pytest
+
+import retrieval
+from retrieval import update_index, format_results
+
+NOTES = {
+    "robots/sea.md": "# Sea Robots\n\nAutonomous underwater gliders map the ocean floor for months on one charge.\n",
+    "reefs.md": "# Reef Drones\n\nSource: https://example.com/reefs\n\nSmall drones count fish and measure coral bleaching on reefs.\n",
+    "kitchen.txt": "Sourdough bread needs a starter, flour, water and salt.\n",
+}
+
+
+def write_notes(corpus, notes=NOTES):
+    for path, text in notes.items():
+        (corpus / path).parent.mkdir(parents=True, exist_ok=True)
+        (corpus / path).write_text(text, encoding="utf-8")
+
+
+def test_search_ranks_the_matching_note_first_and_cites_it(tmp_path):
+    write_notes(tmp_path / "notes")
+    index, _ = update_index(str(tmp_path / "notes"), str(tmp_path / "index"))
+
+    results = index.search("underwater gliders")
+    assert [result["source"] for result in results] == ["robots/sea.md"]
+    assert results[0]["heading"] == "Sea Robots" and results[0]["score"] > 0
+    # Without a link of its own a passage is cited by its path, otherwise by its link
+    assert "[1] robots/sea.md § Sea Robots\nCite: robots/sea.md\n" in format_results(results)
+    assert "Cite: https://example.com/reefs" in format_results(index.search("coral reefs"))
+    assert index.search("quantum chromodynamics") == []
+
+
+def test_the_research_tool_answers_from_the_corpus(tmp_path):
+    pytest.importorskip("crewai")
+    from research_tool import CorpusSearchTool
+
+    write_notes(tmp_path / "notes")
+    tool = CorpusSearchTool(corpus_dir=str(tmp_path / "notes"), index_dir=str(tmp_path / "index"))
+    assert "robots/sea.md" in tool.run(query="ocean floor gliders")
+    assert tool.run(query="quantum chromodynamics").startswith("No passages")
+
+
+def test_only_new_and_edited_notes_are_indexed_again(tmp_path, monkeypatch):
+    corpus, directory = tmp_path / "notes", str(tmp_path / "index")
+    write_notes(corpus)
+    update_index(str(corpus), directory)
+
+    ingested = []
+    ingest_document = retrieval.ingest_document
+    monkeypatch.setattr(retrieval, "ingest_document", lambda corpus_dir, path: ingested.append(path) or ingest_document(corpus_dir, path))
+    (corpus / "robots/sea.md").write_text("# Sea Robots\n\nWave powered surface vessels sample plankton.\n", encoding="utf-8")
+    os.utime(corpus / "reefs.md", ns=(1, 1))  # touched, same contents
+    (corpus / "kitchen.txt").unlink()
+    (corpus / "deserts.md").write_text("# Desert Rovers\n\nRovers test Mars hardware in the Atacama.\n", encoding="utf-8")
+
+    index, stats = update_index(str(corpus), directory)
+    assert sorted(ingested) == ["deserts.md", "robots/sea.md"]
+    assert stats == {"documents": 3, "changed": 2, "removed": 1}
+    assert [result["source"] for result in index.search("plankton")] == ["robots/sea.md"]
+    assert index.search("underwater gliders") == [] and index.search("sourdough") == []
+    assert [result["source"] for result in index.search("coral reefs")] == ["reefs.md"]
+
+    ingested.clear()
+    _, stats = update_index(str(corpus), directory)
+    assert ingested == [] and stats["changed"] == stats["removed"] == 0
@@ -0,0 +1,39 @@
+import json
+import pytest
+
+pytest.importorskip("crewai")
+
+from routing import load_routing, AGENTS
+from backends import DEFAULT_MODEL, DEFAULT_TEMPERATURE
+
+
+def test_the_single_policy_keeps_every_agent_on_the_default_model():
+    assert load_routing("single") == {agent: (DEFAULT_MODEL, DEFAULT_TEMPERATURE) for agent in AGENTS}
+
+
+def test_a_json_config_overrides_the_default_and_single_agents(tmp_path):
+    path = tmp_path / "routing.json"
+    path.write_text(json.dumps({"default": {"model": "gemini/gemini-2.5-pro"}, "agents": {"writer": {"temperature": 0}}}))
+    routes = load_routing(str(path))
+
+    assert routes["planner"] == ("gemini/gemini-2.5-pro", DEFAULT_TEMPERATURE)
+    assert routes["writer"] == ("gemini/gemini-2.5-pro", 0.0)
+
+
+@pytest.mark.parametrize("routing, message", [
+    ("cheapest", "Unknown model routing 'cheapest'"),
+    ({"agents": {"editor": {}}}, "Unknown agent 'editor'"),
+    ({"default": {"model": "x", "top_p": 1}}, "Unknown model routing setting 'top_p'"),
+])
+def test_unknown_policies_agents_and_settings_are_refused(routing, message):
+    with pytest.raises(ValueError, match=message):
+        load_routing(routing)
+
+
+def test_the_generator_shares_one_backend_client_per_route():
+    from generator import ArticleTopicGenerator
+
+    generator = ArticleTopicGenerator(backend="fake", routing="tiered", checkpoint_path=None)
+    assert len(generator.backend_llms) == 2
+    assert generator.routes["condenser"] == generator.routes["writer"] == ("gemini/gemini-2.0-flash-lite", 0.0)
+    assert generator.base_llm.model.endswith("gemini/gemini-2.5-flash")
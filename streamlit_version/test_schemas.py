@@ -0,0 +1,40 @@
+import pytest
+from schemas import (
+    ArticleTopics, TopicDraft, TopicSection, CondensedPoint, GenerationRequest, draft_preview, MIN_TOPICS, MAX_TOPICS
+)
+
+
+def test_draft_preview_renders_what_has_streamed_so_far():
+    topics = [
+        TopicSection(title="Sea Robots", points=[CondensedPoint(heading="Power", summary="Runs on waves.")], links=["https://example.com/a"]),
+        TopicSection(title="Reef Mapping", points=[CondensedPoint(heading="Sonar", summary="Maps the reef floor.")]),
+    ]
+    text = "Final Answer: " + TopicDraft(topics=topics).model_dump_json()
+    assert draft_preview(text) == ArticleTopics(theme="Oceans", topics=topics).to_markdown()
+
+    partial = draft_preview(text[:text.index("Maps the")])
+    assert "## Topic 2: Reef Mapping" in partial
+    assert "Sonar" not in partial
+    assert "{" not in partial
+
+
+def test_draft_preview_leaves_markdown_alone():
+    assert draft_preview("## Topic 1: Sea Robots") == "## Topic 1: Sea Robots"
+
+
+def test_the_seed_draws_a_repeatable_topic_count_within_range():
+    counts = [GenerationRequest(theme="Ocean Robotics", seed=seed).number_of_topics for seed in range(50)]
+    assert counts == [GenerationRequest(theme="  ocean   ROBOTICS ", seed=seed).number_of_topics for seed in range(50)]
+    assert all(MIN_TOPICS <= count <= MAX_TOPICS for count in counts)
+    assert len(set(counts)) > 1
+    assert GenerationRequest(theme="Ocean Robotics", number_of_topics=3, seed=7).number_of_topics == 3
+
+
+def test_requests_differing_in_case_and_spacing_share_a_fingerprint():
+    routes = {"planner": ("gemini/gemini-2.0-flash", 0.7)}
+    fingerprint = GenerationRequest(theme="AI in Healthcare", number_of_topics=5).fingerprint(routes, "v1", mode="sequential")
+    assert GenerationRequest(theme="  ai in   HEALTHCARE ", number_of_topics=5).fingerprint(routes, "v1", mode="sequential") == fingerprint
+    assert GenerationRequest(theme="AI in Healthcare", number_of_topics=6).fingerprint(routes, "v1", mode="sequential") != fingerprint
+    assert GenerationRequest(theme="AI in Healthcare", number_of_topics=5).fingerprint(routes, "v2", mode="sequential") != fingerprint
+    with pytest.raises(ValueError, match="The theme is empty"):
+        GenerationRequest(theme="   ")
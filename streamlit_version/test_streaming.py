@@ -0,0 +1,42 @@
+import asyncio
+import pytest
+
+pytest.importorskip("crewai")
+from streaming import FinalAnswerFilter, stream_tokens, crewai_event_bus, LLMStreamChunkEvent, STREAMING_AVAILABLE
+
+
+def test_only_the_text_after_the_final_answer_marker_is_passed_on():
+    received = []
+    feed = FinalAnswerFilter(received.append).feed
+    for chunk in ["Thought: I know the topics.\nFinal Ans", "wer:  ## Topic 1", ": Sea Robots", "\n- **Power:**"]:
+        feed(chunk)
+    assert "".join(received) == "## Topic 1: Sea Robots\n- **Power:**"
+
+
+@pytest.mark.skipif(not STREAMING_AVAILABLE, reason="this CrewAI release has no LLM streaming events")
+def test_chunks_reach_the_listener_of_the_llm_that_streamed_them():
+    from backends import FakeLLM
+    from llm_cache import CachedLLM, ResponseCache
+
+    writer, other = FakeLLM(latency=0), FakeLLM(latency=0)
+    received = []
+    with stream_tokens(CachedLLM(writer, ResponseCache(":memory:")), received.append):
+        crewai_event_bus.emit(writer, LLMStreamChunkEvent(chunk="Final Answer: hello"))
+        crewai_event_bus.emit(other, LLMStreamChunkEvent(chunk="Final Answer: not mine"))
+    crewai_event_bus.emit(writer, LLMStreamChunkEvent(chunk=" after the block"))
+    assert received == ["hello"]
+
+
+def test_every_finished_task_is_reported_to_the_listener():
+    from generator import ArticleTopicGenerator
+
+    generator = ArticleTopicGenerator(backend="fake", checkpoint_path=None)
+    for llm in generator.backend_llms.values():
+        llm.latency = llm.tokens_per_second = 0
+    events = []
+    asyncio.run(generator.generate_topics("Ocean Robotics", 3, events.append))
+
+    assert events[0] == {"type": "total", "total": 5}
+    tasks = [event for event in events if event["type"] == "task"]
+    assert [event["name"] for event in tasks] == [task.name for task in generator.crew.tasks]
+    assert all(event["metrics"]["calls"] >= 1 for event in tasks)
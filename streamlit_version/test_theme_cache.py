@@ -0,0 +1,45 @@
+import pytest
+
+from theme_cache import ThemeIndex, normalize_theme
+
+
+def test_only_close_themes_generated_with_the_same_settings_are_offered(tmp_path):
+    index = ThemeIndex(str(tmp_path))
+    index.add("AI in Healthcare", 5, "## Topic 1: Diagnosis", "five-topic settings")
+    assert normalize_theme("The AI in Health-care!") == "artificial intelligence health care"
+
+    entry, similarity = index.lookup("artificial intelligence in health care", "five-topic settings")
+    assert entry["content"] == "## Topic 1: Diagnosis" and entry["topic_count"] == 5 and similarity > 0.95
+    assert index.lookup("Soil Health", "five-topic settings") is None
+    assert index.lookup("AI in Healthcare", "ten-topic settings") is None
+    assert index.lookup("AI in Healthcare", "five-topic settings", threshold=1.01) is None
+
+
+def test_results_persist_and_are_capped(tmp_path):
+    index = ThemeIndex(str(tmp_path), max_entries=2)
+    index.add("Ocean Robotics", 5, "old", "settings")
+    index.add("Ocean robotics", 5, "new", "settings")  # the same normalized theme: replaced
+    index.add("Soil Health", 5, "soil", "settings")
+    index.add("Deep Sea Mining", 5, "mining", "settings")
+
+    reopened = ThemeIndex(str(tmp_path), max_entries=2)
+    assert len(reopened) == 2
+    assert reopened.lookup("Ocean Robotics", "settings") is None
+    assert reopened.lookup("Deep Sea Mining", "settings")[0]["content"] == "mining"
+
+    with reopened._conn:
+        reopened._conn.execute("UPDATE results SET created = created - 120 WHERE theme = ?", ("Soil Health",))
+    aged = ThemeIndex(str(tmp_path), max_age_seconds=60)
+    assert len(aged) == 1 and aged.lookup("Soil Health", "settings") is None
+
+
+def test_result_settings_tell_topic_counts_backends_and_pipelines_apart():
+    pytest.importorskip("crewai")
+    from generator import result_settings_key
+
+    key = result_settings_key(5, backend="fake", mode="sequential")
+    assert key == result_settings_key(5, backend="fake", mode="dag", cache="on")
+    assert key != result_settings_key(10, backend="fake", mode="sequential")
+    assert key != result_settings_key(5, backend="gemini", mode="sequential")
+    assert key != result_settings_key(5, backend="fake", mode="fan-out")
+    assert key != result_settings_key(5, backend="fake", corpus="notes")
@@ -0,0 +1,161 @@
+import os
+import re
+import zlib
+import time
+import sqlite3
+import threading
+import numpy as np
+
+DEFAULT_INDEX_DIR = os.environ.get(
+    "THEME_INDEX_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "article_topic_generator", "theme_index")
+)
+DEFAULT_SIMILARITY_THRESHOLD = float(os.environ.get("THEME_SIMILARITY_THRESHOLD", "0.85"))
+# Results kept: the newest THEME_INDEX_MAX_ENTRIES, none older than THEME_INDEX_MAX_AGE_DAYS (0: no limit)
+DEFAULT_MAX_ENTRIES = int(os.environ.get("THEME_INDEX_MAX_ENTRIES", "1000"))
+DEFAULT_MAX_AGE_SECONDS = float(os.environ.get("THEME_INDEX_MAX_AGE_DAYS", "30")) * 24 * 60 * 60
+VECTOR_SIZE = 2048
+
+# Expanded before vectorizing so that "AI in healthcare" and "artificial intelligence in health care" meet
+ABBREVIATIONS = {
+    "ai": "artificial intelligence",
+    "ml": "machine learning",
+    "dl": "deep learning",
+    "nlp": "natural language processing",
+    "llm": "large language model",
+    "llms": "large language models",
+    "iot": "internet of things",
+    "ar": "augmented reality",
+    "vr": "virtual reality",
+    "ev": "electric vehicle",
+    "evs": "electric vehicles",
+}
+STOPWORDS = {"a", "an", "the", "in", "of", "on", "for", "and", "to", "with", "about"}
+
+
+def normalize_theme(theme):
+    """Lowercase, strip punctuation, expand common abbreviations and drop filler words"""
+    words = re.findall(r"[a-z0-9]+", theme.lower())
+    expanded = " ".join(ABBREVIATIONS.get(word, word) for word in words).split()
+    return " ".join(word for word in expanded if word not in STOPWORDS)
+
+
+def vectorize(theme):
+    """Hashed character n-gram vector (L2-normalized) of a normalized theme"""
+    vector = np.zeros(VECTOR_SIZE, dtype=np.float32)
+    # Spaces are dropped so that "health care" and "healthcare" share their n-grams
+    text = normalize_theme(theme).replace(" ", "")
+    for n in (3, 4):
+        for start in range(len(text) - n + 1):
+            vector[zlib.crc32(text[start:start + n].encode("utf-8")) % VECTOR_SIZE] += 1.0
+
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class ThemeIndex:
+    """Nearest-neighbour index of previously generated results, keyed by theme similarity
+
+    Results are stored in SQLite under the settings that produced them (see generator.result_settings_key), and
+    only offered for a request with the same settings. The unit vectors of the stored themes are kept in memory
+    as a NumPy matrix; a result's content is only read once it is the best match. At most max_entries results
+    are kept, none older than max_age_seconds (0: no limit).
+    """
+
+    def __init__(self, directory=DEFAULT_INDEX_DIR, max_entries=DEFAULT_MAX_ENTRIES, max_age_seconds=DEFAULT_MAX_AGE_SECONDS):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, "themes.sqlite3"), check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS results (
+                    id INTEGER PRIMARY KEY,
+                    settings TEXT NOT NULL,
+                    normalized_theme TEXT NOT NULL,
+                    theme TEXT NOT NULL,
+                    topic_count INTEGER NOT NULL,
+                    content TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    created REAL NOT NULL,
+                    UNIQUE (settings, normalized_theme)
+                )"""
+            )
+            self._evict(time.time())
+            self._load()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _load(self):
+        """Read every stored (id, settings, vector) into memory; contents stay on disk"""
+        rows = self._conn.execute("SELECT id, settings, vector FROM results ORDER BY id").fetchall()
+        self.ids = [row[0] for row in rows]
+        self.settings = np.array([row[1] for row in rows], dtype=object)
+        self.vectors = (
+            np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows]) if rows
+            else np.zeros((0, VECTOR_SIZE), dtype=np.float32)
+        )
+
+    def lookup(self, theme, settings, threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        """Return (entry, similarity) of the closest stored theme generated with these settings, or None below
+        threshold"""
+        with self._lock:
+            candidates = np.flatnonzero(self.settings == settings)
+            if not len(candidates):
+                return None
+            # Rows are unit vectors, so the dot product is the cosine similarity
+            scores = self.vectors[candidates] @ vectorize(theme)
+            best = int(np.argmax(scores))
+            if scores[best] < threshold:
+                return None
+            row = self._conn.execute(
+                "SELECT theme, normalized_theme, topic_count, content, created FROM results WHERE id = ?",
+                (self.ids[candidates[best]],)
+            ).fetchone()
+        entry = {
+            "theme": row[0],
+            "normalized_theme": row[1],
+            "topic_count": row[2],
+            "content": row[3],
+            "timestamp": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(row[4]))
+        }
+        return entry, float(scores[best])
+
+    def add(self, theme, number_of_topics, content, settings):
+        """Remember a generated result; a result for the same normalized theme and settings is replaced"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT OR REPLACE INTO results (settings, normalized_theme, theme, topic_count, content, vector, created)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (settings, normalize_theme(theme), theme, number_of_topics, content, vectorize(theme).tobytes(), now)
+            )
+            self._evict(now)
+            self._load()
+
+    def _evict(self, now):
+        """Drop results past the age limit, then the oldest ones past the entry limit"""
+        if self.max_age_seconds:
+            self._conn.execute("DELETE FROM results WHERE created < ?", (now - self.max_age_seconds,))
+        if self.max_entries:
+            self._conn.execute(
+                "DELETE FROM results WHERE id NOT IN (SELECT id FROM results ORDER BY created DESC, id DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_theme_index(directory=DEFAULT_INDEX_DIR):
+    """Return the process-wide ThemeIndex stored in directory, loading it on first use"""
+    with _indexes_lock:
+        if directory not in _indexes:
+            _indexes[directory] = ThemeIndex(directory)
+        return _indexes[directory]
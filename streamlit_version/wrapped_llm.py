@@ -0,0 +1,31 @@
+from typing import ClassVar
+from crewai import BaseLLM
+
+
+class WrappedLLM(BaseLLM):
+    """Base of the wrappers around a CrewAI LLM (response cache, rate limiter, meter): the wrapped LLM's model,
+    temperature and capabilities, and a call that is passed on to it unless a subclass answers first"""
+
+    # Lets the chain of wrappers be walked down to the LLM that actually answers (see streaming.stream_tokens)
+    wraps_llm: ClassVar[bool] = True
+
+    def __init__(self, llm):
+        super().__init__(model=llm.model, temperature=llm.temperature)
+        self.llm = llm
+
+    def call(self, messages, tools=None, *args, **kwargs):
+        return self._delegate(messages, tools, *args, **kwargs)
+
+    def _delegate(self, messages, tools=None, *args, **kwargs):
+        # Agents set their stop words on the LLM they were given, which is the outermost wrapper
+        self.llm.stop = self.stop
+        return self.llm.call(messages, tools, *args, **kwargs)
+
+    def supports_function_calling(self):
+        return self.llm.supports_function_calling()
+
+    def supports_stop_words(self):
+        return self.llm.supports_stop_words()
+
+    def get_context_window_size(self):
+        return self.llm.get_context_window_size()